@@ -0,0 +1,6 @@
+"""Benchmarks of the modbusclient package
+
+Run the end-to-end benchmarks against a local simulator via::
+
+    python -m benchmarks.network --output results.json --baseline baseline.json
+"""
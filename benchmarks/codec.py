@@ -0,0 +1,305 @@
+"""Microbenchmarks of the protocol and data type codecs
+
+Measures the time and memory allocations per operation of the functions on the
+hot path of every request, independent of any network I/O:
+
+* Creation and parsing of messages in :mod:`modbusclient.protocol`
+* Encoding and decoding of :class:`~modbusclient.DataType`,
+  :class:`~modbusclient.String`, :class:`~modbusclient.Fixpoint` and
+  :class:`~modbusclient.Timestamp` with and without swapped words
+* :func:`~modbusclient.data_types.bcd_decode`
+* :func:`~modbusclient.api_wrapper.iter_matching_names` over large APIs
+
+Allocations are traced via :mod:`tracemalloc`, which only sees memory blocks
+alive at the time of a snapshot. Hence the results of all operations are kept
+to count the blocks and bytes retained per operation, while the transient
+memory is reported as the peak of a single operation.
+
+Results are written to a JSON file. If a baseline written by a previous run is
+given, the exit status is 1 if the time per operation increased by more than
+the time tolerance or the allocations increased by more than the allocation
+tolerance::
+
+    python -m benchmarks.codec --output codec.json
+    # change the code
+    python -m benchmarks.codec --baseline codec.json
+"""
+import argparse
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import struct
+import sys
+import timeit
+import tracemalloc
+
+from modbusclient import AtomicType, DataType, Fixpoint, Payload, String
+from modbusclient import Timestamp
+from modbusclient.api_wrapper import iter_matching_names
+from modbusclient.data_types import bcd_decode
+from modbusclient.functions import (
+    READ_HOLDING_REGISTERS,
+    WRITE_MULTIPLE_REGISTERS
+)
+from modbusclient.protocol import (
+    ApplicationProtocolHeader,
+    new_request,
+    parse_response_body,
+    parse_response_header
+)
+
+from .common import compare, load_results, write_results
+
+
+@dataclass(slots=True)
+class Microbenchmark:
+    """Time and allocations per operation
+
+    Args:
+        name: Name of the benchmark
+        ns_per_op: Best time per operation in nanoseconds
+        blocks_per_op: Memory blocks retained per operation
+        bytes_per_op: Bytes retained per operation
+        peak_bytes: Peak of the memory allocated by a single operation
+    """
+    name: str
+    ns_per_op: float = 0.
+    blocks_per_op: float = 0.
+    bytes_per_op: float = 0.
+    peak_bytes: int = 0
+
+    @property
+    def key(self) -> str:
+        """Get unique key of the benchmark
+
+        Return:
+            Name of the benchmark
+        """
+        return self.name
+
+    def summary(self) -> dict:
+        """Summarize benchmark
+
+        Return:
+            Dictionary suitable for JSON serialization
+        """
+        return {
+            "name": self.name,
+            "ns_per_op": self.ns_per_op,
+            "blocks_per_op": self.blocks_per_op,
+            "bytes_per_op": self.bytes_per_op,
+            "peak_bytes": self.peak_bytes
+        }
+
+
+def time_per_op(operation: Callable[[], object], repeat: int = 5,
+                min_time: float = 0.2) -> float:
+    """Measure best time per operation
+
+    Args:
+        operation: Function to measure
+        repeat: Number of measurements. Defaults to 5.
+        min_time: Minimum duration of each measurement in seconds. Defaults
+            to 0.2.
+
+    Return:
+        Minimum time per operation over all measurements in nanoseconds
+    """
+    timer = timeit.Timer(operation)
+    number, elapsed = timer.autorange()
+    number = max(int(number * min_time / elapsed), 1) if elapsed else number
+    return 1e9 * min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def allocations_per_op(
+    operation: Callable[[], object],
+    number: int = 4000
+) -> tuple[float, float, int]:
+    """Trace memory allocated per operation
+
+    Small objects such as tuples and floats are recycled via free lists,
+    which are not seen by :mod:`tracemalloc`. The free lists are therefore
+    drained first by retaining the results of `number` untraced operations.
+
+    Args:
+        operation: Function to measure
+        number: Number of operations, whose results are retained. Should
+            exceed the size of the free lists of the types returned. Defaults
+            to 4000.
+
+    Return:
+        Blocks and bytes retained per operation and peak of the memory
+        allocated by a single operation in bytes
+    """
+    drained = [operation() for i in range(number)]
+    results = [None] * number
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        for i in range(number):
+            results[i] = operation()
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        operation()
+        peak = tracemalloc.get_traced_memory()[1] - current
+    finally:
+        tracemalloc.stop()
+    del drained
+    stats = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    return blocks / number, size / number, peak
+
+
+def make_api(count: int) -> dict[str, Payload]:
+    """Create API with named payloads
+
+    Args:
+        count: Number of payloads
+
+    Return:
+        API definition
+    """
+    return {f"device/value_{i}": Payload(AtomicType("H"),
+                                         address=i,
+                                         name=f"device/value_{i}")
+            for i in range(count)}
+
+
+def iter_benchmarks(quick: bool = False):
+    """Iterate over all benchmarks
+
+    Args:
+        quick: If ``True``, the large API has 1000 instead of 10000 payloads.
+
+    Yield:
+        tuple(str, callable): Name and operation of each benchmark
+    """
+    yield ("protocol.new_request[read]",
+           lambda: new_request(READ_HOLDING_REGISTERS, start=0, count=125))
+    payload = bytes(246)
+    yield ("protocol.new_request[write]",
+           lambda: new_request(WRITE_MULTIPLE_REGISTERS, payload,
+                               start=0, count=123))
+
+    header_size = ApplicationProtocolHeader.get_parser().size
+    response = b"".join([
+        struct.pack("!HHHBBB", 1, 0, 3 + 250, 1, READ_HOLDING_REGISTERS, 250),
+        bytes(250)
+    ])
+    buffer = response[:header_size]
+    yield ("protocol.parse_response_header",
+           lambda: parse_response_header(buffer))
+    header = parse_response_header(buffer)
+    body = response[header_size:]
+    yield ("protocol.parse_response_body",
+           lambda: parse_response_body(header, body))
+
+    for swap in (False, True):
+        suffix = "[swap_words]" if swap else ""
+        dtype = DataType("4H", swap_words=swap)
+        data = dtype.encode(1, 2, 3, 4)
+        yield f"DataType.encode{suffix}", lambda t=dtype: t.encode(1, 2, 3, 4)
+        yield f"DataType.decode{suffix}", lambda t=dtype, d=data: t.decode(d)
+
+        dtype = AtomicType("f", swap_words=swap)
+        data = dtype.encode(1.5)
+        yield f"AtomicType.encode{suffix}", lambda t=dtype: t.encode(1.5)
+        yield f"AtomicType.decode{suffix}", lambda t=dtype, d=data: t.decode(d)
+
+        dtype = String(16, swap_words=swap)
+        data = dtype.encode("modbusclient")
+        yield (f"String.encode{suffix}",
+               lambda t=dtype: t.encode("modbusclient"))
+        yield f"String.decode{suffix}", lambda t=dtype, d=data: t.decode(d)
+
+    msg = Fixpoint(AtomicType("i"), address=0, digits=2)
+    data = msg.encode(230.12)
+    yield "Fixpoint.encode", lambda: msg.encode(230.12)
+    yield "Fixpoint.decode", lambda: msg.decode(data)
+
+    stamp = Timestamp(AtomicType("I"), address=0)
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    data = stamp.encode(now)
+    yield "Timestamp.encode", lambda: stamp.encode(now)
+    yield "Timestamp.decode", lambda: stamp.decode(data)
+
+    yield "bcd_decode", lambda: bcd_decode(0x42)
+
+    count = 1000 if quick else 10000
+    api = make_api(count)
+    yield (f"iter_matching_names[{count}]",
+           lambda: list(iter_matching_names("device/value_1?", api)))
+
+
+def run(names=None, quick=False):
+    """Run benchmarks
+
+    Arguments:
+        names (iterable): Substrings of the names of the benchmarks to run. If
+            empty or ``None``, all benchmarks are run.
+        quick (bool): Measure for a shorter time
+
+    Yield:
+        Microbenchmark: Result of each benchmark
+    """
+    min_time = 0.02 if quick else 0.2
+    for name, operation in iter_benchmarks(quick):
+        if names and not any(pattern in name for pattern in names):
+            continue
+        ns = time_per_op(operation, min_time=min_time)
+        # Trace about 0.2 s worth of operations
+        number = min(max(int(2e8 / ns), 100), 4000)
+        blocks, size, peak = allocations_per_op(operation, number)
+        result = Microbenchmark(name, ns, blocks, size, peak)
+        print(f"{name:<40} {result.ns_per_op:>10.0f} ns"
+              f"  {blocks:6.2f} blocks  {size:8.1f} bytes"
+              f"  peak {peak:6d} bytes", flush=True)
+        yield result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("names",
+                        nargs="*",
+                        metavar="NAME",
+                        help="Run only benchmarks containing any NAME")
+    parser.add_argument("-o", "--output",
+                        default="codec.json",
+                        help="Path of the JSON file to write. "
+                             "Defaults to %(default)s.")
+    parser.add_argument("-b", "--baseline",
+                        help="Path of JSON results to compare against")
+    parser.add_argument("-t", "--tolerance",
+                        type=float,
+                        default=0.25,
+                        help="Relative increase of the time per operation "
+                             "tolerated. Defaults to %(default)s.")
+    parser.add_argument("-a", "--alloc-tolerance",
+                        type=float,
+                        default=0.,
+                        help="Relative increase of the blocks and bytes "
+                             "allocated per operation tolerated. Defaults to "
+                             "%(default)s.")
+    parser.add_argument("-q", "--quick",
+                        action="store_true",
+                        help="Measure for a shorter time")
+    args = parser.parse_args(argv)
+
+    results = write_results(args.output, list(run(args.names, args.quick)))
+    if args.baseline is None:
+        return 0
+    limits = {"ns_per_op": args.tolerance,
+              "blocks_per_op": args.alloc_tolerance,
+              "bytes_per_op": args.alloc_tolerance}
+    regressions = compare(results["results"],
+                          load_results(args.baseline),
+                          limits)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
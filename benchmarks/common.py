@@ -0,0 +1,326 @@
+"""Helpers shared by the benchmarks
+
+Measurements are collected as :class:`Measurement` objects, written to JSON
+files via :func:`write_results` and compared against a stored baseline via
+:func:`compare`.
+"""
+import asyncio
+from collections.abc import Awaitable, Callable, Iterable, Mapping
+from dataclasses import dataclass, field
+import json
+import math
+import platform
+import sys
+import threading
+import time
+
+from modbusclient import __version__
+from modbusclient.asyncio import Simulator
+
+
+@dataclass(slots=True)
+class Measurement:
+    """Latencies of a single benchmark run
+
+    Args:
+        name: Name of the benchmark target
+        params: Parameters of the run
+        latencies: Latency of each operation in seconds
+        elapsed: Wall clock time of the run in seconds
+        requests: Number of Modbus requests sent during the run
+    """
+    name: str
+    params: dict
+    latencies: list[float] = field(default_factory=list)
+    elapsed: float = 0.
+    requests: int = 0
+
+    @property
+    def key(self) -> str:
+        """Get unique key of the run
+
+        Return:
+            Name followed by the sorted parameters
+        """
+        params = ",".join(f"{k}={v}" for k, v in sorted(self.params.items()))
+        return f"{self.name}[{params}]"
+
+    def summary(self) -> dict:
+        """Summarize run
+
+        Return:
+            Dictionary suitable for JSON serialization
+        """
+        ops = len(self.latencies)
+        rate = 1 / self.elapsed if self.elapsed > 0 else 0.
+        return {
+            "name": self.name,
+            "params": self.params,
+            "operations": ops,
+            "requests": self.requests,
+            "elapsed": self.elapsed,
+            "requests_per_s": rate * self.requests,
+            "operations_per_s": rate * ops,
+            "p50_ms": 1e3 * percentile(self.latencies, 50),
+            "p99_ms": 1e3 * percentile(self.latencies, 99)
+        }
+
+
+def percentile(samples: Iterable[float], q: float) -> float:
+    """Compute percentile using the nearest rank method
+
+    Args:
+        samples: Samples
+        q: Percentile in the range [0, 100]
+
+    Return:
+        Smallest sample, which is larger or equal to `q` percent of all
+        samples. ``nan`` if `samples` is empty.
+    """
+    samples = sorted(samples)
+    if not samples:
+        return math.nan
+    rank = max(math.ceil(q / 100 * len(samples)), 1)
+    return samples[rank - 1]
+
+
+def measure(
+    measurement: Measurement,
+    operation: Callable[[], object],
+    repeat: int,
+    duration: float = math.inf,
+    warmup: int = 10,
+    counter: Callable[[], int] | None = None
+) -> Measurement:
+    """Measure latency of a synchronous operation
+
+    Args:
+        measurement: Measurement updated with the results
+        operation: Function called up to `repeat` times
+        repeat: Maximum number of operations to measure
+        duration: Maximum duration of the measurement in seconds. Defaults to
+            infinity.
+        warmup: Number of operations executed before the measurement starts.
+            Defaults to 10.
+        counter: Function returning the number of requests sent so far. If
+            ``None``, one request per operation is assumed. Defaults to
+            ``None``.
+
+    Return:
+        `measurement`
+    """
+    for i in range(warmup):
+        operation()
+    clock = time.perf_counter
+    latencies = measurement.latencies
+    requests = counter() if counter is not None else len(latencies)
+    begin = clock()
+    deadline = begin + duration
+    for i in range(repeat):
+        started = clock()
+        if started > deadline:
+            break
+        operation()
+        latencies.append(clock() - started)
+    measurement.elapsed += clock() - begin
+    _count_requests(measurement, counter, requests)
+    return measurement
+
+
+async def measure_async(
+    measurement: Measurement,
+    operation: Callable[[], Awaitable],
+    repeat: int,
+    duration: float = math.inf,
+    concurrency: int = 1,
+    warmup: int = 10,
+    counter: Callable[[], int] | None = None
+) -> Measurement:
+    """Measure latency of an asynchronous operation
+
+    Args:
+        measurement: Measurement updated with the results
+        operation: Coroutine function awaited up to `repeat` times in total
+        repeat: Maximum number of operations to measure
+        duration: Maximum duration of the measurement in seconds. Defaults to
+            infinity.
+        concurrency: Number of operations in progress at the same time.
+            Defaults to 1.
+        warmup: Number of operations executed before the measurement starts.
+            Defaults to 10.
+        counter: Function returning the number of requests sent so far. If
+            ``None``, one request per operation is assumed. Defaults to
+            ``None``.
+
+    Return:
+        `measurement`
+    """
+    for i in range(warmup):
+        await operation()
+    clock = time.perf_counter
+    latencies = measurement.latencies
+    requests = counter() if counter is not None else len(latencies)
+    remaining = repeat
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0 and clock() < deadline:
+            remaining -= 1
+            started = clock()
+            await operation()
+            latencies.append(clock() - started)
+
+    begin = clock()
+    deadline = begin + duration
+    await asyncio.gather(*(worker() for i in range(concurrency)))
+    measurement.elapsed += clock() - begin
+    _count_requests(measurement, counter, requests)
+    return measurement
+
+
+def _count_requests(measurement, counter, start):
+    """Add number of requests sent during a measurement
+
+    Arguments:
+        measurement (Measurement): Measurement to update
+        counter (callable): Function returning the number of requests sent
+            so far or ``None`` to count operations instead
+        start (int): Value of the counter at the start of the measurement
+    """
+    if counter is None:
+        measurement.requests += len(measurement.latencies) - start
+    else:
+        measurement.requests += counter() - start
+
+
+class SimulatorThread:
+    """Run a simulator in an event loop of a background thread
+
+    Used to benchmark the synchronous clients, which block the calling thread.
+
+    Args:
+        simulator: Simulator to run
+    """
+    def __init__(self, simulator: Simulator) -> None:
+        self.simulator = simulator
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        daemon=True)
+
+    def __enter__(self) -> int:
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+    def start(self) -> int:
+        """Start thread and simulator
+
+        Return:
+            Port the simulator listens on
+        """
+        self._thread.start()
+        return self._run(self.simulator.start(port=0))
+
+    def stop(self) -> None:
+        """Stop simulator and thread"""
+        self._run(self.simulator.stop())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+
+def write_results(path: str, measurements: Iterable) -> dict:
+    """Write results to JSON file
+
+    Args:
+        path: Path of the file to write
+        measurements: Measurements to write. Each must provide a ``key`` and
+            a ``summary`` method like :class:`Measurement`.
+
+    Return:
+        Dictionary written
+    """
+    results = {
+        "meta": {
+            "modbusclient": __version__,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        },
+        "results": {m.key: m.summary() for m in measurements}
+    }
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    return results
+
+
+def load_results(path: str) -> dict:
+    """Load results written by :func:`write_results`
+
+    Args:
+        path: Path of the file to read
+
+    Return:
+        Dictionary containing the results by key of the measurement
+    """
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def compare(
+    results: dict,
+    baseline: dict,
+    limits: Mapping[str, float]
+) -> list[str]:
+    """Compare results against a baseline
+
+    A result is considered a regression if any metric in `limits` changed by
+    more than the respective limit relative to the baseline. Positive limits
+    restrict increases of metrics, for which lower is better, such as
+    latencies. Negative limits restrict decreases of metrics, for which higher
+    is better, such as throughput. Results missing in either set are ignored.
+
+    Args:
+        results: Current results by key as returned by :func:`load_results`
+        baseline: Baseline results by key
+        limits: Maximum relative change tolerated by name of the metric
+
+    Return:
+        Keys of the results, which regressed
+    """
+    regressions = []
+    for key, result in results.items():
+        try:
+            base = baseline[key]
+        except KeyError:
+            continue
+        changes = {name: _relative_change(result[name], base[name])
+                   for name in limits}
+        regressed = any(change > limit if limit >= 0 else change < limit
+                        for change, limit in zip(changes.values(),
+                                                 limits.values()))
+        details = "  ".join(f"{name} {change:+7.1%}"
+                            for name, change in changes.items())
+        print(f"{'REGRESSION' if regressed else 'ok':<10} {key:<72} {details}")
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+
+def _relative_change(value, base):
+    """Compute change relative to baseline
+
+    Arguments:
+        value (float): Current value
+        base (float): Baseline value
+
+    Return:
+        float: Relative change. Infinite if `base` is 0 and `value` is not.
+    """
+    if base == 0:
+        return 0. if value == 0 else math.copysign(math.inf, value)
+    return value / base - 1
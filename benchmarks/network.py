@@ -0,0 +1,306 @@
+"""End-to-end throughput and latency benchmarks
+
+Measures requests per second and p50/p99 latency of the synchronous and
+asynchronous clients and API wrappers against a local
+:class:`~modbusclient.asyncio.Simulator`. The following parameters are swept:
+
+* ``rtt``: Simulated round trip time in seconds added by the simulator
+* ``block``: Number of registers per request of the clients
+* ``depth``: Pipeline depth, i.e. number of concurrent transactions of the
+  asynchronous targets and of requests processed by the simulator
+* ``payloads``: Number of payloads of the API read by the wrappers
+* ``method``: Method of the wrappers used to read all payloads. Either
+  ``read``, which sends one request per payload, or ``cached_read``, which
+  coalesces payloads into blocks of up to 125 registers
+
+Results are written to a JSON file. If a baseline written by a previous run is
+given, the results are compared against it and the exit status is 1 if any
+benchmark regressed::
+
+    python -m benchmarks.network --output baseline.json
+    # change the code
+    python -m benchmarks.network --baseline baseline.json
+"""
+import argparse
+import asyncio
+from dataclasses import dataclass
+import functools
+import itertools
+import sys
+
+from modbusclient import ApiWrapper, AtomicType, Client, Payload
+from modbusclient import asyncio as aio
+from modbusclient.error_codes import NO_ERROR
+from modbusclient.functions import READ_HOLDING_REGISTERS
+
+from .common import (
+    Measurement,
+    SimulatorThread,
+    compare,
+    load_results,
+    measure,
+    measure_async,
+    write_results
+)
+
+TARGETS = ("client", "asyncio.client", "api_wrapper", "asyncio.api_wrapper")
+
+
+@dataclass(slots=True)
+class Settings:
+    """Parameters swept and limits of each run
+
+    Attributes:
+        rtts: Simulated round trip times in seconds
+        blocks: Number of registers per request
+        depths: Pipeline depths of the asynchronous targets
+        payloads: Number of payloads read by the wrappers
+        methods: Methods of the wrappers used to read the payloads
+        repeat: Maximum number of operations per run
+        duration: Maximum duration of each run in seconds
+        warmup: Number of operations before each run
+    """
+    rtts: tuple[float, ...] = (0., 0.001, 0.005)
+    blocks: tuple[int, ...] = (1, 16, 125)
+    depths: tuple[int, ...] = (1, 4, 16)
+    payloads: tuple[int, ...] = (10, 100, 500)
+    methods: tuple[str, ...] = ("read", "cached_read")
+    repeat: int = 2000
+    duration: float = 2.
+    warmup: int = 3
+
+
+QUICK = Settings(rtts=(0., 0.001),
+                 blocks=(1, 125),
+                 depths=(1, 8),
+                 payloads=(10, 100),
+                 repeat=200,
+                 duration=0.25,
+                 warmup=1)
+
+
+def make_api(count):
+    """Create API of consecutive 16-bit payloads
+
+    Arguments:
+        count (int): Number of payloads
+
+    Return:
+        dict: API definition
+    """
+    return {f"value_{i}": Payload(AtomicType("H"), address=i, mode="r")
+            for i in range(count)}
+
+
+def check(error):
+    """Raise if a call failed
+
+    Arguments:
+        error (int): Error code returned by the client
+    """
+    if error != NO_ERROR:
+        raise RuntimeError("Benchmark request failed", error)
+
+
+def bench_client(settings):
+    """Benchmark the synchronous client
+
+    Arguments:
+        settings (Settings): Parameters to sweep
+
+    Yield:
+        Measurement: Result of each run
+    """
+    for rtt, block in itertools.product(settings.rtts, settings.blocks):
+        simulator = aio.Simulator(latency=rtt)
+        with SimulatorThread(simulator) as port:
+            with Client("127.0.0.1", port, timeout=5.) as client:
+                def operation():
+                    check(client.call(READ_HOLDING_REGISTERS,
+                                      start=0,
+                                      count=block)[2])
+
+                result = Measurement("client", dict(rtt=rtt, block=block))
+                measure(result, operation, settings.repeat, settings.duration,
+                        warmup=settings.warmup)
+        yield result
+
+
+def bench_api_wrapper(settings):
+    """Benchmark the synchronous API wrapper
+
+    Arguments:
+        settings (Settings): Parameters to sweep
+
+    Yield:
+        Measurement: Result of each run
+    """
+    for rtt, count, method in itertools.product(settings.rtts,
+                                                settings.payloads,
+                                                settings.methods):
+        api = make_api(count)
+        simulator = aio.Simulator.from_api(api, latency=rtt)
+        with SimulatorThread(simulator) as port:
+            with ApiWrapper(api, host="127.0.0.1", port=port,
+                            timeout=5.) as wrapper:
+                if method == "read":
+                    operation = wrapper.read
+                else:
+                    operation = functools.partial(wrapper.cached_read, dict())
+                result = Measurement("api_wrapper", dict(rtt=rtt,
+                                                         payloads=count,
+                                                         method=method))
+                measure(result, operation, settings.repeat,
+                        settings.duration,
+                        warmup=settings.warmup,
+                        counter=lambda: simulator.requests)
+        yield result
+
+
+async def bench_async_client(settings):
+    """Benchmark the asynchronous client
+
+    Arguments:
+        settings (Settings): Parameters to sweep
+
+    Return:
+        list: Measurement of each run
+    """
+    results = []
+    for rtt, block, depth in itertools.product(settings.rtts,
+                                               settings.blocks,
+                                               settings.depths):
+        async with aio.Simulator(latency=rtt,
+                                 max_pipeline=depth) as simulator:
+            client = aio.Client("127.0.0.1",
+                                await simulator.start(port=0),
+                                timeout=5.,
+                                max_transactions=depth)
+
+            async def operation():
+                header, payload, error = await client.call(
+                    READ_HOLDING_REGISTERS, start=0, count=block)
+                check(error)
+
+            result = Measurement("asyncio.client",
+                                 dict(rtt=rtt, block=block, depth=depth))
+            await measure_async(result, operation, settings.repeat,
+                                settings.duration, concurrency=depth,
+                                warmup=settings.warmup)
+            client.disconnect()
+        results.append(result)
+    return results
+
+
+async def bench_async_api_wrapper(settings):
+    """Benchmark the asynchronous API wrapper
+
+    Arguments:
+        settings (Settings): Parameters to sweep
+
+    Return:
+        list: Measurement of each run
+    """
+    results = []
+    for rtt, count, method, depth in itertools.product(settings.rtts,
+                                                       settings.payloads,
+                                                       settings.methods,
+                                                       settings.depths):
+        api = make_api(count)
+        async with aio.Simulator.from_api(api,
+                                          latency=rtt,
+                                          max_pipeline=depth) as simulator:
+            wrapper = aio.ApiWrapper(api,
+                                     host="127.0.0.1",
+                                     port=await simulator.start(port=0),
+                                     timeout=5.,
+                                     max_transactions=depth)
+            await wrapper.connect()
+            if method == "read":
+                operation = wrapper.read
+            else:
+                operation = functools.partial(wrapper.cached_read, dict())
+            result = Measurement("asyncio.api_wrapper", dict(rtt=rtt,
+                                                             payloads=count,
+                                                             method=method,
+                                                             depth=depth))
+            await measure_async(result, operation, settings.repeat,
+                                settings.duration, concurrency=depth,
+                                warmup=settings.warmup,
+                                counter=lambda: simulator.requests)
+            wrapper.disconnect()
+        results.append(result)
+    return results
+
+
+def run(targets, settings):
+    """Run benchmarks
+
+    Arguments:
+        targets (iterable): Names of the targets to benchmark
+        settings (Settings): Parameters to sweep
+
+    Yield:
+        Measurement: Result of each run
+    """
+    benchmarks = {
+        "client": bench_client,
+        "api_wrapper": bench_api_wrapper,
+        "asyncio.client": bench_async_client,
+        "asyncio.api_wrapper": bench_async_api_wrapper
+    }
+    for target in targets:
+        benchmark = benchmarks[target]
+        if asyncio.iscoroutinefunction(benchmark):
+            results = asyncio.run(benchmark(settings))
+        else:
+            results = benchmark(settings)
+        for result in results:
+            summary = result.summary()
+            print(f"{result.key:<72} {summary['requests_per_s']:>9.0f} req/s"
+                  f"  p50 {summary['p50_ms']:7.3f} ms"
+                  f"  p99 {summary['p99_ms']:7.3f} ms", flush=True)
+            yield result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("targets",
+                        nargs="*",
+                        metavar="TARGET",
+                        help=f"Targets to benchmark. Any of "
+                             f"{', '.join(TARGETS)}. Defaults to all.")
+    parser.add_argument("-o", "--output",
+                        default="benchmark.json",
+                        help="Path of the JSON file to write. "
+                             "Defaults to %(default)s.")
+    parser.add_argument("-b", "--baseline",
+                        help="Path of JSON results to compare against")
+    parser.add_argument("-t", "--tolerance",
+                        type=float,
+                        default=0.1,
+                        help="Relative change tolerated before a result is "
+                             "considered a regression. Defaults to "
+                             "%(default)s.")
+    parser.add_argument("-q", "--quick",
+                        action="store_true",
+                        help="Run a reduced sweep")
+    args = parser.parse_args(argv)
+    for target in args.targets:
+        if target not in TARGETS:
+            parser.error(f"Unknown target {target!r}")
+
+    settings = QUICK if args.quick else Settings()
+    results = write_results(args.output,
+                            list(run(args.targets or TARGETS, settings)))
+    if args.baseline is None:
+        return 0
+    limits = {"requests_per_s": -args.tolerance, "p99_ms": args.tolerance}
+    regressions = compare(results["results"],
+                          load_results(args.baseline),
+                          limits)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
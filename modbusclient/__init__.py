@@ -6,8 +6,17 @@ from .protocol import ApplicationProtocolHeader, Error, new_request
 from .protocol import parse_response_body, parse_response_header
 from .protocol import ReadRequest, WriteRequest, ReadResponse, WriteResponse
 from .client import Client
+from .multi_client import MultiClient
 from .data_types import DataType, String, AtomicType, bcd_encode, bcd_decode
 from .payload import Payload, Enum, Fixpoint, Timestamp
 from .api_wrapper import ApiWrapper
+from .device_pool import DevicePool
 from .api_wrapper import iter_matching_names, as_payload, iter_payloads
+from .blocks import Block, plan_blocks
+from .breaker import CircuitBreaker, CircuitOpenError
+from .metrics import ClientMetrics, Histogram, PhaseProfile
+from .hooks import Hooks
+from .exporter import PrometheusExporter
+from .cache import Cache, NegativeCache
+from .register_image import RegisterImage, SharedImage, DeviceImage
 from .derivative import Derivative
@@ -1,7 +1,11 @@
 from .protocol import NO_UNIT, DEFAULT_PORT
-from .error_codes import ModbusError
+from .error_codes import ModbusError, ILLEGAL_FUNCTION_ERROR
 from .client import Client
+from .functions import READ_HOLDING_REGISTERS, WRITE_MULTIPLE_REGISTERS
 from .payload import Payload
+from .blocks import Block, plan_blocks, to_registers, plan_writes
+from .cache import Cache, NegativeCache, UNSUPPORTED_ERRORS
+from .metrics import DECODE
 
 from logging import getLogger
 from typing import Any
@@ -120,6 +124,101 @@ def from_cache(
     return found, remaining
 
 
+def encode_settings(
+    settings: dict[Payload | object, object],
+    api: dict[object, Payload]
+) -> dict[Payload, bytes]:
+    """Encode the writable messages of a settings dictionary
+
+    Messages which cannot be resolved or encoded are logged and skipped.
+
+    Args:
+        settings: Dictionary containing messages (API keys or Payload objects)
+            as key and values as value
+        api: API definition
+
+    Return:
+        Dictionary containing Payload as key and encoded value as value
+    """
+    retval = dict()
+    for key, value in settings.items():
+        try:
+            msg = as_payload(key, api)
+            if msg.is_writable:
+                retval[msg] = msg.encode(value)
+        except Exception as ex:
+            logger.error(f"While encoding message {key}: {ex}")
+    return retval
+
+
+def unchanged_or_written(
+    encoded: dict[Payload, bytes],
+    failed: set[int]
+) -> dict[Payload, object]:
+    """Get settings held by the device after deduplicated writes
+
+    Args:
+        encoded: Encoded settings as returned by :func:`encode_settings`
+        failed: Addresses of registers which could not be written
+
+    Return:
+        Dictionary containing Payload as key and decoded value as value for
+        each message, whose registers were written or held the value already
+    """
+    return {msg: msg.decode(buffer) for msg, buffer in encoded.items()
+            if failed.isdisjoint(range(msg.address,
+                                       msg.address + msg.register_count))}
+
+
+def is_unsupported(
+    exc: ModbusError,
+    negative_cache: NegativeCache | None = None
+) -> bool:
+    """Check if an exception response indicates unsupported payloads
+
+    Blocks failing with such an exception are read payload by payload to find
+    the culprit. Other exceptions, e.g. ``SERVER_DEVICE_BUSY``, apply to the
+    device as a whole.
+
+    Args:
+        exc: Exception raised by a block read
+        negative_cache: Negative cache defining the exception codes. If
+            ``None``, :data:`~modbusclient.cache.UNSUPPORTED_ERRORS` is used.
+
+    Return:
+        ``True`` if the payloads of the block shall be read one by one
+    """
+    errors = UNSUPPORTED_ERRORS if negative_cache is None \
+        else negative_cache.errors
+    return exc.args[0] in errors
+
+
+def filter_blocks(
+    blocks: Iterable[Block],
+    negative_cache: NegativeCache
+) -> list[Block]:
+    """Remove payloads suppressed by a negative cache from blocks
+
+    Blocks containing suppressed payloads are split into new blocks holding
+    the remaining payloads.
+
+    Args:
+        blocks: Blocks to read
+        negative_cache: Negative cache
+
+    Return:
+        Blocks containing only payloads, which are not suppressed
+    """
+    retval = []
+    for block in blocks:
+        payloads = negative_cache.filter(block.payloads)
+        if len(payloads) == len(block.payloads):
+            retval.append(block)
+        elif payloads:
+            retval.extend(plan_blocks(payloads, max_count=block.count))
+    return retval
+
+
 class ApiWrapper:
     """Default API implementation to quickly
 
@@ -135,6 +234,23 @@ class ApiWrapper:
             :class:`~modbusclient.client.Client`
         connect (bool): Connect to the client. Defaults to `False`. Passed
              verbatim to :class:`~modbusclient.client.Client`
+        thread_safe (bool): Serialize access to the connection, so that the
+            wrapper can be shared by several threads. Defaults to `False`.
+            Passed verbatim to :class:`~modbusclient.client.Client`
+        image (DeviceImage): Device image updated with the registers of every
+            successful response. Defaults to ``None``.
+        negative_cache (NegativeCache): Cache of payloads not supported by the
+            device, which are skipped by :meth:`read` and :meth:`cached_read`
+            until their backoff delay expires. Defaults to ``None``.
+        profile (PhaseProfile): Profile recording the time spent in each
+            phase of a request including decoding. Passed verbatim to
+            :class:`~modbusclient.client.Client`. Defaults to ``None``.
+        hooks (Hooks): Hooks called on requests, responses, errors and
+            reconnects. Passed verbatim to
+            :class:`~modbusclient.client.Client`. Defaults to ``None``.
+        metrics (ClientMetrics): Metrics updated by each request. Passed
+            verbatim to :class:`~modbusclient.client.Client`. Defaults to
+            ``None``.
 
     Attributes:
         unit (int): Modbus unit ID: Defaults to NO_UNIT.
@@ -146,14 +262,27 @@ class ApiWrapper:
         port=DEFAULT_PORT,
         timeout=None,
         connect=False,
-        unit=NO_UNIT
+        unit=NO_UNIT,
+        thread_safe=False,
+        image=None,
+        negative_cache=None,
+        profile=None,
+        hooks=None,
+        metrics=None
     ) -> None:
         self._api = api if api is not None else dict()
         self._client = Client(host=host,
                               port=port,
                               timeout=timeout,
-                              connect=connect)
+                              connect=connect,
+                              thread_safe=thread_safe,
+                              profile=profile,
+                              hooks=hooks,
+                              metrics=metrics)
         self.unit = unit
+        self._image = image
+        self._negative = negative_cache
+        self._profile = profile
 
     def __enter__(self):
         """Context Manager support
@@ -171,6 +300,33 @@ class ApiWrapper:
         self.logout()
         self.disconnect()
 
+    @property
+    def metrics(self):
+        """Get metrics updated by each request
+
+        Return:
+            :class:`~modbusclient.metrics.ClientMetrics` or ``None``
+        """
+        return self._client.metrics
+
+    @property
+    def image(self):
+        """Get device image updated by every response
+
+        Return:
+            :class:`~modbusclient.register_image.DeviceImage` or ``None``
+        """
+        return self._image
+
+    @property
+    def negative_cache(self):
+        """Get cache of payloads not supported by the device
+
+        Return:
+            :class:`~modbusclient.cache.NegativeCache` or ``None``
+        """
+        return self._negative
+
     def is_connected(self):
         """Check if this client is connected to a server
 
@@ -244,8 +400,57 @@ class ApiWrapper:
             unit=self.unit,
             transaction=0)
         if err_code:
+            if self._negative is not None:
+                self._negative.record_failure(msg, err_code)
             raise ModbusError(err_code)
-        return msg.decode(payload)
+        if self._negative is not None:
+            self._negative.record_success(msg)
+        self._mirror(msg.reader, msg.address, payload)
+        return self._decode(msg.reader, msg.address, msg.register_count,
+                            msg.decode, payload)
+
+    def get_block(self, block):
+        """Read all messages of a block with a single request
+
+        Arguments:
+            block (:class:`~modbusclient.blocks.Block`): Block to read
+
+        Return:
+            dict: Dictionary containing Payload as key and value as value
+        """
+        header, payload, err_code = self._client.call(
+            function=block.function,
+            start=block.start,
+            count=block.count,
+            unit=self.unit,
+            transaction=0)
+        if err_code:
+            raise ModbusError(err_code)
+        if self._negative is not None:
+            for msg in block.payloads:
+                self._negative.record_success(msg)
+        self._mirror(block.function, block.start, payload)
+        return self._decode(block.function, block.start, block.count,
+                            block.decode, payload)
+
+    def _decode(self, function, start, count, decode, payload):
+        """Decode response and record the time spent in the profile
+
+        Arguments:
+            function (int): Function code of the request
+            start (int): Address of the first register requested
+            count (int): Number of registers requested
+            decode (callable): Function decoding `payload`
+            payload (bytes): Payload of the response
+
+        Return:
+            Result of `decode`
+        """
+        profile = self._profile
+        if profile is None:
+            return decode(payload)
+        key = profile.key(self.unit, function, start, count)
+        return profile.measure(key, DECODE, decode, payload)
 
     def set(self, message, value):
         """Set value of a single message
@@ -287,6 +492,7 @@ class ApiWrapper:
             # next best thing to do.
             payload = encoded_payload
 
+        self._mirror(msg.reader, msg.address, payload)
         return msg.decode(payload)
 
     def read(self, selection=None):
@@ -297,6 +503,8 @@ class ApiWrapper:
                 objects) to read. If ``None``, all messages of the current API
                 are read.
 
+        Messages suppressed by the negative cache are skipped.
+
         Return:
             dict: Dictionary containing Payload as key and setting as value
         """
@@ -306,20 +514,32 @@ class ApiWrapper:
         for key in selection:
             msg = as_payload(key, self._api)
             if msg.is_readable:
+                if self._negative is not None and \
+                        self._negative.is_suppressed(msg):
+                    self._negative.skipped += 1
+                    continue
                 try:
                     retval[msg] = self.get(msg)
                 except Exception as ex:
                     logger.error(f"While retrieving {msg}: {ex}")
         return retval
 
-    def cached_read(self, cache, selection=None):
+    def cached_read(self, cache, selection=None, max_gap=0):
         """Read values from device, which are not found in cache
 
+        Values missing in the cache are coalesced into as few block reads as
+        possible. If `cache` is a :class:`~modbusclient.cache.Cache`, the
+        values read are stored in the cache. Plain dictionaries are left
+        unchanged.
+
         Arguments:
             cache (dict): Cache with Payload instance as key
             selection (iterable): Iterable of messages (API keys or Payload
                 objects) to read. If ``None``, all messages of the current API
                 are read.
+            max_gap (int): Maximum number of unused registers read to merge
+                adjacent messages into a single block. Defaults to 0.
+
         Return:
             dict: Dictionary containing Payload as key and setting as value
         """
@@ -328,18 +548,86 @@ class ApiWrapper:
         cached, remaining = from_cache(selection=selection,
                                        cache=cache,
                                        api=self._api)
-        cached.update(self.read(remaining))
+        blocks = plan_blocks((msg for msg in remaining if msg.is_readable),
+                             max_gap=max_gap)
+        update = self._read_blocks(blocks)
+        if isinstance(cache, Cache):
+            cache.update(update)
+        cached.update(update)
         return cached
 
-    def set_from(self, settings):
+    def _mirror(self, function, start, payload):
+        """Store registers in the device image, if any
+
+        Arguments:
+            function (int): Function code used to read the registers
+            start (int): Address of the first register
+            payload (bytes): Raw data
+        """
+        if self._image is not None and function is not None:
+            self._image.update(self.unit, function, start, payload)
+
+    def _read_blocks(self, blocks):
+        """Read a sequence of blocks
+
+        Payloads suppressed by the negative cache are removed from the blocks
+        first. If a block fails with an exception indicating unsupported
+        registers, its payloads are read one by one, so that a single
+        unsupported register does not prevent reading the others. The
+        negative cache, if any, records the culprit.
+
+        Arguments:
+            blocks (iterable): Blocks as returned by
+                :func:`~modbusclient.blocks.plan_blocks`.
+
+        Return:
+            dict: Dictionary containing Payload as key and setting as value
+        """
+        retval = dict()
+        for block in self._filter_blocks(blocks):
+            try:
+                retval.update(self.get_block(block))
+            except ModbusError as ex:
+                if is_unsupported(ex, self._negative):
+                    retval.update(self.read(block.payloads))
+                    continue
+                logger.error(f"While retrieving block {block.start}:"
+                             f"{block.end}: {ex}")
+            except Exception as ex:
+                logger.error(f"While retrieving block {block.start}:"
+                             f"{block.end}: {ex}")
+        return retval
+
+    def _filter_blocks(self, blocks):
+        """Remove payloads suppressed by the negative cache from blocks
+
+        Arguments:
+            blocks (iterable): Blocks to read
+
+        Return:
+            list: Blocks containing only payloads not suppressed
+        """
+        if self._negative is None:
+            return list(blocks)
+        return filter_blocks(blocks, self._negative)
+
+    def set_from(self, settings, deduplicate=False):
         """Load settings from dictionary
 
         Arguments:
             settings (dict): Dictionary with settings as returned by
                  :meth:`Client.read`
+            deduplicate (bool): If ``True``, the registers of all writable
+                messages are read first and only registers holding different
+                data are written. These are merged into as few
+                ``WRITE_MULTIPLE_REGISTERS`` requests as possible. Avoids
+                needless writes to devices persisting each write to flash.
+                Defaults to ``False``.
         Return:
             dict: Successfully modified settings with their respective value
         """
+        if deduplicate:
+            return self._set_changed(settings)
         retval = dict()
         for key, value in settings.items():
             msg = as_payload(key, self._api)
@@ -351,3 +639,68 @@ class ApiWrapper:
                 except:
                     logger.error(f"While setting message {key}: Unknown error")
         return retval
+
+    def _set_changed(self, settings):
+        """Write only registers differing from the state of the device
+
+        Arguments:
+            settings (dict): Dictionary with settings
+
+        Return:
+            dict: Settings held by the device with their respective value
+        """
+        encoded = encode_settings(settings, self._api)
+        current = dict()
+        for block in plan_blocks(msg for msg in encoded if msg.is_readable):
+            try:
+                header, payload, err_code = self._client.call(
+                    function=block.function,
+                    start=block.start,
+                    count=block.count,
+                    unit=self.unit)
+                if err_code:
+                    raise ModbusError(err_code)
+            except Exception as ex:
+                logger.error(f"While retrieving block {block.start}:"
+                             f"{block.end}: {ex}")
+                continue
+            self._mirror(block.function, block.start, payload)
+            current.update(block.registers(payload))
+
+        failed = set()
+        for start, buffer in plan_writes(to_registers(encoded), current):
+            try:
+                self._write_registers(start, buffer, encoded)
+            except Exception as ex:
+                logger.error(f"While writing registers {start}:"
+                             f"{start + len(buffer) // 2}: {ex}")
+                failed.update(range(start, start + len(buffer) // 2))
+        return unchanged_or_written(encoded, failed)
+
+    def _write_registers(self, start, buffer, encoded):
+        """Write consecutive registers with a single request
+
+        Logs in and retries once, if the device rejects the request and any
+        message in range is write protected.
+
+        Arguments:
+            start (int): Address of the first register
+            buffer (bytes): Raw data to write
+            encoded (dict): Encoded settings containing the messages written
+        """
+        count = len(buffer) // 2
+        header, payload, err_code = self._client.call(
+            function=WRITE_MULTIPLE_REGISTERS,
+            start=start,
+            count=count,
+            payload=buffer,
+            unit=self.unit)
+        if err_code == ILLEGAL_FUNCTION_ERROR and not self.is_logged_in():
+            if any(msg.is_write_protected for msg in encoded
+                   if msg.address < start + count
+                   and start < msg.address + msg.register_count):
+                self.login()
+                return self._write_registers(start, buffer, encoded)
+        if err_code:
+            raise ModbusError(err_code)
+        self._mirror(READ_HOLDING_REGISTERS, start, buffer)
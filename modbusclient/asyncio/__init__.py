@@ -1,3 +1,11 @@
-from .client import Client
+from .client import Client, LOW_PRIORITY, HIGH_PRIORITY
+from .pool import ClientPool
+from .dispatcher import UnitDispatcher
+from .fleet import Device, DeviceSnapshot, FleetPoller
+from .sharding import ShardedPoller
 from .api_wrapper import ApiWrapper
+from .polling import Snapshot, Ticker, Scheduler, CostModel, PollStatistics
+from .proxy import Proxy
+from .simulator import Simulator, Faults
+from .exporter import MetricsServer
 from .autobahn import ComponentBase
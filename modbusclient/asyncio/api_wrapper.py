@@ -1,8 +1,19 @@
-from ..protocol import NO_UNIT, DEFAULT_PORT, ModbusError, ILLEGAL_FUNCTION_ERROR
-from ..api_wrapper import as_payload, from_cache
-from .client import Client
+from ..protocol import NO_UNIT, DEFAULT_PORT
+from ..error_codes import ModbusError, ILLEGAL_FUNCTION_ERROR
+from ..api_wrapper import as_payload, from_cache, filter_blocks
+from ..api_wrapper import is_unsupported
+from ..api_wrapper import encode_settings, unchanged_or_written
+from ..blocks import plan_blocks, to_registers, plan_writes
+from ..functions import READ_HOLDING_REGISTERS, WRITE_MULTIPLE_REGISTERS
+from ..cache import Cache
+from ..metrics import DECODE
+from .client import Client, HIGH_PRIORITY
+from .pool import ClientPool
+from .polling import Snapshot, Scheduler, CostModel, PollStatistics
 
 from logging import getLogger
+from operator import attrgetter
+from time import monotonic
 
 logger = getLogger('modbusclient')
 
@@ -23,9 +34,39 @@ class ApiWrapper(object):
         max_transactions (int): Maximum number of parallel transactions. Passed
             verbatim to :class:`~modbusclient.asyncio.client.Client`.
         unit (int): Modbus unit ID to use. Defaults to NO_UNIT.
+        reserved_transactions (int): Number of transactions reserved for
+            writes issued via :meth:`ApiWrapper.set`. Passed verbatim to
+            :class:`~modbusclient.asyncio.client.Client`. Defaults to 0.
+        connections (int): Number of TCP connections to the server. If larger
+            than one, requests are distributed over a
+            :class:`~modbusclient.asyncio.pool.ClientPool`. Defaults to 1.
+        client (object): Client to use instead of creating a new one. May be
+            any object providing the interface of
+            :class:`~modbusclient.asyncio.client.Client` such as a
+            :class:`~modbusclient.asyncio.pool.ClientPool` shared by several
+            wrappers. If provided, all connection related arguments are
+            ignored. Defaults to ``None``.
+        image (DeviceImage): Device image updated with the registers of every
+            successful response. Defaults to ``None``.
+        negative_cache (NegativeCache): Cache of payloads not supported by the
+            device, which are skipped by :meth:`read`, :meth:`poll` and
+            :meth:`cached_read` until their backoff delay expires. Defaults to
+            ``None``.
+        profile (:class:`~modbusclient.metrics.PhaseProfile`): Profile
+            recording the time spent in each phase of a request including
+            decoding. Passed verbatim to the client created. If `client` is
+            given, only decoding is recorded. Defaults to ``None``.
+        hooks (:class:`~modbusclient.hooks.Hooks`): Hooks called on requests,
+            responses, errors and reconnects. Passed verbatim to the client
+            created. Ignored if `client` is given. Defaults to ``None``.
+        metrics (:class:`~modbusclient.metrics.ClientMetrics`): Metrics
+            updated by each request. Passed verbatim to the client created.
+            Ignored if `client` is given. Defaults to ``None``.
 
     Attributes:
         unit (int): Modbus unit ID: Defaults to NO_UNIT.
+        poll_statistics (:class:`~modbusclient.asyncio.polling.PollStatistics`):
+            Statistics collected by :meth:`ApiWrapper.poll`.
     """
     def __init__(self,
                  api=None,
@@ -33,13 +74,81 @@ class ApiWrapper(object):
                  port=DEFAULT_PORT,
                  timeout=None,
                  max_transactions=3,
-                 unit=NO_UNIT):
+                 unit=NO_UNIT,
+                 reserved_transactions=0,
+                 connections=1,
+                 client=None,
+                 image=None,
+                 negative_cache=None,
+                 profile=None,
+                 hooks=None,
+                 metrics=None):
         self._api = api if api is not None else dict()
-        self._client = Client(host=host,
-                              port=port,
-                              timeout=timeout,
-                              max_transactions=max_transactions)
+        if client is not None:
+            self._client = client
+        elif connections > 1:
+            self._client = ClientPool(
+                host=host,
+                port=port,
+                timeout=timeout,
+                size=connections,
+                max_transactions=max_transactions,
+                reserved_transactions=reserved_transactions,
+                profile=profile,
+                hooks=hooks,
+                metrics=metrics)
+        else:
+            self._client = Client(host=host,
+                                  port=port,
+                                  timeout=timeout,
+                                  max_transactions=max_transactions,
+                                  reserved_transactions=reserved_transactions,
+                                  profile=profile,
+                                  hooks=hooks,
+                                  metrics=metrics)
         self.unit = unit
+        self._image = image
+        self._negative = negative_cache
+        self._profile = profile
+        self.poll_statistics = PollStatistics()
+        self._costs = CostModel()
+
+    @property
+    def client(self):
+        """Get client used to communicate with the server
+
+        Return:
+            :class:`~modbusclient.asyncio.client.Client` or compatible object
+        """
+        return self._client
+
+    @property
+    def metrics(self):
+        """Get metrics of the client
+
+        Return:
+            :class:`~modbusclient.metrics.ClientMetrics` or ``None``, if the
+            client collects no metrics
+        """
+        return getattr(self._client, "metrics", None)
+
+    @property
+    def image(self):
+        """Get device image updated by every response
+
+        Return:
+            :class:`~modbusclient.register_image.DeviceImage` or ``None``
+        """
+        return self._image
+
+    @property
+    def negative_cache(self):
+        """Get cache of payloads not supported by the device
+
+        Return:
+            :class:`~modbusclient.cache.NegativeCache` or ``None``
+        """
+        return self._negative
 
     async def __aenter__(self):
         """Context Manager support
@@ -127,16 +236,28 @@ class ApiWrapper(object):
         """
         msg = as_payload(message, self._api)
         logger.debug("Retrieving {} ...".format(msg))
-        header, payload, err_code = await self._client.call(
-            function=msg.reader,
-            start=msg.address,
-            count=msg.register_count,
-            unit=self.unit)
-        return msg.decode(payload)
+        try:
+            header, payload, err_code = await self._client.call(
+                function=msg.reader,
+                start=msg.address,
+                count=msg.register_count,
+                unit=self.unit)
+        except ModbusError as exc:
+            if self._negative is not None:
+                self._negative.record_failure(msg, exc.args[0])
+            raise
+        if self._negative is not None:
+            self._negative.record_success(msg)
+        self._mirror(msg.reader, msg.address, payload)
+        return self._decode(msg.reader, msg.address, msg.register_count,
+                            msg.decode, payload)
 
     async def set(self, message, value):
         """Set value of a single message
 
+        Write requests are sent with ``HIGH_PRIORITY`` and thus take
+        precedence over pending reads.
+
         Arguments:
             message (:class:`~modbusclient.payload.Payload` or str): Message
                 to write to remote device. If this is not a
@@ -157,7 +278,8 @@ class ApiWrapper(object):
                 start=msg.address,
                 count=msg.register_count,
                 payload=encoded_payload,
-                unit=self.unit)
+                unit=self.unit,
+                priority=HIGH_PRIORITY)
         except ModbusError as ex:
             err_code = ex.args[0]
             if err_code == ILLEGAL_FUNCTION_ERROR:
@@ -174,6 +296,7 @@ class ApiWrapper(object):
             # next best thing to do.
             payload = encoded_payload
 
+        self._mirror(msg.reader, msg.address, payload)
         return msg.decode(payload)
 
     async def read(self, selection=None):
@@ -187,26 +310,277 @@ class ApiWrapper(object):
         Return:
             dict: Dictionary containing Payload as key and setting as value
         """
-        retval = dict()
+        return await self._read_payloads(self._plan_read(selection))
+
+    async def poll(self,
+                   selection=None,
+                   interval=1.,
+                   align=True,
+                   max_gap=0,
+                   budget=None,
+                   defer=True):
+        """Read messages periodically
+
+        Asynchronous generator yielding one
+        :class:`~modbusclient.asyncio.polling.Snapshot` per poll cycle. Cycles
+        are scheduled by a :class:`~modbusclient.asyncio.polling.Scheduler`,
+        so the time spent reading does not add up to a drift. If a cycle
+        overruns its interval, the missed cycles are skipped and their number
+        is reported in :attr:`Snapshot.missed`.
+
+        Messages defining a ``poll_interval`` attribute are read at their own
+        rate. In this case each snapshot contains only the messages due in
+        the respective cycle. All messages due are coalesced into as few block
+        reads as possible.
+
+        If a time `budget` is set, blocks are read in the order of their
+        :attr:`~modbusclient.blocks.Block.priority`, which is taken from the
+        ``priority`` attribute of the messages. The time required to read each
+        block is estimated from previously measured latencies. Blocks which
+        would exceed the budget are not read and reported in
+        :attr:`Snapshot.skipped`. The first block of each cycle is always
+        read.
+
+        The selection is resolved only once and the block plans are reused in
+        subsequent cycles. Statistics are accumulated in
+        :attr:`ApiWrapper.poll_statistics`.
+
+        Arguments:
+            selection (iterable): Iterable of messages (API keys or Payload
+                objects) to read. If ``None``, all messages of the current API
+                are read.
+            interval (float): Poll interval in seconds for all messages
+                without ``poll_interval`` attribute. Defaults to 1.
+            align (bool): Align cycles to integer multiples of the interval on
+                the monotonic clock. Defaults to ``True``.
+            max_gap (int): Maximum number of unused registers read to merge
+                adjacent messages into a single block. Defaults to 0.
+            budget (float): Time budget per cycle in seconds. If ``None``, all
+                blocks due are read. Defaults to ``None``.
+            defer (bool): If ``True``, blocks skipped to meet the budget are
+                read in the next cycle. Otherwise they are not read before
+                they are due again. Defaults to ``True``.
+
+        Yield:
+            :class:`~modbusclient.asyncio.polling.Snapshot`: Values read in
+            the current cycle
+        """
+        scheduler = Scheduler(self._plan_read(selection),
+                              interval=interval,
+                              align=align,
+                              max_gap=max_gap)
+        stats = self.poll_statistics
+        while True:
+            blocks, missed = await scheduler.wait()
+            timestamp = monotonic()
+            stats.cycles += 1
+            stats.missed += missed
+            if budget is None:
+                values = await self._read_blocks(blocks)
+                stats.blocks_read += len(blocks)
+                yield Snapshot(timestamp, values, missed)
+                continue
+
+            values, skipped = await self._read_blocks_within(blocks,
+                                                             budget,
+                                                             timestamp)
+            if monotonic() - timestamp > budget:
+                stats.over_budget += 1
+            stats.blocks_read += len(blocks) - len(skipped)
+            stats.blocks_skipped += len(skipped)
+            payloads = tuple(msg for block in skipped for msg in block.payloads)
+            stats.skipped.update(payloads)
+            if defer:
+                scheduler.defer(skipped)
+            yield Snapshot(timestamp, values, missed, payloads)
+
+    async def get_block(self, block):
+        """Read all messages of a block with a single request
+
+        Arguments:
+            block (:class:`~modbusclient.blocks.Block`): Block to read
+
+        Return:
+            dict: Dictionary containing Payload as key and value as value
+        """
+        logger.debug("Retrieving block %d:%d ...", block.start, block.end)
+        header, payload, err_code = await self._client.call(
+            function=block.function,
+            start=block.start,
+            count=block.count,
+            unit=self.unit)
+        if self._negative is not None:
+            for msg in block.payloads:
+                self._negative.record_success(msg)
+        self._mirror(block.function, block.start, payload)
+        return self._decode(block.function, block.start, block.count,
+                            block.decode, payload)
+
+    def _decode(self, function, start, count, decode, payload):
+        """Decode response and record the time spent in the profile
+
+        Arguments:
+            function (int): Function code of the request
+            start (int): Address of the first register requested
+            count (int): Number of registers requested
+            decode (callable): Function decoding `payload`
+            payload (bytes): Payload of the response
+
+        Return:
+            Result of `decode`
+        """
+        profile = self._profile
+        if profile is None:
+            return decode(payload)
+        key = profile.key(self.unit, function, start, count)
+        return profile.measure(key, DECODE, decode, payload)
+
+    def _mirror(self, function, start, payload):
+        """Store registers in the device image, if any
+
+        Arguments:
+            function (int): Function code used to read the registers
+            start (int): Address of the first register
+            payload (bytes): Raw data
+        """
+        if self._image is not None and function is not None:
+            self._image.update(self.unit, function, start, payload)
+
+    def _plan_read(self, selection=None):
+        """Resolve messages to read
+
+        Arguments:
+            selection (iterable): Iterable of messages (API keys or Payload
+                objects). If ``None``, all messages of the current API are
+                used.
+
+        Return:
+            tuple: Readable :class:`~modbusclient.payload.Payload` instances
+        """
         if selection is None:
             selection = self._api.values()
-        for key in selection:
-            msg = as_payload(key, self._api)
-            if msg.is_readable:
-                try:
-                    retval[msg] = await self.get(msg)
-                except Exception as exc:
-                    logger.error("While retrieving '%s': %s", msg, exc)
+        payloads = (as_payload(key, self._api) for key in selection)
+        return tuple(msg for msg in payloads if msg.is_readable)
+
+    async def _read_payloads(self, payloads):
+        """Read a sequence of readable payloads
+
+        Arguments:
+            payloads (iterable): Readable payloads as returned by
+                :meth:`_plan_read`.
+
+        Return:
+            dict: Dictionary containing Payload as key and setting as value
+        """
+        if self._negative is not None:
+            payloads = self._negative.filter(payloads)
+        retval = dict()
+        for msg in payloads:
+            try:
+                retval[msg] = await self.get(msg)
+            except Exception as exc:
+                logger.error("While retrieving '%s': %s", msg, exc)
         return retval
 
-    async def cached_read(self, cache, selection=None):
+    async def _read_block(self, block):
+        """Read a block
+
+        If the block fails with an exception indicating unsupported registers,
+        its payloads are read one by one, so that a single unsupported register
+        does not prevent reading the others. The negative cache, if any,
+        records the culprit.
+
+        Arguments:
+            block (:class:`~modbusclient.blocks.Block`): Block to read
+
+        Return:
+            dict: Dictionary containing Payload as key and value as value
+        """
+        try:
+            return await self.get_block(block)
+        except ModbusError as exc:
+            if not is_unsupported(exc, self._negative):
+                raise
+        return await self._read_payloads(block.payloads)
+
+    def _filter_blocks(self, blocks):
+        """Remove payloads suppressed by the negative cache from blocks
+
+        Arguments:
+            blocks (iterable): Blocks to read
+
+        Return:
+            list: Blocks containing only payloads not suppressed
+        """
+        if self._negative is None:
+            return list(blocks)
+        return filter_blocks(blocks, self._negative)
+
+    async def _read_blocks(self, blocks):
+        """Read a sequence of blocks
+
+        Arguments:
+            blocks (iterable): Blocks as returned by
+                :func:`~modbusclient.blocks.plan_blocks`.
+
+        Return:
+            dict: Dictionary containing Payload as key and setting as value
+        """
+        retval = dict()
+        for block in self._filter_blocks(blocks):
+            try:
+                retval.update(await self._read_block(block))
+            except Exception as exc:
+                logger.error("While retrieving block %d:%d: %s",
+                             block.start, block.end, exc)
+        return retval
+
+    async def _read_blocks_within(self, blocks, budget, started):
+        """Read blocks in the order of their priority within a time budget
+
+        Arguments:
+            blocks (iterable): Blocks to read
+            budget (float): Time budget in seconds
+            started (float): Monotonic time at which the budget started
+
+        Return:
+            tuple(dict, list): Dictionary containing Payload as key and
+            setting as value and list of blocks skipped.
+        """
+        retval = dict()
+        skipped = []
+        first = True
+        blocks = self._filter_blocks(blocks)
+        for block in sorted(blocks, key=attrgetter("priority"), reverse=True):
+            t0 = monotonic()
+            if not first and t0 - started + self._costs.estimate(block) > budget:
+                skipped.append(block)
+                continue
+            first = False
+            try:
+                retval.update(await self._read_block(block))
+            except Exception as exc:
+                logger.error("While retrieving block %d:%d: %s",
+                             block.start, block.end, exc)
+            self._costs.update(block, monotonic() - t0)
+        return retval, skipped
+
+    async def cached_read(self, cache, selection=None, max_gap=0):
         """Read values from device, which are not found in cache
 
+        Values missing in the cache are coalesced into as few block reads as
+        possible. If `cache` is a :class:`~modbusclient.cache.Cache`, the
+        values read are stored in the cache. Plain dictionaries are left
+        unchanged.
+
         Arguments:
             cache (dict): Cache with Payload instance as key
             selection (iterable): Iterable of messages (API keys or Payload
                 objects) to read. If ``None``, all messages of the current API
                 are read.
+            max_gap (int): Maximum number of unused registers read to merge
+                adjacent messages into a single block. Defaults to 0.
+
         Return:
             dict: Dictionary containing Payload as key and setting as value
         """
@@ -215,19 +589,30 @@ class ApiWrapper(object):
         cached, remaining = from_cache(selection=selection,
                                        cache=cache,
                                        api=self._api)
-        update = await self.read(remaining)
+        blocks = plan_blocks((msg for msg in remaining if msg.is_readable),
+                             max_gap=max_gap)
+        update = await self._read_blocks(blocks)
+        if isinstance(cache, Cache):
+            cache.update(update)
         cached.update(update)
         return cached
 
-    async def set_from(self, settings):
+    async def set_from(self, settings, deduplicate=False):
         """Load settings from dictionary
 
         Arguments:
             settings (dict): Dictionary with settings as returned by
                  :meth:`Client.read`
+            deduplicate (bool): If ``True``, the registers of all writable
+                messages are read first and only registers holding different
+                data are written. These are merged into as few
+                ``WRITE_MULTIPLE_REGISTERS`` requests as possible. Defaults to
+                ``False``.
         Return:
             dict: Successfully modified settings with their respective value
         """
+        if deduplicate:
+            return await self._set_changed(settings)
         retval = dict()
         for key, value in settings.items():
             msg = as_payload(key, self._api)
@@ -239,3 +624,67 @@ class ApiWrapper(object):
                 except:
                     logger.error("While setting message %s: Unknown error", key)
         return retval
+
+    async def _set_changed(self, settings):
+        """Write only registers differing from the state of the device
+
+        Arguments:
+            settings (dict): Dictionary with settings
+
+        Return:
+            dict: Settings held by the device with their respective value
+        """
+        encoded = encode_settings(settings, self._api)
+        current = dict()
+        for block in plan_blocks(msg for msg in encoded if msg.is_readable):
+            try:
+                header, payload, err_code = await self._client.call(
+                    function=block.function,
+                    start=block.start,
+                    count=block.count,
+                    unit=self.unit)
+            except Exception as exc:
+                logger.error("While retrieving block %d:%d: %s",
+                             block.start, block.end, exc)
+                continue
+            self._mirror(block.function, block.start, payload)
+            current.update(block.registers(payload))
+
+        failed = set()
+        for start, buffer in plan_writes(to_registers(encoded), current):
+            try:
+                await self._write_registers(start, buffer, encoded)
+            except Exception as exc:
+                logger.error("While writing registers %d:%d: %s",
+                             start, start + len(buffer) // 2, exc)
+                failed.update(range(start, start + len(buffer) // 2))
+        return unchanged_or_written(encoded, failed)
+
+    async def _write_registers(self, start, buffer, encoded):
+        """Write consecutive registers with a single request
+
+        Logs in and retries once, if the device rejects the request and any
+        message in range is write protected.
+
+        Arguments:
+            start (int): Address of the first register
+            buffer (bytes): Raw data to write
+            encoded (dict): Encoded settings containing the messages written
+        """
+        count = len(buffer) // 2
+        try:
+            await self._client.call(function=WRITE_MULTIPLE_REGISTERS,
+                                    start=start,
+                                    count=count,
+                                    payload=buffer,
+                                    unit=self.unit,
+                                    priority=HIGH_PRIORITY)
+        except ModbusError as ex:
+            if ex.args[0] == ILLEGAL_FUNCTION_ERROR and not self.is_logged_in():
+                if any(msg.is_write_protected for msg in encoded
+                       if msg.address < start + count
+                       and start < msg.address + msg.register_count):
+                    await self.login()
+                    return await self._write_registers(start, buffer, encoded)
+            raise
+        self._mirror(READ_HOLDING_REGISTERS, start, buffer)
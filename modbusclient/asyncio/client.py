@@ -1,12 +1,42 @@
 import asyncio
+from heapq import heapify, heappush
+from itertools import count
 from logging import getLogger
 
 from ..protocol import ApplicationProtocolHeader, parse_response_body
-from ..protocol import new_request, parse_response_header
-from ..protocol import UNIT_MISMATCH, NO_UNIT, NO_ERROR, ModbusError
+from ..protocol import new_request, parse_response_header, NO_UNIT
+from ..error_codes import UNIT_MISMATCH, NO_ERROR, ModbusError
+from ..breaker import backoff
+from ..metrics import ENCODE, SEND, WAIT, RECEIVE, PARSE
 
 logger = getLogger("modbusclient")
 
+LOW_PRIORITY = 0
+HIGH_PRIORITY = 1
+
+MAX_RETRY_DELAY = 10.
+
+#: Argument of the cancellation of calls pending while the client disconnects
+DISCONNECTED = "Connection closed"
+
+
+def _abandon(connecting):
+    """Cancel a connection attempt no longer awaited
+
+    If the connection has been established already or is established before
+    the cancellation takes effect, it is closed.
+
+    Arguments:
+        connecting (asyncio.Task): Task opening the connection
+    """
+    def close(task):
+        if not task.cancelled() and task.exception() is None:
+            reader, writer = task.result()
+            writer.close()
+
+    connecting.cancel()
+    connecting.add_done_callback(close)
+
 
 class Client(object):
     """Asynchronous Modbus client
@@ -17,12 +47,33 @@ class Client(object):
         host (string): IP Adress of the host. If empty, no connection will be
             attempted. Defaults to the empty string.
         port (int): Port to use. Defaults to 502
-        timeout (float): Timeout in seconds. If not set, it will be set to
-           the default timeout. Currently not used.
+        timeout (float): Default timeout in seconds for :meth:`Client.call`
+           and for each connection attempt. If ``None``, calls wait for a
+           response indefinitely. Defaults to ``None``.
         max_transactions (int): Max. number of transactions send in parallel to
             the server. Defaults to 3.
+        reserved_transactions (int): Number of transactions reserved for
+            requests with priority ``HIGH_PRIORITY`` or above. Defaults to 0.
         max_retries (int): Maximum number of connection retries. Defaults to 5.
             0 disables retries while ``None`` is equivalent to infinite retries.
+            Ignored if a `breaker` is set.
+        retry_delay (float): Delay in seconds before the first connection
+            retry. The delay doubles with each retry up to
+            ``MAX_RETRY_DELAY``. Defaults to 0.5.
+        breaker (:class:`~modbusclient.breaker.CircuitBreaker`): Circuit
+            breaker guarding :meth:`Client.call`. If set, calls fail fast
+            with :class:`~modbusclient.breaker.CircuitOpenError` while the
+            breaker is open, and connection attempts are not retried.
+            Defaults to ``None``.
+        metrics (:class:`~modbusclient.metrics.ClientMetrics`): Metrics
+            updated by each call. If ``None``, no metrics are collected.
+            Defaults to ``None``.
+        profile (:class:`~modbusclient.metrics.PhaseProfile`): Profile
+            recording the time spent in each phase of a request. If ``None``,
+            no phases are timed. Defaults to ``None``.
+        hooks (:class:`~modbusclient.hooks.Hooks`): Hooks called on requests,
+            responses, errors and reconnects. If ``None``, no hooks are
+            called. Defaults to ``None``.
         loop (EventLoop): If set to ``None``, event loop will be determined by
             the method. Defaults to ``None``. Deprecated from python 3.7 onwards.
     """
@@ -31,8 +82,14 @@ class Client(object):
                  port=502,
                  timeout=None,
                  max_transactions=3,
+                 reserved_transactions=0,
                  max_retries=5,
-                 loop=None):
+                 loop=None,
+                 retry_delay=0.5,
+                 breaker=None,
+                 metrics=None,
+                 profile=None,
+                 hooks=None):
         self._reader = None
         self._writer = None
         self._host = host
@@ -43,13 +100,43 @@ class Client(object):
         # the call to get_event_loop used instead is apparently expensive.
         self._loop = loop
 
+        if not 0 <= reserved_transactions < max_transactions:
+            raise ValueError("Invalid number of reserved transactions",
+                             reserved_transactions)
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self.breaker = breaker
+        self.metrics = metrics
+        self.profile = profile
+        self.hooks = hooks
+        self._attempts = 0  # number of connection attempts
+        # (request header, profile key, time sent) of profiled transactions
+        self._sent = max_transactions * [None]
         self._transactions = max_transactions * [(None, None)]
-        self._read_lock = asyncio.Lock()
+        # incremented whenever a transaction expires to tell late responses
+        # apart from responses to the next request using the same slot
+        self._generations = max_transactions * [0]
+        self._reserved = reserved_transactions
+        self._waiters = []  # heap of (-priority, sequence number)
+        self._sequence = count()
+        self._reading = None  # task reading the next response
+        self._changed = None  # future completed on transaction state changes
+        self._connect_lock = asyncio.Lock()
 
     @property
     def max_transactions(self):
         return len(self._transactions)
 
+    def stats(self):
+        """Get snapshot of the metrics collected
+
+        Return:
+            dict: Snapshot as returned by
+            :meth:`~modbusclient.metrics.ClientMetrics.snapshot` or ``None``,
+            if no metrics are collected.
+        """
+        return self.metrics.snapshot() if self.metrics is not None else None
+
     @property
     def loop(self):
         if self._loop is None:
@@ -95,45 +182,92 @@ class Client(object):
         logger.debug(f"Connecting to {self._host}:{self._port} ...")
         retry = 0
         while True:
+            self._attempts += 1
+            if self._attempts > 1:
+                if self.metrics is not None:
+                    self.metrics.reconnect()
+                if self.hooks is not None:
+                    self.hooks.reconnect(self._host, self._port, self._attempts)
             try:
-                r, w = await asyncio.open_connection(self._host, self._port)
-                self._reader, self._writer = r, w
+                self._reader, self._writer = await self._open_connection()
                 return
-            except OSError as ex:
+            except (OSError, asyncio.TimeoutError) as ex:
                 retry += 1
-                if self._max_retries is None or retry < self._max_retries:
+                if self.breaker is None and (self._max_retries is None
+                                             or retry < self._max_retries):
+                    delay = backoff(retry, self.retry_delay, MAX_RETRY_DELAY,
+                                    jitter=0.5)
+                    if self.metrics is not None:
+                        self.metrics.retry()
                     logger.debug(f"Connection failed: {ex}. Retry {retry} of "
-                                 f"{self._max_retries}")
-                    await asyncio.sleep(0.5)
+                                 f"{self._max_retries} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
                 else:
                     raise
 
+    async def _open_connection(self):
+        """Open a connection to the server within the timeout
+
+        Unlike :func:`asyncio.wait_for`, which swallows the cancellation of
+        the caller, if the connection is established at the same time on
+        Python versions before 3.12, this always propagates a cancellation.
+
+        Return:
+            tuple(asyncio.StreamReader, asyncio.StreamWriter): Connection
+
+        Raise:
+            asyncio.TimeoutError: If the connection is not established within
+            :attr:`Client.timeout`
+        """
+        connecting = self.loop.create_task(
+            asyncio.open_connection(self._host, self._port))
+        try:
+            done, pending = await asyncio.wait([connecting],
+                                               timeout=self.timeout)
+        except asyncio.CancelledError:
+            _abandon(connecting)
+            raise
+        if pending:
+            _abandon(connecting)
+            raise asyncio.TimeoutError("Connection timed out",
+                                       self._host,
+                                       self._port)
+        return connecting.result()
+
     def disconnect(self):
         """Disconnect this client
 
         If this client is connected, the socket will be shutdown and then closed.
         If the client is not connected, calling this method has no effect.
+        Calls awaiting a response raise :class:`asyncio.CancelledError` with
+        :data:`DISCONNECTED` as argument.
         """
-        if self.is_connected():
+        if self._writer is not None:
             logger.debug("Disconnecting ...")
             #cancel all existing future
             for i, (header, future) in enumerate(self._transactions):
                 if future is not None:
                     logger.debug("Cancelled future for Transaction ID {} ..."
                                  .format(header.transaction))
-                    future.cancel()
+                    future.cancel(DISCONNECTED)
                     self._transactions[i] = (None, None)
 
+            if self._reading is not None:
+                self._reading.cancel()
+                self._reading = None
+
             self._writer.close()
             self._reader = None
             # await self._writer.wait_closed() -> python3.7
             self._writer = None
+            self._notify()
 
     async def request(self,
                       function,
                       payload=b"",
                       unit=NO_UNIT,
                       transaction=None,
+                      priority=LOW_PRIORITY,
                       **kwargs):
         """Send a request to the server
 
@@ -153,6 +287,9 @@ class Client(object):
             transaction (int): Transaction ID. If set to ``None``, a transaction
                 ID will be generated by :meth:`Client.get_transaction_id`.
                 Defaults to ``None``.
+            priority (int): Priority of the request. If no transaction ID is
+                available, requests with higher priority get the next free
+                transaction ID first. Defaults to ``LOW_PRIORITY``.
             **kwargs: Keyword arguments passed verbatim to the request of the
                 function
 
@@ -164,97 +301,92 @@ class Client(object):
 
         Raise:
             ValueError: If transaction ID is out of bounds
+
+            ConnectionAbortedError: If the client is disconnected while waiting
+            for a transaction ID.
         """
         logger.debug("Requesting function %s", str(function))
         await self.assert_connected()
         if transaction is None:
-            transaction = await self.get_transaction_id()
+            transaction = await self.get_transaction_id(priority)
         elif transaction < 0 or transaction >= self.max_transactions:
             raise ValueError("Invalid transaction ID", transaction)
 
         while self._transactions[transaction][1] is not None:
             logger.debug("Awaiting completion of transaction %d ...",
                          transaction)
-            await self._transactions[transaction][1]
+            await self._wait_for_change()
 
+        if self._writer is None:
+            raise ConnectionAbortedError("Disconnected while awaiting transaction")
+
+        profile = self.profile
+        if profile is not None:
+            started = profile.clock()
         header, msg = new_request(function=function,
                                   payload=payload,
                                   unit=unit,
-                                  transaction=transaction,
+                                  transaction=self._wire_id(transaction),
                                   **kwargs)
+        if profile is not None:
+            encoded = profile.clock()
+            key = profile.key(unit, function, kwargs.get("start"),
+                              kwargs.get("count", 1))
+            profile.record(key, ENCODE, encoded - started)
+            # stored before sending in case the response arrives while
+            # draining
+            self._sent[transaction] = (header, key, encoded)
         future = self.loop.create_future()
+        # Occupy transaction before awaiting anything
+        self._transactions[transaction] = (header, future)
         try:
             self._writer.write(msg)
+            if self.metrics is not None:
+                self.metrics.sent(len(msg))
+            if self.hooks is not None:
+                self.hooks.request(header, msg)
             logger.debug("Sent request with transaction ID %d.", transaction)
             await self._writer.drain()
+            if profile is not None:
+                sent = profile.clock()
+                profile.record(key, SEND, sent - encoded)
+                if (self._sent[transaction] or (None,))[0] is header:
+                    self._sent[transaction] = (header, key, sent)
         except Exception as exc:
             logger.warning(f"Error sending request with transaction ID "
                            f"{transaction}: {exc}")
-            future.set_exception(exc)
-        self._transactions[transaction] = (header, future)
+            if self._transactions[transaction][1] is future:
+                self._transactions[transaction] = (None, None)
+                self._notify()
+            if not future.done():
+                future.set_exception(exc)
         return header, future
 
     async def get_response(self):
         """Get response from the server
 
-        Locks the internal reader lock and reads the next message on the input
-        stream. If the transaction ID is valid and a matching future is found,
-        the result of the future will be set
-
-        Return:
-            tuple(~modbusclient.ApplicationProtocolHeader, bytes, int): The
-            following values are returned:
-
-            * The received MBAP header
-            * The raw data bytes of the payload without any headers
-            * An error code or ``None``, if no error occurred.
+        Awaits the next message on the input stream. If the transaction ID is
+        valid and a matching future is found, the result of the future will be
+        set. Only a single message is read at a time. Concurrent calls await
+        the same message.
         """
         await self.assert_connected()
-        logger.debug("Awaiting response ...")
-        nbytes = ApplicationProtocolHeader.parser.size
-        try:
-            # Lock to make sure header and body are read in sequence
-            async with self._read_lock:
-                buffer = await self._reader.readexactly(nbytes)
-                header = parse_response_header(buffer)
-                buffer = await self._reader.readexactly(header.length - 2)
-        except asyncio.IncompleteReadError:
-            logger.warning("Connection closed unexpectedly. Cleaning up ...")
-            self.disconnect()
-            return
-
-        payload, err_code = parse_response_body(header, buffer)
-        logger.debug(f"Got response: {header}, {payload}, {err_code}")
-
-        try:
-            req, future = self._transactions[header.transaction]
-            self._transactions[header.transaction] = (None, None)
-        except IndexError:
-            raise ModbusError(f"Got unknown transaction ID {header.transaction}")
+        if self._reading is None:
+            self._reading = self.loop.create_task(self._read_response())
+        await asyncio.shield(self._reading)
 
-        assert(header.transaction == req.transaction)
-
-        if future is not None and not future.cancelled():
-            if err_code == NO_ERROR:
-                if header.unit == req.unit or header.unit == NO_UNIT:
-                    future.set_result((header, payload, err_code))
-                else:
-                    future.set_exception(ModbusError(UNIT_MISMATCH))
-            else:
-                future.set_exception(ModbusError(err_code))
-        else:
-            logger.error("Future for transaction %d already complete",
-                         header.transaction)
-        return
-
-    async def call(self, function, **kwargs):
+    async def call(self, function, timeout=None, **kwargs):
         """Call a function on the server and await the result
 
         Sends a request via :meth:`Client.request` and processes responses until
-        the resulting future is complete.
+        the resulting future is complete. If no response is received within
+        `timeout`, the transaction is released, so that it can be used by the
+        next request. A late response to the expired request is discarded.
 
         Arguments:
             function (int): Function code
+            timeout (float): Timeout in seconds. If ``None``,
+                :attr:`Client.timeout` is used.
             **kwargs: Keyword arguments passed verbatim to
                 :meth:`~Client.request`.
 
@@ -270,11 +402,69 @@ class Client(object):
             :class:`~modbusclient.protocol.ModbusError`: On modbus related errors
 
             :class:`asyncio.CancelledError`: If future has been cancelled
+
+            :class:`asyncio.TimeoutError`: If no response is received in time
+
+            :class:`~modbusclient.breaker.CircuitOpenError`: If the circuit
+            breaker is open
         """
+        breaker = self.breaker
+        if breaker is None:
+            return await self._call(function, timeout, **kwargs)
+
+        breaker.check()
+        try:
+            result = await self._call(function, timeout, **kwargs)
+        except (OSError, asyncio.TimeoutError):
+            breaker.record_failure()
+            raise
+        except ModbusError:
+            breaker.record_success()  # the device responded
+            raise
+        breaker.record_success()
+        return result
+
+    async def _call(self, function, timeout, **kwargs):
+        """Implementation of :meth:`Client.call` collecting metrics and
+        calling hooks"""
+        metrics = self.metrics
+        if metrics is None and self.hooks is None:
+            return await self._transact(function, timeout, **kwargs)
+
+        unit = kwargs.get("unit", NO_UNIT)
+        if metrics is not None:
+            started = metrics.begin()
+        try:
+            result = await self._transact(function, timeout, **kwargs)
+        except BaseException as exc:
+            if metrics is not None:
+                metrics.fail(function, unit, started, exc)
+            if self.hooks is not None:
+                self.hooks.error(function, unit, exc)
+            raise
+        if metrics is not None:
+            metrics.end(function, unit, started)
+        return result
+
+    async def _transact(self, function, timeout, **kwargs):
+        """Send a request and await the response within the timeout"""
+        if timeout is None:
+            timeout = self.timeout
         header, future = await self.request(function, **kwargs)
+        if timeout is None:
+            while not future.done():
+                await self._wait_for_change()
+            return future.result()  # will raise, if an exception is set
+
+        deadline = self.loop.time() + timeout
         while not future.done():
-            await self.get_response()
-        return future.result()  # will raise, if an exception is set
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                self._expire(header)
+                raise asyncio.TimeoutError("Transaction timed out",
+                                           header.transaction)
+            await self._wait_for_change(remaining)
+        return future.result()
 
     async def assert_connected(self):
         """Assert client is connected
@@ -287,23 +477,208 @@ class Client(object):
         """
         logger.debug("Checking connection status ...")
         if not self.is_connected():
-            await self.connect()
+            # Concurrent requests shall not open several connections
+            async with self._connect_lock:
+                if not self.is_connected():
+                    await self.connect()
 
-    async def get_transaction_id(self):
+    async def get_transaction_id(self, priority=LOW_PRIORITY):
         """Get transaction ID
 
         Checks whether any of the available transaction IDs is available and
-        returns the first available ID. If no ID is available,
-        :meth:`Client.get_response` is invoked, until a free ID is found.
+        returns the first available ID. If no ID is available, responses are
+        processed until a free ID is found. Waiting callers are served in the
+        order of their priority and, for equal priority, in the order of their
+        arrival.
+
+        Arguments:
+            priority (int): Priority of the caller. Only callers with priority
+                ``HIGH_PRIORITY`` or above may use reserved transaction IDs.
+                Defaults to ``LOW_PRIORITY``.
 
         Return:
             int: Available transaction ID in the range
             ``[0:self.max_transactions]``.
         """
         logger.debug("Generating transaction ID ..."),
-        while True:
-            for i, (header, future) in enumerate(self._transactions):
-                if future is None:
-                    return i
-            logger.debug(f"Max. transactions ({self.max_transactions}) active")
-            await self.get_response()
+        entry = (-priority, next(self._sequence))
+        heappush(self._waiters, entry)
+        try:
+            while True:
+                if self._waiters[0] is entry:
+                    transaction = self._find_transaction_id(priority)
+                    if transaction is not None:
+                        return transaction
+                    logger.debug(f"Max. transactions ({self.max_transactions})"
+                                 f" active")
+                await self._wait_for_change()
+        finally:
+            self._waiters.remove(entry)
+            heapify(self._waiters)
+            self._notify()
+
+    def _find_transaction_id(self, priority):
+        """Find a free transaction ID
+
+        Arguments:
+            priority (int): Priority of the caller
+
+        Return:
+            int: Free transaction ID or ``None``, if all transaction IDs
+            available at the given priority are in use.
+        """
+        first = 0 if priority >= HIGH_PRIORITY else self._reserved
+        for i in range(first, self.max_transactions):
+            if self._transactions[i][1] is None:
+                return i
+        return None
+
+    def _wire_id(self, transaction):
+        """Get transaction ID sent to the server
+
+        Arguments:
+            transaction (int): Index of the transaction
+
+        Return:
+            int: Transaction ID used in the MBAP header
+        """
+        generations = 0x10000 // self.max_transactions
+        generation = self._generations[transaction] % generations
+        return transaction + generation * self.max_transactions
+
+    def _expire(self, header):
+        """Release a transaction without awaiting the response
+
+        Arguments:
+            header (~modbusclient.ApplicationProtocolHeader): Request header
+        """
+        transaction = header.transaction % self.max_transactions
+        req, future = self._transactions[transaction]
+        if req is not header:
+            return
+        logger.warning("Transaction %d expired", header.transaction)
+        self._transactions[transaction] = (None, None)
+        self._generations[transaction] += 1
+        future.cancel()
+        self._notify()
+
+    def _notify(self):
+        """Wake up all tasks waiting in :meth:`_wait_for_change`"""
+        changed, self._changed = self._changed, None
+        if changed is not None and not changed.done():
+            changed.set_result(None)
+
+    async def _wait_for_change(self, timeout=None):
+        """Wait for a change of the transaction state
+
+        Makes sure a response is being read, if any transaction is pending.
+        Returns after a response has been processed or a transaction has been
+        released.
+
+        Arguments:
+            timeout (float): Maximum time to wait in seconds. Defaults to
+                ``None``.
+        """
+        if self._reading is None and self.is_connected():
+            if any(future is not None for _, future in self._transactions):
+                self._reading = self.loop.create_task(self._read_response())
+        if self._changed is None:
+            self._changed = self.loop.create_future()
+        # Unlike awaiting the future directly, this does not cancel the shared
+        # future if the waiting task is cancelled
+        await asyncio.wait([self._changed], timeout=timeout)
+
+    async def _read_response(self):
+        """Read the next response and complete the matching future
+
+        Intended to run as a task. Only one such task exists at a time.
+        """
+        nbytes = ApplicationProtocolHeader.get_parser().size
+        profile = self.profile
+        try:
+            if profile is None:
+                head = await self._reader.readexactly(nbytes)
+            else:
+                head = await self._reader.readexactly(1)
+                arrived = profile.clock()
+                head += await self._reader.readexactly(nbytes - 1)
+            header = parse_response_header(head)
+            buffer = await self._reader.readexactly(header.msglen - 2)
+            if profile is not None:
+                received = profile.clock()
+            if self.metrics is not None:
+                self.metrics.received(nbytes + len(buffer))
+            if self.hooks is not None:
+                self.hooks.response(header, head + buffer)
+            if profile is not None:
+                parsing = profile.clock()
+            payload, err_code = parse_response_body(header, buffer)
+            if profile is not None:
+                self._profile_response(header, arrived, received, parsing)
+            logger.debug(f"Got response: {header}, {payload}, {err_code}")
+            self._dispatch(header, payload, err_code)
+        except (asyncio.IncompleteReadError, ConnectionError) as exc:
+            logger.warning("Connection closed unexpectedly (%s). Cleaning up ...",
+                           exc)
+            self._reading = None
+            self.disconnect()
+        except Exception as exc:
+            # stream is in an undefined state after a malformed response
+            logger.error("Error reading response: %s. Disconnecting ...", exc)
+            self._reading = None
+            self.disconnect()
+        finally:
+            if self._reading is asyncio.current_task():
+                self._reading = None
+            self._notify()
+
+    def _profile_response(self, header, arrived, received, parsing):
+        """Record phases of a response in the profile
+
+        Responses to requests sent before profiling was enabled are ignored.
+
+        Arguments:
+            header (~modbusclient.ApplicationProtocolHeader): Response header
+            arrived (float): Time the first byte of the response was read
+            received (float): Time the last byte of the response was read
+            parsing (float): Time parsing the response started
+        """
+        profile = self.profile
+        parsed = profile.clock()
+        transaction = header.transaction % self.max_transactions
+        sent, self._sent[transaction] = self._sent[transaction], None
+        if sent is None or sent[0].transaction != header.transaction:
+            return
+        req, key, sent = sent
+        profile.record(key, WAIT, arrived - sent)
+        profile.record(key, RECEIVE, received - arrived)
+        profile.record(key, PARSE, parsed - parsing)
+
+    def _dispatch(self, header, payload, err_code):
+        """Complete future of a transaction
+
+        Arguments:
+            header (~modbusclient.ApplicationProtocolHeader): Response header
+            payload (bytes): Response payload
+            err_code (int): Error code
+        """
+        transaction = header.transaction % self.max_transactions
+        req, future = self._transactions[transaction]
+        if req is None or req.transaction != header.transaction:
+            logger.error("Got unknown or expired transaction ID %d",
+                         header.transaction)
+            return
+
+        self._transactions[transaction] = (None, None)
+        if future is None or future.done():
+            logger.error("Future for transaction %d already complete",
+                         header.transaction)
+            return
+
+        if err_code == NO_ERROR:
+            if header.unit == req.unit or header.unit == NO_UNIT:
+                future.set_result((header, payload, err_code))
+            else:
+                future.set_exception(ModbusError(UNIT_MISMATCH))
+        else:
+            future.set_exception(ModbusError(err_code))
@@ -0,0 +1,190 @@
+import asyncio
+from collections import deque
+from logging import getLogger
+
+from ..protocol import NO_UNIT
+from .client import HIGH_PRIORITY, LOW_PRIORITY
+
+logger = getLogger("modbusclient")
+
+
+class UnitDispatcher(object):
+    """Fair scheduling of requests to several units sharing one connection
+
+    Behind a TCP to RTU gateway, a single connection serves several units on a
+    serial bus, which can process only one request at a time. This class keeps
+    a queue of requests for each unit and dispatches them to the underlying
+    client in round robin order, limiting the number of requests in flight
+    per unit. Requests to a unit, which does not respond, time out without
+    occupying more than ``max_in_flight`` transactions, so that healthy units
+    on the same gateway are still served.
+
+    The dispatcher provides the same interface as
+    :class:`~modbusclient.asyncio.Client` used by
+    :class:`~modbusclient.asyncio.ApiWrapper`. Several wrappers with different
+    units can share the same dispatcher.
+
+    Arguments:
+        client (:class:`~modbusclient.asyncio.Client`): Client or compatible
+            object used to send requests.
+        max_in_flight (int): Maximum number of requests in flight per unit.
+            Defaults to 1.
+        max_total (int): Maximum number of requests in flight for all units.
+            If ``None``, the ``max_transactions`` attribute of `client` is
+            used. Defaults to ``None``.
+        timeout (float): Timeout in seconds for each request. If ``None``,
+            the timeout of `client` applies. Defaults to ``None``.
+    """
+    def __init__(self, client, max_in_flight=1, max_total=None, timeout=None):
+        if max_in_flight < 1:
+            raise ValueError("Expected positive limit", max_in_flight)
+        if max_total is None:
+            max_total = getattr(client, "max_transactions", max_in_flight)
+        self._client = client
+        self._queues = dict()
+        self._in_flight = dict()
+        self._total = 0
+        self._ready = deque()  # units with queued requests
+        self.max_in_flight = max_in_flight
+        self.max_total = max_total
+        self.timeout = timeout
+
+    @property
+    def client(self):
+        """Get client used to send requests
+
+        Return:
+            :class:`~modbusclient.asyncio.Client` or compatible object
+        """
+        return self._client
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.disconnect()
+
+    def is_connected(self):
+        """Check if the underlying client is connected
+
+        Return:
+            bool: True if and only if the client is connected
+        """
+        return self._client.is_connected()
+
+    async def connect(self, **kwargs):
+        """Connect the underlying client
+
+        Arguments:
+            **kwargs: Keyword arguments passed verbatim to the client
+        """
+        await self._client.connect(**kwargs)
+
+    def disconnect(self):
+        """Disconnect the underlying client"""
+        self._client.disconnect()
+
+    def queued(self, unit):
+        """Get number of requests waiting for a unit
+
+        Arguments:
+            unit (int): Unit ID
+
+        Return:
+            int: Number of queued requests
+        """
+        return len(self._queues.get(unit, ()))
+
+    def in_flight(self, unit):
+        """Get number of requests in flight for a unit
+
+        Arguments:
+            unit (int): Unit ID
+
+        Return:
+            int: Number of requests sent but not answered yet
+        """
+        return self._in_flight.get(unit, 0)
+
+    async def call(self, function, unit=NO_UNIT, **kwargs):
+        """Call a function on a unit and await the result
+
+        Waits until the request is scheduled and forwards it to the client.
+        Requests with priority ``HIGH_PRIORITY`` or above are put at the head
+        of the queue of their unit.
+
+        Arguments:
+            function (int): Function code
+            unit (int): Unit ID. Defaults to ``NO_UNIT``.
+            **kwargs: Keyword arguments passed verbatim to the ``call`` method
+                of the client.
+
+        Return:
+            Result of the ``call`` method of the client
+
+        Raise:
+            :class:`asyncio.TimeoutError`: If the unit does not respond in time
+        """
+        grant = asyncio.get_running_loop().create_future()
+        queue = self._queues.setdefault(unit, deque())
+        if not queue:
+            self._ready.append(unit)
+        if kwargs.get("priority", LOW_PRIORITY) >= HIGH_PRIORITY:
+            queue.appendleft(grant)
+        else:
+            queue.append(grant)
+        self._dispatch()
+
+        try:
+            await grant
+        except asyncio.CancelledError:
+            if grant.done() and not grant.cancelled():
+                self._release(unit)  # granted, but cancelled before running
+            elif grant in queue:
+                queue.remove(grant)
+                if not queue:
+                    self._ready.remove(unit)
+            raise
+
+        try:
+            if self.timeout is not None:
+                kwargs.setdefault("timeout", self.timeout)
+            return await self._client.call(function, unit=unit, **kwargs)
+        finally:
+            self._release(unit)
+
+    def _release(self, unit):
+        """Mark a request as complete and dispatch the next requests
+
+        Arguments:
+            unit (int): Unit ID of the completed request
+        """
+        self._in_flight[unit] -= 1
+        self._total -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Grant waiting requests in round robin order of their units"""
+        skipped = 0
+        while self._ready and skipped < len(self._ready):
+            if self._total >= self.max_total:
+                return
+            unit = self._ready[0]
+            queue = self._queues[unit]
+            while queue and queue[0].done():
+                queue.popleft()  # cancelled while waiting
+            if not queue:
+                self._ready.popleft()
+                continue
+            if self._in_flight.get(unit, 0) >= self.max_in_flight:
+                self._ready.rotate(-1)
+                skipped += 1
+                continue
+            queue.popleft().set_result(None)
+            self._in_flight[unit] = self._in_flight.get(unit, 0) + 1
+            self._total += 1
+            skipped = 0
+            self._ready.rotate(-1)
+            if not queue:
+                self._ready.remove(unit)
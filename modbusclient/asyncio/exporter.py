@@ -0,0 +1,143 @@
+import asyncio
+from logging import getLogger
+
+from ..exporter import CONTENT_TYPE, PrometheusExporter
+
+logger = getLogger("modbusclient")
+
+#: Port the metrics are served on by default
+DEFAULT_METRICS_PORT = 9502
+
+# Maximum number of header lines accepted per request
+MAX_HEADERS = 100
+
+
+class MetricsServer:
+    """Minimal HTTP server exposing metrics to Prometheus
+
+    Answers ``GET`` and ``HEAD`` requests of ``path`` with the metrics
+    rendered by a :class:`~modbusclient.exporter.PrometheusExporter`. Each
+    connection serves a single request::
+
+        exporter = PrometheusExporter()
+        exporter.add(wrapper, device="inverter")
+        async with MetricsServer(exporter) as server:
+            await server.start(host="0.0.0.0")
+            await server.serve_forever()
+
+    Args:
+        exporter: Exporter rendering the metrics
+        path: Path the metrics are served at. Defaults to ``/metrics``.
+        timeout: Maximum time in seconds to receive a request. Defaults to 5.
+
+    Attributes:
+        scrapes: Number of requests answered with the metrics
+    """
+    scrapes: int
+
+    def __init__(
+        self,
+        exporter: PrometheusExporter,
+        path: str = "/metrics",
+        timeout: float = 5.
+    ) -> None:
+        self.exporter = exporter
+        self.path = path
+        self.timeout = timeout
+        self.scrapes = 0
+        self._server = None
+        self._writers = dict()  # writer -> task serving the client
+
+    async def __aenter__(self) -> "MetricsServer":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop()
+
+    async def start(
+        self,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_METRICS_PORT
+    ) -> int:
+        """Start serving metrics
+
+        Args:
+            host: Address to listen on. Defaults to ``127.0.0.1``.
+            port: Port to listen on. If 0, a free port is chosen. Defaults to
+                ``DEFAULT_METRICS_PORT``.
+
+        Return:
+            Port the server listens on
+        """
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        """Serve metrics until cancelled"""
+        await self._server.serve_forever()
+
+    async def stop(self) -> None:
+        """Stop serving metrics and close all connections"""
+        if self._server is None:
+            return
+        self._server.close()
+        tasks = list(self._writers.values())
+        for writer in list(self._writers):
+            writer.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _serve(self, reader, writer):
+        """Answer a single request
+
+        Arguments:
+            reader (asyncio.StreamReader): Stream of the client
+            writer (asyncio.StreamWriter): Stream to the client
+        """
+        self._writers[writer] = asyncio.current_task()
+        try:
+            method, path = await asyncio.wait_for(self._read_request(reader),
+                                                  self.timeout)
+            if path.split("?", 1)[0] != self.path:
+                status, body = "404 Not Found", b"Not Found\n"
+            elif method not in ("GET", "HEAD"):
+                status, body = "405 Method Not Allowed", b""
+            else:
+                status = "200 OK"
+                body = self.exporter.render().encode("utf-8")
+                self.scrapes += 1
+            head = (f"HTTP/1.1 {status}\r\n"
+                    f"Content-Type: {CONTENT_TYPE}\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: close\r\n\r\n")
+            writer.write(head.encode("ascii"))
+            if method != "HEAD":
+                writer.write(body)
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError, ConnectionError, ValueError) as exc:
+            logger.debug("Dropping metrics request: %s", exc)
+        finally:
+            self._writers.pop(writer, None)
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader):
+        """Read request line and headers
+
+        Arguments:
+            reader (asyncio.StreamReader): Stream of the client
+
+        Return:
+            tuple(str, str): Method and path requested
+
+        Raise:
+            ValueError: If the request is malformed
+        """
+        line = await reader.readuntil(b"\n")
+        method, path, version = line.decode("latin-1").split()
+        for i in range(MAX_HEADERS):
+            if not (await reader.readuntil(b"\n")).strip():
+                return method, path
+        raise ValueError("Too many headers")
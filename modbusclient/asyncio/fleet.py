@@ -0,0 +1,435 @@
+import asyncio
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Mapping
+from dataclasses import dataclass
+from heapq import heappop, heappush
+from logging import getLogger
+from time import monotonic
+
+from ..api_wrapper import as_payload
+from ..breaker import CircuitBreaker, CircuitOpenError
+from ..payload import Payload
+from ..protocol import DEFAULT_PORT, NO_UNIT
+from .client import Client, DISCONNECTED
+from .polling import PollStatistics, Scheduler
+
+logger = getLogger("modbusclient")
+
+# Errors of a single device, which leave the shared connection intact
+NO_DISCONNECT_ERRORS = (asyncio.TimeoutError, CircuitOpenError)
+
+
+def _cancelling():
+    """Check if a cancellation of the current task is pending
+
+    Return:
+        bool: ``True`` if the current task is being cancelled. Always
+        ``False`` before Python 3.11, which does not track cancellations.
+    """
+    cancelling = getattr(asyncio.current_task(), "cancelling", None)
+    return cancelling is not None and cancelling() > 0
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Device:
+    """Remote device polled by a :class:`FleetPoller`
+
+    Attributes:
+        host: IP address or host name of the server
+        port: Port of the server. Defaults to 502.
+        unit: Modbus unit ID. Defaults to ``NO_UNIT``.
+        api: Dictionary containing the API definition with names as key and
+            :class:`~modbusclient.payload.Payload` objects as value.
+        selection: Messages (API keys or Payload objects) to poll. If
+            ``None``, all readable messages of ``api`` are polled.
+        name: Optional name of the device.
+
+    Devices compare equal only if they are identical.
+    """
+    host: str
+    port: int = DEFAULT_PORT
+    unit: int = NO_UNIT
+    api: Mapping[str, Payload] | None = None
+    selection: tuple | None = None
+    name: str | None = None
+
+    @property
+    def address(self) -> tuple[str, int]:
+        """Get address of the server
+
+        Return:
+            Host and port of the server
+        """
+        return self.host, self.port
+
+    def payloads(self) -> tuple[Payload, ...]:
+        """Resolve the readable payloads of this device
+
+        Return:
+            Readable payloads selected for polling
+        """
+        api = self.api if self.api is not None else dict()
+        selection = self.selection if self.selection is not None else api.values()
+        payloads = (as_payload(key, api) for key in selection)
+        return tuple(msg for msg in payloads if msg.is_readable)
+
+
+@dataclass(slots=True)
+class DeviceSnapshot:
+    """Result of a single poll cycle of one device
+
+    Attributes:
+        device: Device polled
+        timestamp: Monotonic time at which the cycle started
+        values: Dictionary containing Payload as key and decoded value as value
+        missed: Number of cycles of this device skipped immediately before
+            this cycle, because the previous cycle overran its interval.
+        error: Exception raised while polling or ``None``, if all blocks were
+            read successfully.
+    """
+    device: Device
+    timestamp: float
+    values: dict[Payload, object]
+    missed: int = 0
+    error: BaseException | None = None
+
+
+class FleetPoller:
+    """Poll a large number of devices from a single event loop
+
+    Each device is driven by its own
+    :class:`~modbusclient.asyncio.polling.Scheduler`, but all schedulers share
+    a single timer heap. Devices due are handed to a fixed number of worker
+    tasks, which bounds the number of concurrent requests independent of the
+    number of devices. Connections are opened on demand and kept open for
+    the next cycle, as long as the number of open connections does not exceed
+    ``max_connections``. Otherwise the least recently used idle connection is
+    closed. Devices sharing the same host and port share a connection.
+
+    First cycles are spread evenly over the poll interval to avoid bursts. Results
+    are streamed as :class:`DeviceSnapshot` objects by iterating
+    asynchronously over the poller::
+
+        async with FleetPoller(devices, interval=10.) as poller:
+            async for snapshot in poller:
+                process(snapshot)
+
+    If the consumer falls behind, the workers block once ``queue_size``
+    results are pending.
+
+    Args:
+        devices: Devices to poll
+        interval: Poll interval in seconds for all payloads without
+            ``poll_interval`` attribute. Defaults to 1.
+        max_concurrency: Maximum number of devices polled concurrently.
+            Defaults to 64.
+        max_connections: Maximum number of open connections. Must not be
+            less than ``max_concurrency``. Defaults to 256.
+        timeout: Timeout in seconds for establishing a connection and for
+            each request. Defaults to 1.
+        max_gap: Maximum number of unused registers within a block. Defaults
+            to 0.
+        queue_size: Maximum number of results not consumed yet. Defaults to
+            1024.
+        decode: If ``False``, the values of each snapshot contain the raw
+            bytes of each payload instead of the decoded value. Defaults to
+            ``True``.
+        breaker: Factory returning a new
+            :class:`~modbusclient.breaker.CircuitBreaker` for each address.
+            Devices behind an open breaker fail immediately with
+            :class:`~modbusclient.breaker.CircuitOpenError`, so that
+            unreachable devices do not occupy workers. If ``None``, every
+            cycle attempts to connect. Defaults to
+            :class:`~modbusclient.breaker.CircuitBreaker`.
+
+    Attributes:
+        statistics: Statistics accumulated over all devices. Each device cycle
+            counts as one cycle.
+    """
+    statistics: PollStatistics
+
+    def __init__(
+        self,
+        devices: Iterable[Device],
+        interval: float = 1.,
+        max_concurrency: int = 64,
+        max_connections: int = 256,
+        timeout: float = 1.,
+        max_gap: int = 0,
+        queue_size: int = 1024,
+        decode: bool = True,
+        breaker: Callable[[], CircuitBreaker] | None = CircuitBreaker
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError("Expected positive concurrency", max_concurrency)
+        if max_connections < max_concurrency:
+            raise ValueError("Connection budget below concurrency",
+                             max_connections)
+        self._devices = tuple(devices)
+        self._schedulers = [Scheduler(device.payloads(),
+                                      interval=interval,
+                                      align=False,
+                                      max_gap=max_gap)
+                            for device in self._devices]
+        self._max_concurrency = max_concurrency
+        self._max_connections = max_connections
+        self._timeout = timeout
+        self._queue_size = queue_size
+        self._decode = decode
+        self._breaker = breaker
+        self._breakers = dict()  # address -> CircuitBreaker
+        self._connections = OrderedDict()  # address -> Client in LRU order
+        self._busy = dict()  # address -> number of workers using the client
+        self._heap = []  # (deadline, device index) of devices not in progress
+        self._wakeup = None  # future completed when a device is rescheduled
+        self._results = None
+        self._tasks = []
+        self.statistics = PollStatistics()
+
+    @property
+    def devices(self) -> tuple[Device, ...]:
+        """Get all devices
+
+        Return:
+            Devices polled
+        """
+        return self._devices
+
+    def breaker(self, device: Device) -> CircuitBreaker | None:
+        """Get circuit breaker of a device
+
+        Args:
+            device: Device
+
+        Return:
+            Circuit breaker shared by all devices with the same address or
+            ``None``, if the address has not been contacted yet or breakers
+            are disabled.
+        """
+        return self._breakers.get(device.address)
+
+    @property
+    def connections(self) -> int:
+        """Get number of open connections
+
+        Return:
+            Number of clients currently connected
+        """
+        return len(self._connections)
+
+    def is_running(self) -> bool:
+        """Check if polling has been started
+
+        Return:
+            ``True`` if and only if the poller is running
+        """
+        return bool(self._tasks)
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    def __aiter__(self):
+        return self._iter_results()
+
+    def start(self) -> None:
+        """Start polling all devices
+
+        Has no effect, if the poller is already running.
+        """
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._results = asyncio.Queue(self._queue_size)
+        work = asyncio.Queue()
+        self._tasks = [loop.create_task(self._schedule(work))]
+        self._tasks.extend(loop.create_task(self._work(work))
+                           for i in range(self._max_concurrency))
+
+    async def stop(self) -> None:
+        """Stop polling and close all connections"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._heap.clear()
+        if self._results is not None:
+            try:
+                self._results.put_nowait(None)  # wake up consumer
+            except asyncio.QueueFull:
+                pass
+        for client in self._connections.values():
+            client.disconnect()
+        self._connections.clear()
+        self._busy.clear()
+
+    async def _iter_results(self):
+        """Yield results until the poller is stopped"""
+        self.start()
+        while self._tasks:
+            snapshot = await self._results.get()
+            if snapshot is None:
+                return
+            yield snapshot
+
+    async def _schedule(self, work):
+        """Hand devices to the workers as they become due
+
+        Arguments:
+            work (asyncio.Queue): Queue of device indices consumed by workers
+        """
+        n = len(self._devices)
+        now = monotonic()
+        heap = self._heap
+        loop = asyncio.get_running_loop()
+        for i, scheduler in enumerate(self._schedulers):
+            intervals = scheduler.intervals
+            if not intervals:
+                continue  # nothing to read
+            scheduler.start(now + min(intervals) * i / n)
+            heappush(heap, (scheduler.next_deadline(), i))
+        while True:
+            delay = heap[0][0] - monotonic() if heap else None
+            if delay is None or delay > 0:
+                self._wakeup = loop.create_future()
+                await asyncio.wait([self._wakeup], timeout=delay)
+                continue
+            deadline, i = heappop(heap)
+            work.put_nowait((i, max(monotonic(), deadline)))
+
+    async def _work(self, work):
+        """Poll devices taken from the work queue
+
+        Arguments:
+            work (asyncio.Queue): Queue of device indices and due times
+        """
+        while True:
+            i, now = await work.get()
+            try:
+                blocks, missed = self._schedulers[i].pop_due(now)
+                snapshot = await self._poll(self._devices[i], blocks, missed)
+            finally:
+                # Devices in progress are not in the heap and cannot overlap
+                heappush(self._heap, (self._schedulers[i].next_deadline(), i))
+                if self._wakeup is not None and not self._wakeup.done():
+                    self._wakeup.set_result(None)
+            await self._results.put(snapshot)
+
+    async def _poll(self, device, blocks, missed):
+        """Read blocks from a device
+
+        Errors are reported in the snapshot. The connection shared with other
+        devices at the same address is closed only if the connection itself
+        failed, but not on exception responses or timeouts of this device.
+
+        Arguments:
+            device (Device): Device to poll
+            blocks (list): Blocks to read
+            missed (int): Number of cycles skipped
+
+        Return:
+            DeviceSnapshot: Values read
+        """
+        stats = self.statistics
+        stats.cycles += 1
+        stats.missed += missed
+        snapshot = DeviceSnapshot(device, monotonic(), dict(), missed)
+        client = None
+        try:
+            client = self._acquire(device.address)
+            for block in blocks:
+                header, payload, err_code = await client.call(
+                    function=block.function,
+                    start=block.start,
+                    count=block.count,
+                    unit=device.unit)
+                if self._decode:
+                    snapshot.values.update(block.decode(payload))
+                else:
+                    snapshot.values.update(block.split(payload))
+                stats.blocks_read += 1
+        except asyncio.CancelledError as exc:
+            # Only calls cancelled by closing the shared connection are errors
+            # of this device. Cancellations of the worker itself propagate.
+            if exc.args != (DISCONNECTED,) or _cancelling():
+                raise
+            self._fail(snapshot, ConnectionAbortedError(
+                "Connection closed while awaiting response"))
+        except Exception as exc:
+            self._fail(snapshot, exc)
+            if client is not None and isinstance(exc, OSError) \
+                    and not isinstance(exc, NO_DISCONNECT_ERRORS):
+                client.disconnect()
+        finally:
+            self._release(device.address)
+        return snapshot
+
+    def _fail(self, snapshot, exc):
+        """Record error of a poll cycle
+
+        Arguments:
+            snapshot (DeviceSnapshot): Snapshot of the failed cycle
+            exc (Exception): Error
+        """
+        logger.debug("While polling %s:%d: %s", *snapshot.device.address, exc)
+        self.statistics.errors += 1
+        snapshot.error = exc
+
+    def _acquire(self, address):
+        """Get the client for an address
+
+        The client connects on the first call.
+
+        Arguments:
+            address (tuple): Host and port
+
+        Return:
+            Client: Client for `address`
+        """
+        self._busy[address] = self._busy.get(address, 0) + 1
+        client = self._connections.get(address)
+        if client is not None:
+            self._connections.move_to_end(address)
+            return client
+        self._evict()
+        breaker = self._breakers.get(address)
+        if breaker is None and self._breaker is not None:
+            breaker = self._breakers[address] = self._breaker()
+        client = Client(host=address[0],
+                        port=address[1],
+                        timeout=self._timeout,
+                        max_retries=0,
+                        breaker=breaker)
+        self._connections[address] = client
+        return client
+
+    def _release(self, address):
+        """Release a client acquired via :meth:`_acquire`
+
+        Arguments:
+            address (tuple): Host and port
+        """
+        busy = self._busy[address] - 1
+        if busy:
+            self._busy[address] = busy
+            return
+        del self._busy[address]
+        client = self._connections.get(address)
+        if client is not None and not client.is_connected():
+            del self._connections[address]
+
+    def _evict(self):
+        """Close least recently used idle connections exceeding the budget"""
+        excess = len(self._connections) + 1 - self._max_connections
+        if excess <= 0:
+            return
+        for address in list(self._connections):
+            if address in self._busy:
+                continue
+            self._connections.pop(address).disconnect()
+            excess -= 1
+            if not excess:
+                return
@@ -0,0 +1,377 @@
+import asyncio
+from collections.abc import Callable, Iterable
+from collections import Counter
+from dataclasses import dataclass, field
+from math import floor
+from time import monotonic
+
+from ..blocks import Block, plan_blocks
+from ..payload import Payload
+from ..protocol import MAX_READ_REGISTERS
+
+
+@dataclass(slots=True)
+class Snapshot:
+    """Result of a single poll cycle
+
+    Attributes:
+        timestamp: Monotonic time (see :func:`time.monotonic`) at which the
+            cycle started.
+        values: Dictionary containing Payload as key and decoded value as value
+        missed: Number of cycles skipped immediately before this cycle, because
+            the previous cycle overran its interval.
+        skipped: Payloads due in this cycle, which were not read in order to
+            meet the time budget of the cycle.
+    """
+    timestamp: float
+    values: dict[Payload, object]
+    missed: int = 0
+    skipped: tuple[Payload, ...] = ()
+
+
+@dataclass
+class PollStatistics:
+    """Statistics collected while polling
+
+    Attributes:
+        cycles: Number of poll cycles
+        missed: Number of cycles skipped due to overruns
+        blocks_read: Number of blocks read
+        blocks_skipped: Number of blocks skipped to meet the time budget
+        over_budget: Number of cycles exceeding the time budget
+        errors: Number of cycles aborted due to an error
+        skipped: Number of skipped reads per payload
+    """
+    cycles: int = 0
+    missed: int = 0
+    blocks_read: int = 0
+    blocks_skipped: int = 0
+    over_budget: int = 0
+    errors: int = 0
+    skipped: Counter = field(default_factory=Counter)
+
+
+class CostModel:
+    """Estimate the time required to read a block
+
+    Keeps an exponentially weighted moving average of the measured latency of
+    each block. Blocks not measured yet are estimated by the moving average of
+    all measurements.
+
+    Args:
+        alpha: Weight of the latest measurement. Defaults to 0.2.
+    """
+    def __init__(self, alpha: float = 0.2) -> None:
+        if not 0. < alpha <= 1.:
+            raise ValueError("Expected weight in range (0, 1]", alpha)
+        self._alpha = alpha
+        self._estimates = dict()
+        self._default = 0.
+
+    @staticmethod
+    def key(block: Block) -> tuple[int, int, int]:
+        """Get key identifying a block
+
+        Args:
+            block: Block
+
+        Return:
+            Function code, start address and register count of the block
+        """
+        return block.function, block.start, block.count
+
+    def estimate(self, block: Block) -> float:
+        """Estimate the latency of a block
+
+        Args:
+            block: Block to read
+
+        Return:
+            Estimated latency in seconds
+        """
+        return self._estimates.get(self.key(block), self._default)
+
+    def update(self, block: Block, latency: float) -> None:
+        """Add a latency measurement
+
+        Args:
+            block: Block read
+            latency: Measured latency in seconds
+        """
+        key = self.key(block)
+        estimate = self._estimates.get(key)
+        if estimate is None:
+            self._estimates[key] = latency
+        else:
+            self._estimates[key] = estimate + self._alpha * (latency - estimate)
+        if self._default:
+            self._default += self._alpha * (latency - self._default)
+        else:
+            self._default = latency
+
+
+class Ticker:
+    """Drift free periodic clock
+
+    Deadlines are computed as multiples of ``interval`` relative to a fixed
+    time base rather than relative to the end of the previous cycle. Hence the
+    time spent between two calls to :meth:`wait` does not accumulate. If a
+    deadline has already passed, when :meth:`wait` is called, the ticker skips
+    all deadlines in the past and reports the number of skipped ticks.
+
+    The first tick is due immediately after the ticker has been started.
+
+    Args:
+        interval: Interval between two ticks in seconds
+        align: If ``True``, all ticks following the first one are aligned to
+            integer multiples of ``interval`` on the monotonic clock.
+            Otherwise ticks are relative to the first tick. Defaults to
+            ``True``.
+        clock: Function returning the current monotonic time in seconds.
+            Defaults to :func:`time.monotonic`, which is the clock used by the
+            asyncio event loop.
+
+    Attributes:
+        interval: Interval between two ticks in seconds
+        align: Align ticks to multiples of ``interval``
+        missed: Total number of skipped ticks
+    """
+    interval: float
+    align: bool
+    missed: int
+
+    def __init__(
+        self,
+        interval: float,
+        align: bool = True,
+        clock: Callable[[], float] = monotonic
+    ) -> None:
+        if interval <= 0:
+            raise ValueError("Expected positive interval", interval)
+        self.interval = float(interval)
+        self.align = align
+        self.missed = 0
+        self._clock = clock
+        self._origin = 0.
+        self._index = None
+
+    @property
+    def deadline(self) -> float | None:
+        """Get the current deadline
+
+        Return:
+            Monotonic time of the current tick or ``None`` if the ticker has not
+            been started yet.
+        """
+        if self._index is None:
+            return None
+        return self._origin + self._index * self.interval
+
+    def reset(self, now: float | None = None) -> None:
+        """Restart the ticker
+
+        The first tick is due at ``now``.
+
+        Args:
+            now: Current time. If ``None``, the clock is queried.
+        """
+        if now is None:
+            now = self._clock()
+        self._origin = 0. if self.align else now
+        self._index = (now - self._origin) / self.interval
+
+    def advance(self, now: float | None = None) -> int:
+        """Advance to the next deadline
+
+        Deadlines, which have already passed at time ``now`` are skipped. If
+        the ticker has not been started yet, it is started at ``now``.
+
+        Args:
+            now: Current time. If ``None``, the clock is queried.
+
+        Return:
+            Number of skipped deadlines
+        """
+        if now is None:
+            now = self._clock()
+        if self._index is None:
+            self.reset(now)
+            return 0
+        # Integer tick indices avoid the accumulation of rounding errors
+        self._index = floor(self._index) + 1
+        missed = 0
+        deadline = self.deadline
+        if now > deadline:
+            missed = floor((now - deadline) / self.interval) + 1
+            self._index += missed
+            self.missed += missed
+        return missed
+
+    async def wait(self) -> int:
+        """Wait for the next tick
+
+        Return:
+            Number of ticks skipped before this one
+        """
+        now = self._clock()
+        missed = self.advance(now)
+        delay = self.deadline - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return missed
+
+
+class Scheduler:
+    """Multi-rate poll scheduler
+
+    Payloads are grouped by their poll interval, which is taken from the
+    ``poll_interval`` attribute of each payload. The attribute can be set by
+    passing ``poll_interval`` to the constructor of
+    :class:`~modbusclient.payload.Payload`. Each group is driven by its own
+    :class:`Ticker`. On each tick, the payloads of all groups due are merged
+    into coalesced blocks via :func:`~modbusclient.blocks.plan_blocks`. Block
+    plans are cached for each combination of due groups, so that steady state
+    polling reuses the same plans.
+
+    Args:
+        payloads: Readable payloads to schedule
+        interval: Poll interval in seconds used for payloads without
+            ``poll_interval`` attribute. If ``None``, every payload must define
+            its own interval. Defaults to ``None``.
+        align: Align ticks to integer multiples of the respective interval.
+            Defaults to ``True``.
+        max_count: Maximum number of registers per block. Defaults to
+            ``MAX_READ_REGISTERS``.
+        max_gap: Maximum number of unused registers within a block. Defaults
+            to 0.
+        clock: Function returning the current monotonic time in seconds.
+            Defaults to :func:`time.monotonic`.
+
+    Raises:
+        ValueError: If a payload does not define a poll interval and
+            ``interval`` is ``None``
+    """
+    def __init__(
+        self,
+        payloads: Iterable[Payload],
+        interval: float | None = None,
+        align: bool = True,
+        max_count: int = MAX_READ_REGISTERS,
+        max_gap: int = 0,
+        clock: Callable[[], float] = monotonic
+    ) -> None:
+        groups = dict()
+        for msg in payloads:
+            poll_interval = getattr(msg, "poll_interval", interval)
+            if poll_interval is None:
+                raise ValueError("Undefined poll interval", str(msg))
+            groups.setdefault(float(poll_interval), []).append(msg)
+
+        self._clock = clock
+        self._tickers = [Ticker(key, align=align, clock=clock) for key in groups]
+        self._groups = [tuple(group) for group in groups.values()]
+        self._plans = dict()
+        self._deferred = []
+        self._max_count = max_count
+        self._max_gap = max_gap
+        self._started = False
+
+    @property
+    def intervals(self) -> list[float]:
+        """Get poll intervals of all groups
+
+        Return:
+            Poll interval of each group in seconds
+        """
+        return [ticker.interval for ticker in self._tickers]
+
+    def start(self, now: float | None = None) -> None:
+        """Reset all tickers
+
+        Args:
+            now: Current time. If ``None``, the clock is queried.
+        """
+        if now is None:
+            now = self._clock()
+        for ticker in self._tickers:
+            ticker.reset(now)
+        self._started = True
+
+    def next_deadline(self) -> float:
+        """Get time of the next tick of any group
+
+        Return:
+            Monotonic time of the next tick
+        """
+        if not self._started:
+            self.start()
+        return min(ticker.deadline for ticker in self._tickers)
+
+    def pop_due(self, now: float | None = None) -> tuple[list[Block], int]:
+        """Get blocks due at a given time and advance the respective tickers
+
+        Args:
+            now: Current time. If ``None``, the clock is queried.
+
+        Return:
+            Blocks to read and the maximum number of ticks skipped by any
+            of the groups due.
+        """
+        if now is None:
+            now = self._clock()
+        if not self._started:
+            self.start(now)
+        due = tuple(i for i, ticker in enumerate(self._tickers)
+                    if ticker.deadline <= now)
+        missed = max((self._tickers[i].advance(now) for i in due), default=0)
+        plan = self.plan(due)
+        if self._deferred:
+            payloads = {msg for block in plan for msg in block.payloads}
+            payloads.update(self._deferred)
+            self._deferred.clear()
+            plan = plan_blocks(payloads,
+                               max_count=self._max_count,
+                               max_gap=self._max_gap)
+        return plan, missed
+
+    def defer(self, blocks: Iterable[Block]) -> None:
+        """Read blocks again on the next tick
+
+        Args:
+            blocks: Blocks which could not be read
+        """
+        for block in blocks:
+            self._deferred.extend(block.payloads)
+
+    def plan(self, due: tuple[int, ...]) -> list[Block]:
+        """Get block plan for a combination of groups
+
+        Args:
+            due: Indices of all groups to read
+
+        Return:
+            Coalesced blocks containing all payloads of the groups
+        """
+        try:
+            return self._plans[due]
+        except KeyError:
+            pass
+        payloads = [msg for i in due for msg in self._groups[i]]
+        plan = plan_blocks(payloads,
+                           max_count=self._max_count,
+                           max_gap=self._max_gap)
+        self._plans[due] = plan
+        return plan
+
+    async def wait(self) -> tuple[list[Block], int]:
+        """Wait for the next tick and get the blocks due
+
+        Return:
+            Same as :meth:`pop_due`
+        """
+        deadline = self.next_deadline()
+        delay = deadline - self._clock()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # The event loop may wake up slightly ahead of time
+        return self.pop_due(max(self._clock(), deadline))
@@ -0,0 +1,273 @@
+import asyncio
+from logging import getLogger
+
+from ..breaker import backoff
+from ..protocol import DEFAULT_PORT
+from .client import Client, MAX_RETRY_DELAY
+
+logger = getLogger("modbusclient")
+
+
+class ClientPool(object):
+    """Pool of persistent connections to the same server
+
+    Some gateways process requests received on different TCP connections in
+    parallel, while requests on the same connection are processed in
+    sequence. This class keeps several :class:`~modbusclient.asyncio.Client`
+    connections to the same server and dispatches each call to the connection
+    with the least number of pending calls. Connections which fail are
+    excluded from dispatch and reconnected in the background.
+
+    The pool provides the same interface as
+    :class:`~modbusclient.asyncio.Client` used by
+    :class:`~modbusclient.asyncio.ApiWrapper` and can be used as a drop-in
+    replacement.
+
+    Arguments:
+        host (string): IP Adress of the host. Defaults to the empty string.
+        port (int): Port to use. Defaults to 502
+        timeout (float): Timeout in seconds. Passed verbatim to each client.
+        size (int): Number of connections. Defaults to 2.
+        max_transactions (int): Max. number of transactions per connection.
+            Defaults to 3.
+        reserved_transactions (int): Number of transactions reserved for high
+            priority requests per connection. Defaults to 0.
+        max_retries (int): Maximum number of connection retries. Passed
+            verbatim to each client. Defaults to 5.
+        reconnect_delay (float): Delay in seconds after the first failed
+            attempt to reconnect a connection in the background. The delay
+            doubles with each further attempt up to ``MAX_RETRY_DELAY``.
+            Defaults to 1.
+        breaker (:class:`~modbusclient.breaker.CircuitBreaker`): Circuit
+            breaker shared by all clients. Defaults to ``None``.
+        profile (:class:`~modbusclient.metrics.PhaseProfile`): Profile shared
+            by all clients. Defaults to ``None``.
+        hooks (:class:`~modbusclient.hooks.Hooks`): Hooks shared by all
+            clients. Defaults to ``None``.
+        metrics (:class:`~modbusclient.metrics.ClientMetrics`): Metrics
+            shared by all clients. Defaults to ``None``.
+
+    Attributes:
+        profile (:class:`~modbusclient.metrics.PhaseProfile`): Profile shared
+            by all clients or ``None``
+        metrics (:class:`~modbusclient.metrics.ClientMetrics`): Metrics shared
+            by all clients or ``None``
+    """
+    def __init__(self,
+                 host="",
+                 port=DEFAULT_PORT,
+                 timeout=None,
+                 size=2,
+                 max_transactions=3,
+                 reserved_transactions=0,
+                 max_retries=5,
+                 reconnect_delay=1.,
+                 breaker=None,
+                 profile=None,
+                 hooks=None,
+                 metrics=None):
+        if size < 1:
+            raise ValueError("Expected at least one connection", size)
+        self._clients = [Client(host=host,
+                                port=port,
+                                timeout=timeout,
+                                max_transactions=max_transactions,
+                                reserved_transactions=reserved_transactions,
+                                max_retries=max_retries,
+                                breaker=breaker,
+                                profile=profile,
+                                hooks=hooks,
+                                metrics=metrics)
+                         for i in range(size)]
+        self.profile = profile
+        self.metrics = metrics
+        self._load = size * [0]
+        self._reconnecting = dict()
+        self.reconnect_delay = reconnect_delay
+
+    @property
+    def size(self):
+        """Get number of connections
+
+        Return:
+            int: Number of connections managed by this pool
+        """
+        return len(self._clients)
+
+    @property
+    def max_transactions(self):
+        """Get maximum number of transactions of all connections
+
+        Return:
+            int: Sum of the maximum number of transactions of all clients
+        """
+        return sum(client.max_transactions for client in self._clients)
+
+    @property
+    def clients(self):
+        """Get all clients of this pool
+
+        Return:
+            list: :class:`~modbusclient.asyncio.Client` instances
+        """
+        return list(self._clients)
+
+    @property
+    def load(self):
+        """Get number of pending calls per connection
+
+        Return:
+            list: Number of pending calls for each client
+        """
+        return list(self._load)
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.disconnect()
+
+    def is_connected(self):
+        """Check if any connection of this pool is established
+
+        Return:
+            bool: True if and only if at least one client is connected
+        """
+        return any(client.is_connected() for client in self._clients)
+
+    async def connect(self, host=None, port=None, max_retries=None):
+        """Connect all clients of this pool
+
+        Clients, which fail to connect, are reconnected in the background.
+
+        Arguments:
+            host (string): IP Adress of the host
+            port (int): Port to use. Defaults to 502
+            max_retries (int): Maximum number of retries.
+
+        Raise:
+            OSError: If none of the clients could be connected
+        """
+        self.disconnect()
+        results = await asyncio.gather(
+            *[client.connect(host=host, port=port, max_retries=max_retries)
+              for client in self._clients],
+            return_exceptions=True
+        )
+        errors = [exc for exc in results if isinstance(exc, BaseException)]
+        if len(errors) == self.size:
+            raise errors[0]
+        for i, result in enumerate(results):
+            if isinstance(result, BaseException):
+                logger.warning("Connection %d failed: %s", i, result)
+                self._reconnect_later(i)
+
+    def disconnect(self):
+        """Disconnect all clients
+
+        Stops all pending reconnects.
+        """
+        for task in self._reconnecting.values():
+            task.cancel()
+        self._reconnecting.clear()
+        for client in self._clients:
+            client.disconnect()
+
+    async def call(self, function, **kwargs):
+        """Call a function on the least loaded connection
+
+        If no connection is available, the call waits for a connection to be
+        re-established, but not longer than its timeout.
+
+        Arguments:
+            function (int): Function code
+            **kwargs: Keyword arguments passed verbatim to
+                :meth:`~modbusclient.asyncio.Client.call`.
+
+        Return:
+            Result of :meth:`~modbusclient.asyncio.Client.call`
+
+        Raise:
+            ConnectionError: If no connection becomes available within the
+            timeout
+        """
+        timeout = kwargs.get("timeout")
+        if timeout is None:
+            timeout = self._clients[0].timeout
+        i = await self._select(timeout)
+        client = self._clients[i]
+        self._load[i] += 1
+        try:
+            return await client.call(function, **kwargs)
+        finally:
+            self._load[i] -= 1
+            if not client.is_connected():
+                self._reconnect_later(i)
+
+    async def _select(self, timeout=None):
+        """Select the least loaded available connection
+
+        Waits for a reconnect, if no connection is available.
+
+        Arguments:
+            timeout (float): Maximum time to wait in seconds. If ``None``,
+                waits until a connection has been re-established.
+
+        Return:
+            int: Index of the selected client
+
+        Raise:
+            ConnectionError: If no connection becomes available within
+            `timeout`
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            available = [i for i in range(self.size)
+                         if i not in self._reconnecting]
+            if available:
+                return min(available, key=self._load.__getitem__)
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                raise ConnectionError("No connection available")
+            await asyncio.wait(list(self._reconnecting.values()),
+                               timeout=remaining,
+                               return_when=asyncio.FIRST_COMPLETED)
+
+    def _reconnect_later(self, i):
+        """Reconnect a client in the background
+
+        Arguments:
+            i (int): Index of the client
+        """
+        if i in self._reconnecting:
+            return
+        logger.info("Reconnecting connection %d in the background ...", i)
+        task = asyncio.get_running_loop().create_task(self._reconnect(i))
+        self._reconnecting[i] = task
+
+    async def _reconnect(self, i):
+        """Reconnect a client until successful
+
+        Arguments:
+            i (int): Index of the client
+        """
+        client = self._clients[i]
+        attempt = 0
+        try:
+            while True:
+                try:
+                    await client.connect()
+                    logger.info("Connection %d re-established", i)
+                    return
+                except (OSError, asyncio.TimeoutError) as exc:
+                    attempt += 1
+                    delay = backoff(attempt, self.reconnect_delay,
+                                    MAX_RETRY_DELAY, jitter=0.5)
+                    logger.debug("Reconnect %d failed: %s. Retrying in "
+                                 "%.2fs", i, exc, delay)
+                    await asyncio.sleep(delay)
+        finally:
+            if self._reconnecting.get(i) is asyncio.current_task():
+                del self._reconnecting[i]
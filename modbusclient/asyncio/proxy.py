@@ -0,0 +1,379 @@
+import asyncio
+from collections import OrderedDict
+from collections.abc import Callable
+from logging import getLogger
+import struct
+from time import monotonic
+
+from ..error_codes import (
+    NO_ERROR,
+    ILLEGAL_DATA_ADDRESS,
+    ILLEGAL_DATA_VALUE,
+    SERVER_DEVICE_FAILURE,
+    GATEWAY_PATH_UNAVAILABLE,
+    GATEWAY_TARGET_FAILED_TO_RESPOND,
+    ModbusError
+)
+from ..functions import (
+    READ_HOLDING_REGISTERS,
+    READ_INPUT_REGISTERS,
+    WRITE_SINGLE_REGISTER
+)
+from ..protocol import (
+    ApplicationProtocolHeader,
+    DEFAULT_PORT,
+    MAX_READ_REGISTERS,
+    MAX_WRITE_REGISTERS,
+    new_response,
+    parse_request_body,
+    parse_response_header
+)
+from ..register_image import DeviceImage, TABLE_SIZE
+from .client import Client
+
+logger = getLogger("modbusclient")
+
+READ_FUNCTIONS = frozenset([READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS])
+
+
+class Proxy:
+    """Modbus TCP server sharing one connection to a device among many clients
+
+    Many devices accept only a few TCP connections. A proxy accepts any number
+    of downstream clients and forwards their requests over a single upstream
+    :class:`~modbusclient.asyncio.Client`. Transaction IDs of the downstream
+    clients are preserved, so that each client may pipeline requests.
+
+    Registers read from the device are stored in a
+    :class:`~modbusclient.register_image.DeviceImage`. Reads of registers
+    received within ``max_age`` are answered from the image without contacting
+    the device. Identical reads arriving while the same read is in progress
+    are merged into a single upstream request. Writes are always forwarded and
+    invalidate the registers written::
+
+        client = Client(host="192.168.1.10", timeout=1.)
+        async with Proxy(client, max_age=0.5) as proxy:
+            await proxy.start(port=5020)
+            await proxy.serve_forever()
+
+    The image holds the registers of at most ``max_units`` units. If
+    registers of more units are read, the least recently used unit is dropped
+    from the image.
+
+    Errors of the upstream connection are reported to the downstream clients
+    as ``GATEWAY_PATH_UNAVAILABLE`` or ``GATEWAY_TARGET_FAILED_TO_RESPOND``.
+
+    Args:
+        client: Client used to contact the device. Connected on demand.
+        max_age: Maximum age in seconds of registers served from the image. If
+            0, each read is forwarded, but identical reads in progress are still
+            merged. Defaults to 1.
+        max_units: Maximum number of units held in the image. Each unit
+            takes up to 1.25 MiB. Defaults to 16.
+        clock: Function returning the current monotonic time in seconds.
+            Defaults to :func:`time.monotonic`.
+
+    Attributes:
+        hits: Number of reads answered from the image
+        merged: Number of reads merged with an identical read in progress
+        forwarded: Number of requests forwarded to the device
+    """
+    hits: int
+    merged: int
+    forwarded: int
+
+    def __init__(
+        self,
+        client: Client,
+        max_age: float = 1.,
+        max_units: int = 16,
+        clock: Callable[[], float] = monotonic
+    ) -> None:
+        self.max_age = max_age
+        self.max_units = max_units
+        self.hits = 0
+        self.merged = 0
+        self.forwarded = 0
+        self._client = client
+        self._image = DeviceImage(clock=clock)
+        self._units = OrderedDict()  # units held in the image in LRU order
+        self._pending = dict()  # (unit, function, start, count) -> Task
+        self._writes = 0  # incremented by each write forwarded
+        self._server = None
+        self._writers = set()
+        self._tasks = set()
+
+    async def __aenter__(self) -> "Proxy":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop()
+
+    @property
+    def client(self) -> Client:
+        """Get upstream client
+
+        Return:
+            Client used to contact the device
+        """
+        return self._client
+
+    @property
+    def image(self) -> DeviceImage:
+        """Get register image
+
+        Return:
+            Image of the registers read from the device
+        """
+        return self._image
+
+    @property
+    def connections(self) -> int:
+        """Get number of downstream clients
+
+        Return:
+            Number of clients currently connected to the proxy
+        """
+        return len(self._writers)
+
+    async def start(
+        self,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PORT
+    ) -> int:
+        """Start accepting clients
+
+        Args:
+            host: Address to listen on. Defaults to ``127.0.0.1``.
+            port: Port to listen on. If 0, a free port is chosen. Defaults to
+                502.
+
+        Return:
+            Port the proxy listens on
+        """
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        """Serve clients until cancelled"""
+        await self._server.serve_forever()
+
+    async def stop(self) -> None:
+        """Stop accepting clients and close all connections
+
+        The upstream client is disconnected as well.
+        """
+        if self._server is not None:
+            self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        tasks = list(self._tasks) + list(self._pending.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+            self._server = None
+        self._client.disconnect()
+
+    async def _serve(self, reader, writer):
+        """Read requests of a downstream client
+
+        Each request is handled by a separate task, so that pipelined requests
+        are processed concurrently.
+
+        Arguments:
+            reader (asyncio.StreamReader): Stream of the client
+            writer (asyncio.StreamWriter): Stream of the client
+        """
+        nbytes = ApplicationProtocolHeader.get_parser().size
+        self._writers.add(writer)
+        try:
+            while True:
+                header = parse_response_header(await reader.readexactly(nbytes))
+                body = await reader.readexactly(header.msglen - 2)
+                task = asyncio.create_task(self._handle(writer, header, body))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except RuntimeError as exc:
+            logger.warning("Closing connection after invalid request: %s", exc)
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _handle(self, writer, header, body):
+        """Answer a single request
+
+        Arguments:
+            writer (asyncio.StreamWriter): Stream of the client
+            header (~modbusclient.ApplicationProtocolHeader): Request header
+            body (bytes): Request body following the header
+        """
+        try:
+            request, data = parse_request_body(header, body)
+            if header.function in READ_FUNCTIONS:
+                response = await self._read(header, request)
+            else:
+                response = await self._write(header, request, data)
+        except ModbusError as exc:
+            response = new_response(header, err_code=exc.args[0])
+        except struct.error:
+            response = new_response(header, err_code=ILLEGAL_DATA_VALUE)
+        if not writer.is_closing():
+            writer.write(response)
+
+    async def _read(self, header, request):
+        """Answer a read request from the image or the device
+
+        Arguments:
+            header (~modbusclient.ApplicationProtocolHeader): Request header
+            request (~modbusclient.protocol.ReadRequest): Request
+
+        Return:
+            bytes: Response
+        """
+        start, count = request.start, request.count
+        if not 0 < count <= MAX_READ_REGISTERS:
+            raise ModbusError(ILLEGAL_DATA_VALUE, count)
+        if start + count > TABLE_SIZE:
+            raise ModbusError(ILLEGAL_DATA_ADDRESS, start)
+        table = self._image.get(header.unit, header.function)
+        if table is not None:
+            try:
+                payload = table.raw(start, count, self.max_age)
+            except KeyError:
+                pass
+            else:
+                self.hits += 1
+                self._units.move_to_end(header.unit)
+                return new_response(header, payload)
+
+        key = (header.unit, header.function, start, count)
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key))
+            self._pending[key] = task
+        else:
+            self.merged += 1
+        payload, err_code = await asyncio.shield(task)
+        return new_response(header, payload, err_code)
+
+    async def _fetch(self, key):
+        """Read registers from the device and store them in the image
+
+        Arguments:
+            key (tuple): Unit, function code, start address and number of
+                registers
+
+        Return:
+            tuple(bytes, int): Payload and error code
+        """
+        unit, function, start, count = key
+        writes = self._writes
+        try:
+            payload, err_code = await self._forward(function,
+                                                    unit=unit,
+                                                    start=start,
+                                                    count=count)
+            # Registers read before a write completed may be outdated
+            if err_code == NO_ERROR and writes == self._writes:
+                self._store(unit, function, start, payload)
+            return payload, err_code
+        finally:
+            if self._pending.get(key) is asyncio.current_task():
+                del self._pending[key]
+
+    def _store(self, unit, function, start, payload):
+        """Store registers in the image
+
+        The least recently used units are dropped from the image to keep at
+        most :attr:`max_units`.
+
+        Arguments:
+            unit (int): Unit ID
+            function (int): Function code used to read the registers
+            start (int): Address of the first register
+            payload (bytes): Raw data
+        """
+        self._units[unit] = None
+        self._units.move_to_end(unit)
+        while len(self._units) > self.max_units:
+            evicted, _ = self._units.popitem(last=False)
+            self._image.discard(evicted)
+        self._image.update(unit, function, start, payload)
+
+    async def _write(self, header, request, data):
+        """Forward a write request to the device
+
+        Arguments:
+            header (~modbusclient.ApplicationProtocolHeader): Request header
+            request: Request PDU
+            data (bytes): Data to write
+
+        Return:
+            bytes: Response
+        """
+        if header.function == WRITE_SINGLE_REGISTER:
+            count = 1
+            if len(data) != 2:
+                raise ModbusError(ILLEGAL_DATA_VALUE, len(data))
+            kwargs = dict()
+        else:
+            count = request.count
+            if not 0 < count <= MAX_WRITE_REGISTERS or len(data) != 2 * count:
+                raise ModbusError(ILLEGAL_DATA_VALUE, count)
+            kwargs = dict(count=count)
+        if request.start + count > TABLE_SIZE:
+            raise ModbusError(ILLEGAL_DATA_ADDRESS, request.start)
+
+        # Reads in progress must not be merged with reads following the write
+        self._writes += 1
+        for key in [key for key in self._pending if key[0] == header.unit]:
+            del self._pending[key]
+        try:
+            payload, err_code = await self._forward(header.function,
+                                                    unit=header.unit,
+                                                    start=request.start,
+                                                    payload=data,
+                                                    **kwargs)
+        finally:
+            self._image.invalidate(header.unit, request.start, count)
+        return new_response(header,
+                            payload,
+                            err_code,
+                            start=request.start,
+                            **kwargs)
+
+    async def _forward(self, function, **kwargs):
+        """Forward a request to the device
+
+        Arguments:
+            function (int): Function code
+            **kwargs: Keyword arguments passed verbatim to
+                :meth:`~modbusclient.asyncio.Client.call`
+
+        Return:
+            tuple(bytes, int): Payload and error code
+        """
+        self.forwarded += 1
+        try:
+            header, payload, err_code = await self._client.call(function,
+                                                                **kwargs)
+        except ModbusError as exc:
+            err_code = exc.args[0]
+            # Library internal error codes cannot be sent to clients
+            return b"", err_code if err_code > 0 else SERVER_DEVICE_FAILURE
+        except asyncio.TimeoutError:
+            return b"", GATEWAY_TARGET_FAILED_TO_RESPOND
+        except asyncio.CancelledError:
+            if self._client.is_connected():
+                raise
+            # Futures of pending transactions are cancelled on disconnect
+            logger.warning("Connection lost while forwarding request")
+            return b"", GATEWAY_PATH_UNAVAILABLE
+        except OSError as exc:
+            logger.warning("Forwarding request failed: %s", exc)
+            return b"", GATEWAY_PATH_UNAVAILABLE
+        return payload, err_code
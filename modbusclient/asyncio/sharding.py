@@ -0,0 +1,424 @@
+import asyncio
+import multiprocessing
+import os
+import pickle
+import threading
+from collections.abc import Iterable, Sequence
+from heapq import heapify, heapreplace
+from logging import getLogger
+from struct import Struct
+
+from ..payload import Payload
+from .fleet import Device, DeviceSnapshot, FleetPoller
+
+logger = getLogger("modbusclient")
+
+# device index, timestamp, missed cycles, decoded flag, length of values,
+# length of error
+SNAPSHOT_HEADER = Struct("<IdI?II")
+# payload index, number of bytes
+VALUE_HEADER = Struct("<HH")
+# maximum number of records forwarded to the event loop at once
+MAX_BATCH = 64
+
+
+def partition_devices(
+    devices: Sequence[Device],
+    shards: int
+) -> list[list[int]]:
+    """Distribute devices evenly over a number of shards
+
+    Devices sharing the same address are assigned to the same shard, so that
+    they can share a connection.
+
+    Args:
+        devices: Devices to distribute
+        shards: Number of shards
+
+    Return:
+        Indices of the devices assigned to each shard ordered by the first
+        index of each shard. Empty shards are omitted.
+    """
+    groups = dict()
+    for i, device in enumerate(devices):
+        groups.setdefault(device.address, []).append(i)
+    heap = [(0, i, []) for i in range(shards)]  # (load, shard, indices)
+    heapify(heap)
+    for group in sorted(groups.values(), key=len, reverse=True):
+        load, i, indices = heap[0]
+        indices.extend(group)
+        heapreplace(heap, (load + len(group), i, indices))
+    return sorted(sorted(indices) for _, _, indices in heap if indices)
+
+
+def encode_snapshot(
+    index: int,
+    snapshot: DeviceSnapshot,
+    payloads: dict[Payload, int],
+    decoded: bool = False
+) -> bytes:
+    """Serialize a snapshot
+
+    The snapshot is encoded as a fixed size header followed by the values and
+    the pickled error. Raw values are encoded as one record per value, which
+    consists of the index of the payload, the number of bytes and the raw
+    bytes of the value. Decoded values are pickled as a list of pairs of
+    payload index and value.
+
+    Args:
+        index: Index of the device
+        snapshot: Snapshot of a :class:`~modbusclient.asyncio.FleetPoller`
+        payloads: Index of each payload of the device
+        decoded: If ``True``, the snapshot contains decoded values, i.e. it
+            was created with ``decode=True``. Defaults to ``False``.
+
+    Return:
+        Binary record
+    """
+    error = b"" if snapshot.error is None else _pickle_error(snapshot.error)
+    if decoded:
+        values = pickle.dumps([(payloads[msg], value)
+                               for msg, value in snapshot.values.items()])
+    else:
+        values = b"".join(VALUE_HEADER.pack(payloads[msg], len(raw)) + raw
+                          for msg, raw in snapshot.values.items())
+    header = SNAPSHOT_HEADER.pack(index,
+                                  snapshot.timestamp,
+                                  snapshot.missed,
+                                  decoded,
+                                  len(values),
+                                  len(error))
+    return b"".join((header, values, error))
+
+
+def decode_snapshot(
+    buffer: bytes,
+    devices: Sequence[Device],
+    payloads: Sequence[Sequence[Payload]],
+    decode: bool = True
+) -> DeviceSnapshot:
+    """Deserialize a snapshot encoded by :func:`encode_snapshot`
+
+    Args:
+        buffer: Binary record
+        devices: All devices indexed by the device index of the record
+        payloads: Payloads of each device as returned by
+            :meth:`~modbusclient.asyncio.Device.payloads`
+        decode: If ``False``, raw values are returned as raw bytes. Defaults
+            to ``True``. Records containing decoded values are returned as
+            they are.
+
+    Return:
+        Snapshot
+    """
+    index, timestamp, missed, decoded, nvalues, nerror = \
+        SNAPSHOT_HEADER.unpack_from(buffer)
+    messages = payloads[index]
+    view = memoryview(buffer)
+    offset = SNAPSHOT_HEADER.size
+    end = offset + nvalues
+    if decoded:
+        values = {messages[j]: value
+                  for j, value in pickle.loads(view[offset:end])}
+    else:
+        values = dict()
+        while offset < end:
+            j, nbytes = VALUE_HEADER.unpack_from(buffer, offset)
+            offset += VALUE_HEADER.size
+            msg = messages[j]
+            raw = view[offset:offset + nbytes]
+            values[msg] = msg.decode(raw) if decode else bytes(raw)
+            offset += nbytes
+    error = pickle.loads(view[end:end + nerror]) if nerror else None
+    return DeviceSnapshot(devices[index], timestamp, values, missed, error)
+
+
+def _pickle_error(error):
+    """Pickle an exception
+
+    Exceptions which cannot be pickled are replaced by a
+    :class:`RuntimeError` containing their representation.
+    """
+    try:
+        return pickle.dumps(error)
+    except Exception:
+        return pickle.dumps(RuntimeError(repr(error)))
+
+
+def _run_shard(devices, indices, data, control, decode, kwargs):
+    """Entry point of a worker process
+
+    Arguments:
+        devices (list): Devices polled by this worker
+        indices (list): Global index of each device
+        data (multiprocessing.connection.Connection): Connection used to send
+            results
+        control (multiprocessing.connection.Connection): Connection closed or
+            written to by the parent to stop the worker
+        decode (bool): If ``True``, values are decoded by the worker
+        kwargs (dict): Keyword arguments passed verbatim to
+            :class:`~modbusclient.asyncio.FleetPoller`
+    """
+    try:
+        asyncio.run(_poll_shard(devices, indices, data, control, decode,
+                                kwargs))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        data.close()
+
+
+async def _poll_shard(devices, indices, data, control, decode, kwargs):
+    """Poll devices and forward results until stopped by the parent"""
+    loop = asyncio.get_running_loop()
+    stopped = loop.create_future()
+
+    def wait_for_stop():
+        try:
+            control.recv()
+        except (EOFError, OSError):
+            pass
+        loop.call_soon_threadsafe(
+            lambda: stopped.done() or stopped.set_result(None))
+
+    # A daemon thread does not prevent the worker from exiting
+    threading.Thread(target=wait_for_stop, daemon=True).start()
+    index = {device: i for device, i in zip(devices, indices)}
+    payloads = {device: {msg: i for i, msg in enumerate(device.payloads())}
+                for device in devices}
+
+    async def forward(poller):
+        async for snapshot in poller:
+            device = snapshot.device
+            data.send_bytes(encode_snapshot(index[device],
+                                            snapshot,
+                                            payloads[device],
+                                            decode))
+
+    async with FleetPoller(devices, decode=decode, **kwargs) as poller:
+        forwarding = loop.create_task(forward(poller))
+        await asyncio.wait([stopped, forwarding],
+                           return_when=asyncio.FIRST_COMPLETED)
+        forwarding.cancel()
+        try:
+            await forwarding
+        except asyncio.CancelledError:
+            pass
+        except (BrokenPipeError, EOFError):
+            logger.debug("Parent process has gone away")
+
+
+class ShardedPoller:
+    """Poll devices from several worker processes
+
+    Devices are partitioned into shards via :func:`partition_devices`. Each
+    shard is polled by a :class:`~modbusclient.asyncio.FleetPoller` running
+    in the event loop of a separate worker process, so that the CPU time
+    spent on framing and scheduling is distributed over several cores.
+
+    Workers decode the values and send them along with the index of the
+    device and payload via a pipe (see :func:`encode_snapshot`), so that the
+    parent process merely unpickles them. If ``decode`` is ``False``, workers
+    send the raw bytes of each value instead, which are returned as they
+    are. Results are streamed by asynchronous iteration over the poller::
+
+        async with ShardedPoller(devices, workers=4, interval=10.) as poller:
+            async for snapshot in poller:
+                process(snapshot)
+
+    Devices are pickled when the workers are started. Hence the API of each
+    device must be picklable.
+
+    Args:
+        devices: Devices to poll
+        workers: Number of worker processes. If ``None``, the number of CPUs
+            is used. Defaults to ``None``.
+        decode: If ``False``, values are neither decoded by the workers nor
+            by the parent and are returned as raw bytes. Defaults to
+            ``True``.
+        queue_size: Maximum number of results not consumed yet. Workers block,
+            if the consumer falls behind. Defaults to 1024.
+        context: Multiprocessing context used to start the workers. Defaults
+            to the ``spawn`` context, which is safe to use from a running
+            event loop.
+        **kwargs: Keyword arguments passed verbatim to
+            :class:`~modbusclient.asyncio.FleetPoller` in each worker.
+    """
+    def __init__(
+        self,
+        devices: Iterable[Device],
+        workers: int | None = None,
+        decode: bool = True,
+        queue_size: int = 1024,
+        context: multiprocessing.context.BaseContext | None = None,
+        **kwargs
+    ) -> None:
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError("Expected at least one worker", workers)
+        self._devices = tuple(devices)
+        self._payloads = [device.payloads() for device in self._devices]
+        self._shards = partition_devices(self._devices, workers)
+        self._decode = decode
+        self._queue_size = queue_size
+        self._context = context or multiprocessing.get_context("spawn")
+        self._kwargs = kwargs
+        self._processes = []
+        self._controls = []
+        self._readers = []
+        self._results = None
+        self._draining = False
+
+    @property
+    def devices(self) -> tuple[Device, ...]:
+        """Get all devices
+
+        Return:
+            Devices polled
+        """
+        return self._devices
+
+    @property
+    def shards(self) -> list[list[int]]:
+        """Get indices of the devices polled by each worker
+
+        Return:
+            Device indices of each shard
+        """
+        return [list(shard) for shard in self._shards]
+
+    def is_running(self) -> bool:
+        """Check if the workers have been started
+
+        Return:
+            ``True`` if and only if the poller is running
+        """
+        return bool(self._processes)
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    def __aiter__(self):
+        return self._iter_results()
+
+    def start(self) -> None:
+        """Start all workers
+
+        Has no effect, if the poller is already running.
+        """
+        if self._processes:
+            return
+        loop = asyncio.get_running_loop()
+        self._results = asyncio.Queue(self._queue_size)
+        self._draining = False
+        for shard in self._shards:
+            data_recv, data_send = self._context.Pipe(duplex=False)
+            control_recv, control_send = self._context.Pipe(duplex=False)
+            process = self._context.Process(
+                target=_run_shard,
+                args=([self._devices[i] for i in shard],
+                      shard,
+                      data_send,
+                      control_recv,
+                      self._decode,
+                      self._kwargs),
+                daemon=True)
+            process.start()
+            # Close the ends owned by the worker
+            data_send.close()
+            control_recv.close()
+            reader = threading.Thread(target=self._read,
+                                      args=(data_recv, loop),
+                                      daemon=True)
+            reader.start()
+            self._processes.append(process)
+            self._controls.append(control_send)
+            self._readers.append(reader)
+
+    async def stop(self, timeout: float = 5.) -> None:
+        """Stop all workers
+
+        Args:
+            timeout: Time in seconds to wait for each worker to exit before
+                it is terminated. Defaults to 5.
+        """
+        processes, self._processes = self._processes, []
+        # Workers may block on a full pipe, until readers discard results
+        self._draining = True
+        while self._results is not None and not self._results.empty():
+            self._results.get_nowait()
+        for control in self._controls:
+            try:
+                control.send(None)
+            except OSError:
+                pass
+            control.close()
+        self._controls.clear()
+        loop = asyncio.get_running_loop()
+        for process in processes:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                logger.warning("Terminating worker %d", process.pid)
+                process.terminate()
+                await loop.run_in_executor(None, process.join)
+        self._readers.clear()
+        if self._results is not None:
+            try:
+                self._results.put_nowait(None)  # wake up consumer
+            except asyncio.QueueFull:
+                pass
+
+    async def _put(self, buffers):
+        """Put records into the result queue
+
+        Arguments:
+            buffers (list): Records received from a worker
+        """
+        for buffer in buffers:
+            if self._draining:
+                return
+            await self._results.put(buffer)
+
+    async def _iter_results(self):
+        """Yield decoded results until the poller is stopped"""
+        self.start()
+        while self._processes:
+            buffer = await self._results.get()
+            if buffer is None:
+                return
+            yield decode_snapshot(buffer,
+                                  self._devices,
+                                  self._payloads,
+                                  self._decode)
+
+    def _read(self, connection, loop):
+        """Forward records received from a worker to the result queue
+
+        Runs in a separate thread until the worker closes its connection.
+        All records already received are forwarded to the event loop at once,
+        so that a busy worker does not cost a round trip to the event loop
+        per record.
+
+        Arguments:
+            connection (multiprocessing.connection.Connection): Connection
+                to read from
+            loop (asyncio.AbstractEventLoop): Event loop of the consumer
+        """
+        try:
+            while True:
+                buffers = [connection.recv_bytes()]
+                while len(buffers) < MAX_BATCH and connection.poll():
+                    buffers.append(connection.recv_bytes())
+                if self._draining:
+                    continue
+                asyncio.run_coroutine_threadsafe(self._put(buffers),
+                                                 loop).result()
+        except (EOFError, OSError, RuntimeError):
+            pass
+        finally:
+            connection.close()
@@ -0,0 +1,554 @@
+import asyncio
+from collections import Counter
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, replace
+from logging import getLogger
+from random import Random, random
+import struct
+
+import numpy as np
+
+from ..error_codes import (
+    ILLEGAL_DATA_ADDRESS,
+    ILLEGAL_DATA_VALUE,
+    ILLEGAL_FUNCTION_ERROR,
+    SERVER_DEVICE_BUSY,
+    ModbusError
+)
+from ..functions import (
+    READ_HOLDING_REGISTERS,
+    READ_INPUT_REGISTERS,
+    WRITE_MULTIPLE_REGISTERS,
+    WRITE_SINGLE_REGISTER
+)
+from ..payload import Payload
+from ..protocol import (
+    ApplicationProtocolHeader,
+    MAX_READ_REGISTERS,
+    MAX_WRITE_REGISTERS,
+    new_response,
+    parse_request_body,
+    parse_response_header
+)
+from ..register_image import TABLE_SIZE
+
+logger = getLogger("modbusclient")
+
+
+@dataclass(slots=True)
+class Faults:
+    """Faults injected by a :class:`Simulator`
+
+    Each probability applies to each request independently. All random
+    decisions are taken from a generator seeded with ``seed``, so that a
+    sequence of requests sent one after another experiences the same faults
+    on each run.
+
+    Attributes:
+        drop: Probability that a response is not sent
+        delay: Probability that a response is delayed by ``delay_time``
+        delay_time: Additional delay in seconds of delayed responses. Also the
+            maximum time a response is held back to reorder it. Defaults to
+            0.5.
+        reorder: Probability that a response is held back until the next
+            response on the same connection has been sent. Only takes effect
+            if the client pipelines requests. Responses held back do not
+            count towards ``max_pipeline``.
+        truncate: Probability that the last register of a read response is
+            missing, while the byte count of the response still includes it.
+            Clients report this as ``MESSAGE_SIZE_ERROR``.
+        reset: Probability that the connection is reset instead of answering
+        busy: Probability that a burst of ``SERVER_DEVICE_BUSY`` exceptions
+            starts
+        busy_length: Number of requests answered with ``SERVER_DEVICE_BUSY``
+            per burst. Defaults to 3.
+        wrong_transaction: Probability that the response carries another
+            transaction ID than the request
+        wrong_unit: Probability that the response carries another unit ID than
+            the request
+        seed: Seed of the random number generator. If ``None``, faults are
+            not reproducible. Defaults to ``None``.
+    """
+    drop: float = 0.
+    delay: float = 0.
+    delay_time: float = 0.5
+    reorder: float = 0.
+    truncate: float = 0.
+    reset: float = 0.
+    busy: float = 0.
+    busy_length: int = 3
+    wrong_transaction: float = 0.
+    wrong_unit: float = 0.
+    seed: int | None = None
+
+
+class Simulator:
+    """Modbus TCP server simulating a device
+
+    Serves the holding and input registers of a simulated device from NumPy
+    arrays holding the raw registers in big endian byte order. Intended for
+    tests and benchmarks without hardware::
+
+        async with Simulator.from_api(api, latency=0.01) as simulator:
+            port = await simulator.start(port=0)
+            client = Client("127.0.0.1", port)
+
+    The simulator answers all unit IDs. Reads and writes of registers, which
+    are not mapped, fail with ``ILLEGAL_DATA_ADDRESS``, requests exceeding the
+    maximum number of registers with ``ILLEGAL_DATA_VALUE``. Each request is
+    answered after ``latency`` plus a random delay of up to ``jitter``
+    seconds. Each connection processes at most ``max_pipeline`` requests at a
+    time, while further requests wait in order of arrival.
+
+    Handlers for further function codes may be added to :attr:`handlers`.
+
+    Passing :class:`Faults` injects reproducible network and device failures
+    to tune timeouts, retries and circuit breakers::
+
+        simulator = Simulator(faults=Faults(drop=0.01, busy=0.005, seed=1))
+
+    Args:
+        latency: Minimum time in seconds until a request is answered. Defaults
+            to 0.
+        jitter: Maximum random delay in seconds added to `latency`. Defaults
+            to 0.
+        max_read: Maximum number of registers per read. Defaults to 125.
+        max_write: Maximum number of registers per write. Defaults to 123.
+        max_pipeline: Maximum number of requests per connection processed
+            concurrently. Defaults to 1.
+        mapped: If ``True``, all registers are mapped initially. Otherwise
+            registers must be mapped via :meth:`map` before they can be
+            accessed. Defaults to ``True``.
+        random: Function returning a random number in the range [0, 1).
+            Defaults to :func:`random.random`.
+        faults: Faults to inject. If ``None``, no faults are injected.
+            Defaults to ``None``.
+
+    Attributes:
+        handlers: Dictionary containing the function code as key and a
+            function as value, which is called with the request header and
+            body and returns the payload and keyword arguments of the response.
+        requests: Number of requests received
+        errors: Number of requests answered with an exception
+        injected: Number of faults injected by name of the attribute of
+            :class:`Faults`
+    """
+    handlers: dict[int, Callable]
+    requests: int
+    errors: int
+    injected: Counter
+
+    def __init__(
+        self,
+        latency: float = 0.,
+        jitter: float = 0.,
+        max_read: int = MAX_READ_REGISTERS,
+        max_write: int = MAX_WRITE_REGISTERS,
+        max_pipeline: int = 1,
+        mapped: bool = True,
+        random: Callable[[], float] = random,
+        faults: Faults | None = None
+    ) -> None:
+        if max_pipeline < 1:
+            raise ValueError("Expected positive pipeline depth", max_pipeline)
+        self.latency = latency
+        self.jitter = jitter
+        self.max_read = max_read
+        self.max_write = max_write
+        self.max_pipeline = max_pipeline
+        self.requests = 0
+        self.errors = 0
+        self.injected = Counter()
+        self.handlers = {
+            READ_HOLDING_REGISTERS: self._read,
+            READ_INPUT_REGISTERS: self._read,
+            WRITE_SINGLE_REGISTER: self._write,
+            WRITE_MULTIPLE_REGISTERS: self._write
+        }
+        self._random = random
+        self._faults = faults
+        self._rng = Random(faults.seed if faults is not None else None)
+        self._busy = 0  # requests left in the current busy burst
+        self._tables = {
+            function: np.zeros(TABLE_SIZE, dtype=">u2")
+            for function in (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS)
+        }
+        self._mapped = {
+            function: np.full(TABLE_SIZE, mapped, dtype=bool)
+            for function in self._tables
+        }
+        self._server = None
+        self._writers = dict()  # writer -> task serving the client
+
+    @classmethod
+    def from_api(
+        cls,
+        api: Mapping[object, Payload],
+        values: Mapping[Payload, object] | None = None,
+        **kwargs
+    ) -> "Simulator":
+        """Create a simulator serving the registers of an API
+
+        Only registers of the payloads in `api` are mapped. All other
+        registers are holes. Payloads, which are not readable, are mapped to
+        the holding registers.
+
+        Args:
+            api: Dictionary containing the API definition with Payload objects
+                as values
+            values: Initial value of each payload. Registers of payloads not
+                contained are 0.
+            **kwargs: Keyword arguments passed verbatim to the constructor
+
+        Return:
+            New simulator
+        """
+        simulator = cls(mapped=False, **kwargs)
+        values = values if values is not None else dict()
+        for msg in api.values():
+            simulator.map(_table_of(msg), msg.address, msg.register_count)
+            if msg in values:
+                simulator.set(msg, values[msg])
+        return simulator
+
+    async def __aenter__(self) -> "Simulator":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop()
+
+    @property
+    def connections(self) -> int:
+        """Get number of clients
+
+        Return:
+            Number of clients currently connected
+        """
+        return len(self._writers)
+
+    def table(self, function: int) -> np.ndarray:
+        """Get registers of a table
+
+        Args:
+            function: Function code used to read the table
+
+        Return:
+            Array of 65536 big endian unsigned 16-bit registers. Changes to
+            the array are visible to clients.
+        """
+        return self._tables[function]
+
+    def map(self, function: int, start: int, count: int = 1) -> None:
+        """Make registers accessible
+
+        Args:
+            function: Function code used to read the table
+            start: Address of the first register
+            count: Number of registers. Defaults to 1.
+        """
+        self._mapped[function][start:start + count] = True
+
+    def unmap(self, function: int, start: int, count: int = 1) -> None:
+        """Turn registers into a hole
+
+        Args:
+            function: Function code used to read the table
+            start: Address of the first register
+            count: Number of registers. Defaults to 1.
+        """
+        self._mapped[function][start:start + count] = False
+
+    def set(self, msg: Payload, value: object) -> None:
+        """Set the value of a payload
+
+        Args:
+            msg: Payload
+            value: Value encoded by `msg`
+        """
+        start = msg.address
+        self._tables[_table_of(msg)][start:start + msg.register_count] = \
+            np.frombuffer(msg.encode(value), dtype=">u2")
+
+    def get(self, msg: Payload) -> object:
+        """Get the value of a payload
+
+        Args:
+            msg: Payload
+
+        Return:
+            Value decoded by `msg`
+        """
+        start = msg.address
+        table = self._tables[_table_of(msg)]
+        return msg.decode(table[start:start + msg.register_count].tobytes())
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Start accepting clients
+
+        Args:
+            host: Address to listen on. Defaults to ``127.0.0.1``.
+            port: Port to listen on. If 0, a free port is chosen. Defaults to
+                0.
+
+        Return:
+            Port the simulator listens on
+        """
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        """Serve clients until cancelled"""
+        await self._server.serve_forever()
+
+    async def stop(self) -> None:
+        """Stop accepting clients and close all connections"""
+        if self._server is None:
+            return
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await asyncio.gather(*self._writers.values(), return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+
+    @property
+    def faults(self) -> Faults | None:
+        """Get faults injected
+
+        Return:
+            Faults passed to the constructor
+        """
+        return self._faults
+
+    async def _serve(self, reader, writer):
+        """Answer requests of a client
+
+        Arguments:
+            reader (asyncio.StreamReader): Stream of the client
+            writer (asyncio.StreamWriter): Stream of the client
+        """
+        nbytes = ApplicationProtocolHeader.get_parser().size
+        pipeline = asyncio.Semaphore(self.max_pipeline)
+        held = dict()  # token -> response held back to reorder it
+        tasks = set()
+        self._writers[writer] = asyncio.current_task()
+        try:
+            while True:
+                header = parse_response_header(await reader.readexactly(nbytes))
+                body = await reader.readexactly(header.msglen - 2)
+                self.requests += 1
+                await pipeline.acquire()
+                task = asyncio.create_task(
+                    self._answer(writer, header, body, pipeline, held))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except RuntimeError as exc:
+            logger.warning("Closing connection after invalid request: %s", exc)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._writers.pop(writer, None)
+            writer.close()
+
+    async def _answer(self, writer, header, body, pipeline, held):
+        """Answer a single request after the simulated latency
+
+        Arguments:
+            writer (asyncio.StreamWriter): Stream of the client
+            header (~modbusclient.ApplicationProtocolHeader): Request header
+            body (bytes): Request body following the header
+            pipeline (asyncio.Semaphore): Released once the request is answered
+                or its response is held back
+            held (dict): Responses of the connection held back
+        """
+        try:
+            delay = self.latency + self.jitter * self._random()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self._faults is None:
+                response, hold = self._respond(header, body), False
+            else:
+                response, hold = await self._inject(writer, header, body)
+            if hold:
+                # Later requests must be answered while the response is held
+                pipeline.release()
+                pipeline = None
+                response = await self._hold(response, held)
+            if response is None or writer.is_closing():
+                return
+            writer.write(response)
+            for response in held.values():
+                writer.write(response)
+            held.clear()
+        finally:
+            if pipeline is not None:
+                pipeline.release()
+
+    def _respond(self, header, body):
+        """Create response to a request
+
+        Arguments:
+            header (~modbusclient.ApplicationProtocolHeader): Request header
+            body (bytes): Request body following the header
+
+        Return:
+            bytes: Response
+        """
+        try:
+            handler = self.handlers.get(header.function)
+            if handler is None:
+                raise ModbusError(ILLEGAL_FUNCTION_ERROR, header.function)
+            payload, kwargs = handler(header, body)
+            return new_response(header, payload, **kwargs)
+        except ModbusError as exc:
+            self.errors += 1
+            return new_response(header, err_code=exc.args[0])
+        except struct.error:
+            self.errors += 1
+            return new_response(header, err_code=ILLEGAL_DATA_VALUE)
+
+    async def _inject(self, writer, header, body):
+        """Create response to a request subject to faults
+
+        Arguments:
+            writer (asyncio.StreamWriter): Stream of the client
+            header (~modbusclient.ApplicationProtocolHeader): Request header
+            body (bytes): Request body following the header
+
+        Return:
+            tuple(bytes, bool): Response or ``None``, if no response shall be
+            sent, and whether to hold the response back to reorder it
+        """
+        faults = self._faults
+        if self._fault("reset"):
+            writer.transport.abort()
+            return None, False
+        if self._busy or self._fault("busy"):
+            self._busy = (self._busy or faults.busy_length) - 1
+            self.errors += 1
+            return new_response(header, err_code=SERVER_DEVICE_BUSY), False
+
+        if self._fault("wrong_transaction"):
+            header = replace(header, transaction=(header.transaction + 1)
+                             & 0xFFFF)
+        if self._fault("wrong_unit"):
+            header = replace(header, unit=(header.unit + 1) & 0xFF)
+        response = self._respond(header, body)
+        if (header.function in (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS)
+                and len(response) >= 11 and self._fault("truncate")):
+            response = bytearray(response[:-2])
+            struct.pack_into("!H", response, 4, len(response) - 6)
+            response = bytes(response)
+
+        if self._fault("drop"):
+            return None, False
+        if self._fault("delay"):
+            await asyncio.sleep(faults.delay_time)
+        return response, self._fault("reorder")
+
+    async def _hold(self, response, held):
+        """Hold a response back until a later response is sent
+
+        Arguments:
+            response (bytes): Response to hold back
+            held (dict): Responses of the connection held back
+
+        Return:
+            bytes: Response or ``None``, if it has been sent along with a later
+            response within ``delay_time``
+        """
+        token = object()
+        held[token] = response
+        try:
+            await asyncio.sleep(self._faults.delay_time)
+        finally:
+            response = held.pop(token, None)
+        return response
+
+    def _fault(self, name):
+        """Decide whether to inject a fault
+
+        Arguments:
+            name (str): Name of the probability in :class:`Faults`
+
+        Return:
+            bool: ``True`` if the fault shall be injected
+        """
+        probability = getattr(self._faults, name)
+        if probability and self._rng.random() < probability:
+            self.injected[name] += 1
+            return True
+        return False
+
+    def _check(self, function, start, count, max_count):
+        """Check the registers addressed by a request
+
+        Arguments:
+            function (int): Function code used to read the table
+            start (int): Address of the first register
+            count (int): Number of registers
+            max_count (int): Maximum number of registers per request
+
+        Raise:
+            ModbusError: If the registers are out of range or not mapped
+        """
+        if not 0 < count <= max_count:
+            raise ModbusError(ILLEGAL_DATA_VALUE, count)
+        end = start + count
+        if end > TABLE_SIZE or not self._mapped[function][start:end].all():
+            raise ModbusError(ILLEGAL_DATA_ADDRESS, start)
+
+    def _read(self, header, body):
+        """Handle read requests
+
+        Arguments:
+            header (~modbusclient.ApplicationProtocolHeader): Request header
+            body (bytes): Request body following the header
+
+        Return:
+            tuple(bytes, dict): Payload and keyword arguments of the response
+        """
+        request, data = parse_request_body(header, body)
+        start, count = request.start, request.count
+        self._check(header.function, start, count, self.max_read)
+        return self._tables[header.function][start:start + count].tobytes(), {}
+
+    def _write(self, header, body):
+        """Handle write requests to holding registers
+
+        Arguments:
+            header (~modbusclient.ApplicationProtocolHeader): Request header
+            body (bytes): Request body following the header
+
+        Return:
+            tuple(bytes, dict): Payload and keyword arguments of the response
+        """
+        request, data = parse_request_body(header, body)
+        if header.function == WRITE_SINGLE_REGISTER:
+            count = 1
+            payload, kwargs = data, dict(start=request.start)
+        else:
+            count = request.count
+            payload, kwargs = b"", dict(start=request.start, count=count)
+        if len(data) != 2 * count:
+            raise ModbusError(ILLEGAL_DATA_VALUE, len(data))
+        self._check(READ_HOLDING_REGISTERS, request.start, count,
+                    self.max_write)
+        start = request.start
+        self._tables[READ_HOLDING_REGISTERS][start:start + count] = \
+            np.frombuffer(data, dtype=">u2")
+        return payload, kwargs
+
+
+def _table_of(msg):
+    """Get table holding the registers of a payload
+
+    Arguments:
+        msg (~modbusclient.payload.Payload): Payload
+
+    Return:
+        int: Function code used to read the table
+    """
+    return msg.reader if msg.is_readable else READ_HOLDING_REGISTERS
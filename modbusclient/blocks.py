@@ -0,0 +1,216 @@
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
+from itertools import groupby
+
+from .payload import Payload
+from .protocol import MAX_READ_REGISTERS, MAX_WRITE_REGISTERS
+
+
+@dataclass(frozen=True, slots=True)
+class Block:
+    """Contiguous range of registers read by a single request
+
+    Attrs:
+        function: Function code used to read the block
+        start: Address of the first register
+        count: Number of registers
+        payloads: Payloads contained in this block ordered by address
+    """
+    function: int
+    start: int
+    count: int
+    payloads: tuple[Payload, ...]
+
+    @property
+    def end(self) -> int:
+        """Get address of the first register following this block
+
+        Return:
+            ``start + count``
+        """
+        return self.start + self.count
+
+    @property
+    def priority(self) -> int:
+        """Get priority of this block
+
+        The priority of each payload is taken from its ``priority`` attribute,
+        if present, and defaults to 0 otherwise.
+
+        Return:
+            Maximum priority of all payloads in this block
+        """
+        return max(getattr(msg, "priority", 0) for msg in self.payloads)
+
+    def decode(self, buffer: bytes) -> dict[Payload, object]:
+        """Decode all payloads of this block
+
+        Args:
+            buffer: Raw data of the entire block as returned by the server
+
+        Return:
+            Dictionary containing Payload as key and decoded value as value
+        """
+        retval = dict()
+        for msg in self.payloads:
+            offset = 2 * (msg.address - self.start)
+            retval[msg] = msg.decode(buffer[offset:offset + len(msg)])
+        return retval
+
+    def registers(self, buffer: bytes) -> dict[int, bytes]:
+        """Split the raw data of this block into registers
+
+        Args:
+            buffer: Raw data of the entire block as returned by the server
+
+        Return:
+            Dictionary containing the register address as key and its two
+            bytes as value
+        """
+        return {self.start + i // 2: bytes(buffer[i:i + 2])
+                for i in range(0, len(buffer), 2)}
+
+    def split(self, buffer: bytes) -> dict[Payload, bytes]:
+        """Split the raw data of this block without decoding it
+
+        Args:
+            buffer: Raw data of the entire block as returned by the server
+
+        Return:
+            Dictionary containing Payload as key and its raw data as value
+        """
+        retval = dict()
+        for msg in self.payloads:
+            offset = 2 * (msg.address - self.start)
+            retval[msg] = bytes(buffer[offset:offset + len(msg)])
+        return retval
+
+
+def plan_blocks(
+    payloads: Iterable[Payload],
+    max_count: int = MAX_READ_REGISTERS,
+    max_gap: int = 0
+) -> list[Block]:
+    """Coalesce payloads into as few read requests as possible
+
+    Payloads sharing the same read function and priority are sorted by
+    address and merged into a single :class:`Block`, if the registers between
+    them do not exceed ``max_gap`` and the resulting block does not exceed
+    ``max_count`` registers. Overlapping payloads are merged into the same
+    block. Payloads of different priority are never merged, so that payloads
+    of low priority can be skipped to meet a time budget (see
+    :attr:`Block.priority`).
+
+    Args:
+        payloads: Readable payloads
+        max_count: Maximum number of registers per block. Defaults to
+            ``MAX_READ_REGISTERS``.
+        max_gap: Maximum number of unused registers between two consecutive
+            payloads of the same block. Note that some devices reply with an
+            error, if unmapped registers are read. Defaults to 0.
+
+    Return:
+        List of blocks ordered by read function, priority and address
+    """
+    blocks = []
+    for (function, priority), group in groupby(sorted(payloads, key=_order),
+                                               key=_kind):
+        start, end, members = None, None, []
+        for msg in group:
+            msg_end = msg.address + msg.register_count
+            if (members
+                and msg.address - end <= max_gap
+                and max(end, msg_end) - start <= max_count):
+                end = max(end, msg_end)
+                members.append(msg)
+                continue
+            if members:
+                blocks.append(Block(function, start, end - start, tuple(members)))
+            start, end, members = msg.address, msg_end, [msg]
+        if members:
+            blocks.append(Block(function, start, end - start, tuple(members)))
+    return blocks
+
+
+def _kind(msg):
+    """Get read function and priority of a payload
+
+    Arguments:
+        msg (Payload): Payload
+
+    Return:
+        tuple(int, int): Read function and priority. Payloads are merged
+        into the same block only if these are equal.
+    """
+    return msg.reader, getattr(msg, "priority", 0)
+
+
+def _order(msg):
+    """Get sort key of a payload
+
+    Arguments:
+        msg (Payload): Payload
+
+    Return:
+        tuple(int, int, int): Read function, priority and address
+    """
+    return msg.reader, getattr(msg, "priority", 0), msg.address
+
+
+def to_registers(buffers: Mapping[Payload, bytes]) -> dict[int, bytes]:
+    """Split the raw data of payloads into registers
+
+    Args:
+        buffers: Dictionary containing Payload as key and its raw data as value
+
+    Return:
+        Dictionary containing the register address as key and its two bytes
+        as value. If payloads overlap, the payload listed last prevails.
+    """
+    registers = dict()
+    for msg, buffer in buffers.items():
+        for i in range(0, len(buffer), 2):
+            registers[msg.address + i // 2] = bytes(buffer[i:i + 2])
+    return registers
+
+
+def plan_writes(
+    registers: Mapping[int, bytes],
+    current: Mapping[int, bytes] | None = None,
+    max_count: int = MAX_WRITE_REGISTERS
+) -> list[tuple[int, bytes]]:
+    """Coalesce registers to write into as few requests as possible
+
+    Registers already holding the desired data are skipped. Consecutive
+    registers are merged into a single write request of up to ``max_count``
+    registers.
+
+    Args:
+        registers: Dictionary containing the register address as key and the
+            raw data to write as value as returned by :func:`to_registers`
+        current: Raw data currently held by the device for each register. If
+            ``None`` or if a register is missing, the register is written.
+        max_count: Maximum number of registers per request. Defaults to
+            ``MAX_WRITE_REGISTERS``.
+
+    Return:
+        Address of the first register and raw data of each request ordered by
+        address
+    """
+    if current is None:
+        current = dict()
+    writes = []
+    start, chunks = None, []
+    for address in sorted(registers):
+        data = registers[address]
+        if current.get(address) == data:
+            continue
+        if chunks and address == start + len(chunks) and len(chunks) < max_count:
+            chunks.append(data)
+            continue
+        if chunks:
+            writes.append((start, b"".join(chunks)))
+        start, chunks = address, [data]
+    if chunks:
+        writes.append((start, b"".join(chunks)))
+    return writes
@@ -0,0 +1,200 @@
+from collections.abc import Callable
+from random import random
+from time import monotonic
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of contacting an endpoint considered unreachable
+
+    Args:
+        retry_in: Time in seconds until the next attempt is permitted
+    """
+    def __init__(self, retry_in: float) -> None:
+        super().__init__("Circuit breaker is open", retry_in)
+
+    @property
+    def retry_in(self) -> float:
+        """Get time until the next attempt is permitted
+
+        Return:
+            Time in seconds
+        """
+        return self.args[1]
+
+
+def backoff(
+    attempt: int,
+    base: float,
+    max_delay: float,
+    jitter: float = 0.,
+    random: Callable[[], float] = random
+) -> float:
+    """Compute an exponential backoff delay with jitter
+
+    Args:
+        attempt: Number of the attempt starting at 1
+        base: Delay after the first attempt in seconds
+        max_delay: Upper limit of the delay in seconds
+        jitter: Fraction of the delay which is randomized. A value of 0.5
+            yields delays between 50% and 100% of the exponential delay.
+            Defaults to 0.
+        random: Function returning a random number in the range [0, 1).
+            Defaults to :func:`random.random`.
+
+    Return:
+        Delay in seconds
+    """
+    delay = min(max_delay, base * 2. ** (attempt - 1))
+    return delay * (1. - jitter * random())
+
+
+class CircuitBreaker:
+    """Fail fast on endpoints, which are not reachable
+
+    The breaker is *closed* as long as requests succeed. After
+    ``failure_threshold`` consecutive failures, it trips *open* and
+    :meth:`check` raises a :class:`CircuitOpenError` without contacting the
+    endpoint. Once the backoff delay has expired, the breaker is *half open*
+    and permits a single probe. If the probe succeeds, the breaker closes.
+    Otherwise it opens again with twice the delay up to ``max_delay``. A
+    random jitter prevents probes to many endpoints from being synchronized.
+
+    Args:
+        failure_threshold: Number of consecutive failures required to trip
+            the breaker. Defaults to 3.
+        base_delay: Time in seconds the breaker stays open after it tripped
+            for the first time. Defaults to 1.
+        max_delay: Maximum time in seconds the breaker stays open. Defaults
+            to 300.
+        jitter: Fraction of the delay, which is randomized. Defaults to 0.5.
+        clock: Function returning the current monotonic time in seconds.
+            Defaults to :func:`time.monotonic`.
+        random: Function returning a random number in the range [0, 1).
+            Defaults to :func:`random.random`.
+
+    Attributes:
+        failures: Number of consecutive failures
+        trips: Number of times the breaker opened since it was closed last
+        rejected: Total number of attempts rejected while open
+    """
+    failures: int
+    trips: int
+    rejected: int
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        base_delay: float = 1.,
+        max_delay: float = 300.,
+        jitter: float = 0.5,
+        clock: Callable[[], float] = monotonic,
+        random: Callable[[], float] = random
+    ) -> None:
+        if failure_threshold < 1:
+            raise ValueError("Expected positive threshold", failure_threshold)
+        if not 0. <= jitter <= 1.:
+            raise ValueError("Expected jitter in range [0, 1]", jitter)
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self._clock = clock
+        self._random = random
+        self._retry_at = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        """Get state of the breaker
+
+        Return:
+            One of ``CLOSED``, ``OPEN`` or ``HALF_OPEN``
+        """
+        if self._retry_at is None:
+            return CLOSED
+        if self._clock() < self._retry_at:
+            return OPEN
+        return HALF_OPEN
+
+    @property
+    def retry_in(self) -> float:
+        """Get time until the next attempt is permitted
+
+        Return:
+            Time in seconds. 0, if an attempt is permitted now.
+        """
+        if self._retry_at is None:
+            return 0.
+        return max(0., self._retry_at - self._clock())
+
+    def allow(self) -> bool:
+        """Check if an attempt is permitted
+
+        In the half open state, the first caller is permitted to probe the
+        endpoint. Further attempts are rejected until the result of the probe
+        has been recorded. If the result of the probe is never recorded, the
+        next probe is permitted after the next backoff delay.
+
+        Return:
+            ``True`` if and only if the caller may contact the endpoint
+        """
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN:
+            self._probing = True
+            self._retry_at = self._clock() + self._delay(self.trips + 1)
+            return True
+        self.rejected += 1
+        return False
+
+    def check(self) -> None:
+        """Assert an attempt is permitted
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.retry_in)
+
+    def record_success(self) -> None:
+        """Record a successful attempt and close the breaker"""
+        self.failures = 0
+        self.trips = 0
+        self._retry_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        """Record a failed attempt
+
+        Opens the breaker, if the probe failed or the number of consecutive
+        failures reached the threshold.
+        """
+        self.failures += 1
+        if self._probing or (self._retry_at is None
+                             and self.failures >= self.failure_threshold):
+            self.trips += 1
+            self._probing = False
+            self._retry_at = self._clock() + self._delay(self.trips)
+
+    def _delay(self, trips):
+        """Get backoff delay
+
+        Arguments:
+            trips (int): Number of trips
+
+        Return:
+            float: Delay in seconds
+        """
+        return backoff(trips,
+                       self.base_delay,
+                       self.max_delay,
+                       self.jitter,
+                       self._random)
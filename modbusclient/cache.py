@@ -0,0 +1,299 @@
+from collections import OrderedDict
+from collections.abc import Callable, Collection, Iterable, Iterator
+from collections.abc import MutableMapping
+from random import random
+from time import monotonic
+
+from .breaker import backoff
+from .error_codes import ILLEGAL_FUNCTION_ERROR, ILLEGAL_DATA_ADDRESS
+from .payload import Payload
+
+#: Exception codes indicating that a payload is not supported by a device
+UNSUPPORTED_ERRORS = frozenset([ILLEGAL_FUNCTION_ERROR, ILLEGAL_DATA_ADDRESS])
+
+class Cache(MutableMapping):
+    """Cache for decoded values with per-payload expiry and LRU eviction
+
+    Each value expires ``max_age`` seconds after it has been stored. The age is
+    taken from the ``max_age`` attribute of the payload, if present, so that
+    slowly changing values such as nameplate strings can be cached much longer
+    than measurements::
+
+        serial = Payload(String(32), 30057, max_age=3600.)
+        power = Payload(AtomicType("I"), 30775, max_age=1.)
+
+    Expired values behave like missing values: Looking them up raises a
+    :class:`KeyError`. Hence a cache can be passed to
+    :meth:`~modbusclient.ApiWrapper.cached_read` in place of a plain
+    dictionary. If the cache exceeds ``max_size`` entries, the least recently
+    used entries are evicted.
+
+    Args:
+        max_age: Time in seconds after which values of payloads without
+            ``max_age`` attribute expire. If ``None``, these values do not
+            expire. Defaults to ``None``.
+        max_size: Maximum number of entries. If ``None``, the size is not
+            limited. Defaults to ``None``.
+        clock: Function returning the current monotonic time in seconds.
+            Defaults to :func:`time.monotonic`.
+
+    Attributes:
+        hits: Number of lookups which returned a valid value
+        misses: Number of lookups of missing or expired values
+        evictions: Number of entries evicted to respect ``max_size``
+    """
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(
+        self,
+        max_age: float | None = None,
+        max_size: int | None = None,
+        clock: Callable[[], float] = monotonic
+    ) -> None:
+        if max_size is not None and max_size < 1:
+            raise ValueError("Expected positive size", max_size)
+        self.max_age = max_age
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._clock = clock
+        self._entries = OrderedDict()  # payload -> (value, expiry time)
+
+    def __getitem__(self, msg: Payload) -> object:
+        """Look up a valid value
+
+        Args:
+            msg: Payload
+
+        Return:
+            Value stored for ``msg``
+
+        Raises:
+            KeyError: If no value is stored for ``msg`` or it has expired
+        """
+        try:
+            value, expires = self._entries[msg]
+        except KeyError:
+            self.misses += 1
+            raise
+        if expires is not None and expires <= self._clock():
+            self.misses += 1
+            raise KeyError(msg)
+        self._entries.move_to_end(msg)
+        self.hits += 1
+        return value
+
+    def __setitem__(self, msg: Payload, value: object) -> None:
+        """Store a value
+
+        Args:
+            msg: Payload
+            value: Decoded value of ``msg``
+        """
+        max_age = getattr(msg, "max_age", self.max_age)
+        expires = None if max_age is None else self._clock() + max_age
+        self._entries[msg] = (value, expires)
+        self._entries.move_to_end(msg)
+        if self.max_size is not None:
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __delitem__(self, msg: Payload) -> None:
+        del self._entries[msg]
+
+    def __contains__(self, msg: object) -> bool:
+        """Check if a valid value is stored without counting a lookup
+
+        Args:
+            msg: Payload
+
+        Return:
+            ``True`` if and only if a value is stored, which has not expired
+        """
+        try:
+            value, expires = self._entries[msg]
+        except KeyError:
+            return False
+        return expires is None or expires > self._clock()
+
+    def __iter__(self) -> Iterator[Payload]:
+        """Iterate over all payloads including expired ones"""
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        """Get number of entries including expired ones"""
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        """Get fraction of lookups which returned a valid value
+
+        Return:
+            Number of hits divided by the number of lookups. 0, if no lookup
+            has been performed yet.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+    def expires_in(self, msg: Payload) -> float | None:
+        """Get remaining lifetime of a value
+
+        Args:
+            msg: Payload
+
+        Return:
+            Time in seconds until the value of ``msg`` expires. Negative, if it
+            has expired already. ``None``, if the value does not expire.
+
+        Raises:
+            KeyError: If no value is stored for ``msg``
+        """
+        value, expires = self._entries[msg]
+        return None if expires is None else expires - self._clock()
+
+    def expire(self) -> int:
+        """Remove all expired entries
+
+        Return:
+            Number of entries removed
+        """
+        now = self._clock()
+        expired = [msg for msg, (value, expires) in self._entries.items()
+                   if expires is not None and expires <= now]
+        for msg in expired:
+            del self._entries[msg]
+        return len(expired)
+
+
+class NegativeCache:
+    """Remember payloads not supported by a device
+
+    A device replies with an exception such as ``ILLEGAL_DATA_ADDRESS``, if a
+    payload is not supported by its firmware. Reading such a payload on every
+    cycle wastes a round trip each time. Once a payload failed with one of the
+    given ``errors``, it is suppressed for a backoff delay. Afterwards the next
+    read probes the payload again. Each further failure doubles the delay up
+    to ``max_delay``, while a successful read clears the entry.
+
+    Args:
+        errors: Modbus exception codes, which suppress a payload. Defaults to
+            ``ILLEGAL_FUNCTION_ERROR`` and ``ILLEGAL_DATA_ADDRESS``.
+        base_delay: Time in seconds a payload is suppressed after its first
+            failure. Defaults to 60.
+        max_delay: Maximum time in seconds a payload is suppressed. Defaults
+            to 3600.
+        jitter: Fraction of the delay, which is randomized. Defaults to 0.1.
+        clock: Function returning the current monotonic time in seconds.
+            Defaults to :func:`time.monotonic`.
+        random: Function returning a random number in the range [0, 1).
+            Defaults to :func:`random.random`.
+
+    Attributes:
+        skipped: Number of reads skipped, because the payload was suppressed
+    """
+    skipped: int
+
+    def __init__(
+        self,
+        errors: Collection[int] = UNSUPPORTED_ERRORS,
+        base_delay: float = 60.,
+        max_delay: float = 3600.,
+        jitter: float = 0.1,
+        clock: Callable[[], float] = monotonic,
+        random: Callable[[], float] = random
+    ) -> None:
+        self.errors = frozenset(errors)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.skipped = 0
+        self._clock = clock
+        self._random = random
+        self._entries = dict()  # payload -> (failures, retry time, error)
+
+    def __len__(self) -> int:
+        """Get number of payloads which failed
+
+        Return:
+            Number of payloads suppressed or due for a probe
+        """
+        return len(self._entries)
+
+    def is_suppressed(self, msg: Payload) -> bool:
+        """Check if a payload shall not be read
+
+        Args:
+            msg: Payload
+
+        Return:
+            ``True`` if and only if `msg` failed and its backoff delay has not
+            expired yet
+        """
+        entry = self._entries.get(msg)
+        return entry is not None and self._clock() < entry[1]
+
+    def suppressed(self) -> dict[Payload, tuple[int, float]]:
+        """Get all payloads currently suppressed
+
+        Return:
+            Dictionary containing Payload as key and the last exception code
+            and the time in seconds until the next probe as value
+        """
+        now = self._clock()
+        return {msg: (error, retry_at - now)
+                for msg, (failures, retry_at, error) in self._entries.items()
+                if now < retry_at}
+
+    def filter(self, messages: Iterable[Payload]) -> list[Payload]:
+        """Remove suppressed payloads
+
+        Args:
+            messages: Payloads to read
+
+        Return:
+            Payloads of `messages`, which are not suppressed
+        """
+        retval = []
+        for msg in messages:
+            if self.is_suppressed(msg):
+                self.skipped += 1
+            else:
+                retval.append(msg)
+        return retval
+
+    def record_failure(self, msg: Payload, error: int) -> bool:
+        """Record a failed read
+
+        Args:
+            msg: Payload
+            error: Modbus exception code
+
+        Return:
+            ``True`` if `msg` is suppressed due to `error`
+        """
+        if error not in self.errors:
+            return False
+        failures = self._entries.get(msg, (0,))[0] + 1
+        delay = backoff(failures,
+                        self.base_delay,
+                        self.max_delay,
+                        self.jitter,
+                        self._random)
+        self._entries[msg] = (failures, self._clock() + delay, error)
+        return True
+
+    def record_success(self, msg: Payload) -> None:
+        """Record a successful read
+
+        Args:
+            msg: Payload
+        """
+        self._entries.pop(msg, None)
+
+    def clear(self) -> None:
+        """Forget all failures"""
+        self._entries.clear()
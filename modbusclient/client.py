@@ -1,9 +1,14 @@
 from collections.abc import Generator
+from contextlib import nullcontext
 import socket
+import threading
 
 from .protocol import ApplicationProtocolHeader, NO_UNIT, DEFAULT_PORT
 from .protocol import new_request, parse_response_header, parse_response_body
-from .error_codes import INVALID_TRANSACTION_ID, UNIT_MISMATCH
+from .error_codes import INVALID_TRANSACTION_ID, UNIT_MISMATCH, ModbusError
+from .hooks import Hooks
+from .metrics import ClientMetrics, PhaseProfile
+from .metrics import ENCODE, SEND, WAIT, RECEIVE, PARSE
 
 
 class Client:
@@ -20,20 +25,42 @@ class Client:
             used. Defaults to ``None``.
         connect: If ``True``, the client immediately connects to the given host.
             A call to :meth:`connect` or :meth:`__enter__` is required otherwise.
+        thread_safe: If ``True``, a lock serializes access to the socket, so
+            that the client can be shared by several threads. Each call holds
+            the lock from sending the request until the response has been
+            received. Defaults to ``False``.
+        metrics: Metrics updated by each call. If ``None``, no metrics are
+            collected. Defaults to ``None``.
+        profile: Profile recording the time spent in each phase of a call.
+            If ``None``, no phases are timed. Defaults to ``None``.
+        hooks: Hooks called on requests, responses, errors and reconnects.
+            If ``None``, no hooks are called. Defaults to ``None``.
 
     Attributes:
         host (string): IP Address of the host
         port (int): Port to use. Defaults to 502
         timeout (int or None): Timeout in seconds
+        metrics (ClientMetrics or None): Metrics updated by each call
+        profile (PhaseProfile or None): Profile of the phases of each call
+        hooks (Hooks or None): Hooks called by the client
     """
     def __init__(
             self,
             host: str = "",
             port: int = DEFAULT_PORT,
             timeout: float | None = None,
-            connect: bool = True
+            connect: bool = True,
+            thread_safe: bool = False,
+            metrics: ClientMetrics | None = None,
+            profile: PhaseProfile | None = None,
+            hooks: Hooks | None = None
         ) -> None:
         self._socket = None
+        self._lock = threading.RLock() if thread_safe else nullcontext()
+        self.metrics: ClientMetrics | None = metrics
+        self.profile: PhaseProfile | None = profile
+        self.hooks: Hooks | None = hooks
+        self._attempts = 0
 
         self.host: str = host
         self.port: int = port
@@ -50,6 +77,24 @@ class Client:
     def __exit__(self, type, value, traceback) -> None:
         self.disconnect()
 
+    @property
+    def thread_safe(self) -> bool:
+        """Check if access to this client is serialized by a lock
+
+        Return:
+            ``True`` if and only if the client may be shared by several threads
+        """
+        return not isinstance(self._lock, nullcontext)
+
+    def stats(self) -> dict | None:
+        """Get snapshot of the metrics collected
+
+        Return:
+            Snapshot as returned by :meth:`ClientMetrics.snapshot` or ``None``,
+            if no metrics are collected.
+        """
+        return self.metrics.snapshot() if self.metrics is not None else None
+
     def is_connected(self) -> bool:
         """Check if this client is connected to a server
 
@@ -71,14 +116,21 @@ class Client:
                 the current :attr:`Client.timeout`. Defaults to
                 :attr:`Client.timeout`
         """
-        self.disconnect()
-        self.host = kwargs.get("host", self.host)
-        self.port = kwargs.get("port", self.port)
-        self.timeout = kwargs.get("timeout", self.timeout)
-        self._socket = socket.create_connection(
-            (self.host, self.port),
-            self.timeout
-        )
+        with self._lock:
+            self.disconnect()
+            self.host = kwargs.get("host", self.host)
+            self.port = kwargs.get("port", self.port)
+            self.timeout = kwargs.get("timeout", self.timeout)
+            self._attempts += 1
+            if self._attempts > 1:
+                if self.metrics is not None:
+                    self.metrics.reconnect()
+                if self.hooks is not None:
+                    self.hooks.reconnect(self.host, self.port, self._attempts)
+            self._socket = socket.create_connection(
+                (self.host, self.port),
+                self.timeout
+            )
 
     def disconnect(self) -> None:
         """Disconnect from host
@@ -86,10 +138,14 @@ class Client:
         If this client is connected, the socket will be shutdown and then closed.
         If the client is not connected, calling this method has no effect.
         """
-        if self.is_connected():
-            self._socket.shutdown(socket.SHUT_RDWR)
-            self._socket.close()
-            self._socket = None
+        with self._lock:
+            if self.is_connected():
+                try:
+                    self._socket.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass  # connection already terminated by the server
+                self._socket.close()
+                self._socket = None
 
     def request(
             self,
@@ -113,13 +169,18 @@ class Client:
         Return:
             Header of the request
         """
-        self.assert_connected()
         header, msg = new_request(function=function,
                                   payload=payload,
                                   unit=unit,
                                   transaction=transaction,
                                   **kwargs)
-        self._socket.sendall(msg)
+        with self._lock:
+            self.assert_connected()
+            self._socket.sendall(msg)
+        if self.metrics is not None:
+            self.metrics.sent(len(msg))
+        if self.hooks is not None:
+            self.hooks.request(header, msg)
         return header
 
     def receive(self, size: int) -> bytes:
@@ -154,9 +215,15 @@ class Client:
             * The raw data bytes of the payload without any headers
             * An error code or ``None``, if no error occurred.
         """
-        buffer = self.receive(ApplicationProtocolHeader.parser.size)
-        header = parse_response_header(buffer)
-        buffer = self.receive(header.length - 2)
+        nbytes = ApplicationProtocolHeader.get_parser().size
+        with self._lock:
+            head = self.receive(nbytes)
+            header = parse_response_header(head)
+            buffer = self.receive(header.msglen - 2)
+        if self.metrics is not None:
+            self.metrics.received(nbytes + len(buffer))
+        if self.hooks is not None:
+            self.hooks.response(header, head + buffer)
         payload, err_code = parse_response_body(header, buffer)
 
         return header, payload, err_code
@@ -189,8 +256,24 @@ class Client:
         Return:
             Data returned by :meth:`~modbus.Client.get_response`
         """
-        req = self.request(function, **kwargs)
-        resp, data, error = self.get_response()
+        metrics = self.metrics
+        if metrics is not None:
+            started = metrics.begin()
+        try:
+            with self._lock:
+                if self.profile is None:
+                    req = self.request(function, **kwargs)
+                    resp, data, error = self.get_response()
+                else:
+                    req, resp, data, error = self._profiled_call(function,
+                                                                 **kwargs)
+        except BaseException as exc:
+            if metrics is not None:
+                metrics.fail(function, kwargs.get("unit", NO_UNIT), started,
+                             exc)
+            if self.hooks is not None:
+                self.hooks.error(function, kwargs.get("unit", NO_UNIT), exc)
+            raise
 
         if resp.transaction != req.transaction:
             error = INVALID_TRANSACTION_ID
@@ -199,8 +282,73 @@ class Client:
             if resp.unit != NO_UNIT:
                 error = UNIT_MISMATCH
 
+        if metrics is not None:
+            metrics.end(function, req.unit, started, error)
+        if error and self.hooks is not None:
+            self.hooks.error(function, req.unit, ModbusError(error))
         return resp, data, error
 
+    def _profiled_call(self, function, payload=b"", unit=NO_UNIT,
+                       transaction=0, **kwargs):
+        """Send request and receive response while timing each phase
+
+        Equivalent to :meth:`request` followed by :meth:`get_response`, but
+        reads the first byte of the response separately to distinguish
+        waiting for the server from receiving the response.
+
+        Arguments:
+            function (int): Function code
+            payload (bytes): Data sent along with the request
+            unit (int): Unit ID of device
+            transaction (int): Transaction ID
+            **kwargs: Keyword arguments passed verbatim to
+                :func:`~modbusclient.protocol.new_request`
+
+        Return:
+            tuple: Header of the request followed by the results of
+            :meth:`get_response`
+        """
+        profile = self.profile
+        clock = profile.clock
+        key = profile.key(unit, function, kwargs.get("start"),
+                          kwargs.get("count", 1))
+        started = clock()
+        req, msg = new_request(function=function,
+                               payload=payload,
+                               unit=unit,
+                               transaction=transaction,
+                               **kwargs)
+        encoded = clock()
+        self.assert_connected()
+        self._socket.sendall(msg)
+        sent = clock()
+        if self.metrics is not None:
+            self.metrics.sent(len(msg))
+        if self.hooks is not None:
+            self.hooks.request(req, msg)
+
+        nbytes = ApplicationProtocolHeader.get_parser().size
+        first = self.receive(1)
+        arrived = clock()
+        head = first + self.receive(nbytes - 1)
+        header = parse_response_header(head)
+        buffer = self.receive(header.msglen - 2)
+        received = clock()
+        if self.metrics is not None:
+            self.metrics.received(nbytes + len(buffer))
+        if self.hooks is not None:
+            self.hooks.response(header, head + buffer)
+        parsing = clock()
+        data, err_code = parse_response_body(header, buffer)
+        parsed = clock()
+
+        profile.record(key, ENCODE, encoded - started)
+        profile.record(key, SEND, sent - encoded)
+        profile.record(key, WAIT, arrived - sent)
+        profile.record(key, RECEIVE, received - arrived)
+        profile.record(key, PARSE, parsed - parsing)
+        return req, header, data, err_code
+
     def assert_connected(self) -> None:
         """Assert client is connected
 
@@ -55,6 +55,28 @@ class DataType:
         """
         return self._parser.size
 
+    def __getstate__(self) -> dict[str, Any]:
+        """Get state for pickling
+
+        :class:`~struct.Struct` objects cannot be pickled and are replaced by
+        their format string.
+
+        Return:
+            Attributes of this instance
+        """
+        state = self.__dict__.copy()
+        state["_parser"] = self._parser.format
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """Restore state after unpickling
+
+        Args:
+            state: Attributes as returned by :meth:`__getstate__`
+        """
+        self.__dict__.update(state)
+        self._parser = Struct(state["_parser"])
+
     def encode(self, *values: object) -> bytes:
         """Encode one or more values into a bytes object
 
@@ -0,0 +1,208 @@
+from collections import deque
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_all
+import threading
+
+from .api_wrapper import ApiWrapper
+
+
+class DevicePool:
+    """Poll several devices in parallel from a bounded pool of threads
+
+    Tasks are executed by a :class:`~concurrent.futures.ThreadPoolExecutor`
+    and return a :class:`~concurrent.futures.Future` each. Tasks for the same
+    device are executed one after another in the order of submission, while
+    tasks for different devices run in parallel. Each task occupies a worker
+    only while it is executed, so that a slow device does not block workers
+    with tasks waiting for its connection. After each task, the worker moves
+    on to the next device, so that all devices are served in turn::
+
+        with DevicePool(devices, max_workers=8) as pool:
+            futures = pool.poll()
+            for device, future in futures.items():
+                values = future.result()
+
+    Since decoding happens in the worker threads as well, decoding scales
+    with the number of workers on free-threaded builds of Python.
+
+    Devices are connected on demand. If a task raises an :class:`OSError`,
+    the device is disconnected and reconnected by the next task.
+
+    Args:
+        devices: Devices to poll. Devices accessed from other threads while
+            the pool is running should be created with ``thread_safe=True``.
+        max_workers: Maximum number of worker threads. If ``None``, the
+            default of :class:`~concurrent.futures.ThreadPoolExecutor` is
+            used. Defaults to ``None``.
+    """
+    def __init__(
+        self,
+        devices: Iterable[ApiWrapper] = (),
+        max_workers: int | None = None
+    ) -> None:
+        self._devices = list(devices)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="DevicePool")
+        self._lock = threading.Lock()
+        self._queues = dict()  # device -> deque of (future, fn, args, kwargs)
+
+    def __enter__(self) -> "DevicePool":
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:
+        self.shutdown()
+
+    @property
+    def devices(self) -> list[ApiWrapper]:
+        """Get all devices
+
+        Return:
+            Devices polled by :meth:`poll`
+        """
+        return list(self._devices)
+
+    def add(self, device: ApiWrapper) -> None:
+        """Add a device polled by :meth:`poll`
+
+        Args:
+            device: Device to add
+        """
+        self._devices.append(device)
+
+    def pending(self, device: ApiWrapper) -> int:
+        """Get number of tasks of a device not completed yet
+
+        Args:
+            device: Device
+
+        Return:
+            Number of tasks submitted for ``device`` which are queued or
+            running
+        """
+        with self._lock:
+            return len(self._queues.get(device, ()))
+
+    def submit(
+        self,
+        device: ApiWrapper,
+        fn: Callable[..., object],
+        *args,
+        **kwargs
+    ) -> Future:
+        """Execute a function on a device
+
+        Args:
+            device: Device passed as first argument to ``fn``
+            fn: Function to execute
+            *args: Further positional arguments passed to ``fn``
+            **kwargs: Keyword arguments passed to ``fn``
+
+        Return:
+            Future returning the result of ``fn(device, *args, **kwargs)``
+        """
+        future = Future()
+        with self._lock:
+            queue = self._queues.get(device)
+            idle = queue is None
+            if idle:
+                queue = self._queues[device] = deque()
+            queue.append((future, fn, args, kwargs))
+        if idle:
+            self._executor.submit(self._run, device)
+        return future
+
+    def read(
+        self,
+        device: ApiWrapper,
+        selection: Iterable | None = None
+    ) -> Future:
+        """Read values from a device
+
+        Args:
+            device: Device to read from
+            selection: Messages to read. Passed verbatim to
+                :meth:`~modbusclient.ApiWrapper.read`
+
+        Return:
+            Future returning a dictionary with Payload as key and value as
+            value
+        """
+        return self.submit(device, ApiWrapper.read, selection)
+
+    def poll(
+        self,
+        selection: Iterable | None = None
+    ) -> dict[ApiWrapper, Future]:
+        """Read values from all devices
+
+        Args:
+            selection: Messages to read from each device. Passed verbatim to
+                :meth:`~modbusclient.ApiWrapper.read`
+
+        Return:
+            Future returned by :meth:`read` for each device
+        """
+        if selection is not None:
+            selection = list(selection)
+        return {device: self.read(device, selection)
+                for device in self._devices}
+
+    def shutdown(self, wait: bool = True, disconnect: bool = True) -> None:
+        """Stop the worker threads
+
+        Args:
+            wait: Wait until all tasks submitted have been completed. Defaults
+                to ``True``.
+            disconnect: Disconnect all devices after the tasks have been
+                completed. Defaults to ``True``.
+        """
+        if wait:
+            while True:
+                with self._lock:
+                    futures = [task[0] for queue in self._queues.values()
+                               for task in queue]
+                if not futures:
+                    break
+                wait_all(futures)
+        self._executor.shutdown(wait=wait)
+        if disconnect:
+            for device in self._devices:
+                device.disconnect()
+
+    def _run(self, device):
+        """Execute the next task of a device
+
+        Resubmits itself, if further tasks of the device are queued.
+
+        Arguments:
+            device (ApiWrapper): Device
+        """
+        with self._lock:
+            future, fn, args, kwargs = self._queues[device][0]
+        if future.set_running_or_notify_cancel():
+            try:
+                if not device.is_connected():
+                    device.connect()
+                result = fn(device, *args, **kwargs)
+            except BaseException as ex:
+                if isinstance(ex, OSError):
+                    device.disconnect()
+                future.set_exception(ex)
+            else:
+                future.set_result(result)
+        with self._lock:
+            queue = self._queues[device]
+            queue.popleft()
+            if not queue:
+                del self._queues[device]
+                return
+        try:
+            self._executor.submit(self._run, device)
+        except RuntimeError:
+            # Executor shut down without waiting
+            with self._lock:
+                queue = self._queues.pop(device, ())
+            for future, *_ in queue:
+                future.cancel()
+
@@ -0,0 +1,278 @@
+from collections.abc import Iterable
+import math
+import os
+import tempfile
+
+from .cache import Cache
+from .metrics import ClientMetrics
+
+#: Content type of the text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# name, type, help and attribute of the ClientMetrics of each scalar metric
+CLIENT_METRICS = (
+    ("requests_total", "counter", "Requests sent", "requests"),
+    ("responses_total", "counter", "Responses received", "responses"),
+    ("requests_in_flight", "gauge", "Calls awaiting a response", "in_flight"),
+    ("sent_bytes_total", "counter", "Bytes sent", "bytes_sent"),
+    ("received_bytes_total", "counter", "Bytes received", "bytes_received"),
+    ("reconnects_total", "counter",
+     "Connection attempts following the first one", "reconnects"),
+    ("connect_retries_total", "counter",
+     "Connection attempts retried after a failure", "retries"),
+    ("timeouts_total", "counter", "Calls timed out", "timeouts"),
+    ("failures_total", "counter",
+     "Calls failed without response for reasons other than a timeout",
+     "failures"),
+)
+
+# name, type, help and attribute of the Cache of each metric
+CACHE_METRICS = (
+    ("cache_hits_total", "counter", "Cache lookups returning a valid value",
+     "hits"),
+    ("cache_misses_total", "counter",
+     "Cache lookups of missing or expired values", "misses"),
+    ("cache_evictions_total", "counter", "Values evicted from the cache",
+     "evictions"),
+)
+
+
+class PrometheusExporter:
+    """Render client metrics in the Prometheus text exposition format
+
+    Collects the :class:`~modbusclient.metrics.ClientMetrics` of any number of
+    clients, client pools or API wrappers as well as the statistics of
+    :class:`~modbusclient.Cache` instances. Each source is registered with a
+    set of labels identifying it, e.g. the device. Request rates, error rates
+    and cache hit ratios can be derived from the counters exported, latency
+    quantiles are exported as summary by function code and unit ID::
+
+        metrics = ClientMetrics()
+        wrapper = ApiWrapper(api, host="192.168.1.10", metrics=metrics)
+        exporter = PrometheusExporter()
+        exporter.add(wrapper, device="inverter")
+        exporter.add_cache(cache, device="inverter")
+        exporter.write("/var/lib/node_exporter/modbus.prom")
+
+    See :class:`~modbusclient.asyncio.exporter.MetricsServer` to serve the
+    metrics via HTTP.
+
+    Args:
+        namespace: Prefix of all metric names. Defaults to ``modbus``.
+        quantiles: Quantiles of the latency exported in the range [0, 1].
+            Defaults to 0.5, 0.9, 0.99 and 0.999.
+    """
+    def __init__(
+        self,
+        namespace: str = "modbus",
+        quantiles: Iterable[float] = (0.5, 0.9, 0.99, 0.999)
+    ) -> None:
+        self.namespace = namespace
+        self.quantiles = tuple(quantiles)
+        self._clients = []  # (source, labels)
+        self._caches = []  # (cache, labels)
+
+    def add(self, source, **labels: str) -> None:
+        """Add metrics of a client
+
+        Args:
+            source (ClientMetrics | object): Metrics to export or any object
+                providing them as ``metrics`` attribute, such as
+                :class:`~modbusclient.Client`,
+                :class:`~modbusclient.asyncio.Client`,
+                :class:`~modbusclient.asyncio.ClientPool` or the API wrappers.
+                The attribute is read on each call of :meth:`render`.
+            **labels: Labels identifying the source
+        """
+        self._clients.append((source, labels))
+
+    def add_cache(self, cache: Cache, **labels: str) -> None:
+        """Add statistics of a cache
+
+        Args:
+            cache: Cache to export
+            **labels: Labels identifying the cache
+        """
+        self._caches.append((cache, labels))
+
+    def remove(self, source) -> None:
+        """Remove all registrations of a source or cache
+
+        Args:
+            source: Source passed to :meth:`add` or cache passed to
+                :meth:`add_cache`
+        """
+        self._clients = [(s, l) for s, l in self._clients if s is not source]
+        self._caches = [(c, l) for c, l in self._caches if c is not source]
+
+    def render(self) -> str:
+        """Render all metrics
+
+        Return:
+            Metrics in the Prometheus text exposition format
+        """
+        return "".join(self._iter_lines())
+
+    def write(self, path: str) -> None:
+        """Write metrics to a file
+
+        The file is replaced atomically, so that it can be read at any time,
+        e.g. by the textfile collector of the node exporter.
+
+        Args:
+            path: Path of the file to write
+        """
+        text = self.render()
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".modbus",
+                                   suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _iter_lines(self):
+        """Iterate over the lines of all metric families
+
+        Yield:
+            str: Line terminated by a newline
+        """
+        clients = [(metrics, labels) for metrics, labels in
+                   ((self._metrics_of(s), l) for s, l in self._clients)
+                   if metrics is not None]
+
+        for name, kind, description, attr in CLIENT_METRICS:
+            yield from self._family(name, kind, description,
+                                    ((labels, getattr(metrics, attr))
+                                     for metrics, labels in clients))
+
+        yield from self._family(
+            "errors_total", "counter", "Exception responses by code",
+            (({**labels, "code": str(code)}, count)
+             for metrics, labels in clients
+             for code, count in sorted(metrics.errors.items())))
+
+        name = self._name("request_duration_seconds")
+        yield f"# HELP {name} Latency of calls answered by the server\n"
+        yield f"# TYPE {name} summary\n"
+        for metrics, labels in clients:
+            for (function, unit), histogram in sorted(metrics.latency.items()):
+                series = {**labels, "function": str(function),
+                          "unit": str(unit)}
+                for q in self.quantiles:
+                    yield _sample(name,
+                                  {**series, "quantile": _format(q)},
+                                  histogram.percentile(100 * q))
+                yield _sample(f"{name}_sum", series, histogram.sum)
+                yield _sample(f"{name}_count", series, histogram.count)
+
+        for name, kind, description, attr in CACHE_METRICS:
+            yield from self._family(name, kind, description,
+                                    ((labels, getattr(cache, attr))
+                                     for cache, labels in self._caches))
+        yield from self._family("cache_entries", "gauge",
+                                "Values held by the cache",
+                                ((labels, len(cache))
+                                 for cache, labels in self._caches))
+        yield from self._family("cache_hit_ratio", "gauge",
+                                "Ratio of cache lookups returning a value",
+                                ((labels, cache.hit_rate)
+                                 for cache, labels in self._caches))
+
+    def _family(self, name, kind, description, samples):
+        """Render a metric family
+
+        Arguments:
+            name (str): Name of the metric without namespace
+            kind (str): Type of the metric
+            description (str): Help text
+            samples (iterable): Labels and value of each sample
+
+        Yield:
+            str: Line terminated by a newline
+        """
+        name = self._name(name)
+        yield f"# HELP {name} {description}\n"
+        yield f"# TYPE {name} {kind}\n"
+        for labels, value in samples:
+            yield _sample(name, labels, value)
+
+    def _name(self, name):
+        """Prefix metric name with the namespace
+
+        Arguments:
+            name (str): Name of the metric
+
+        Return:
+            str: Full name of the metric
+        """
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    @staticmethod
+    def _metrics_of(source):
+        """Get metrics of a source
+
+        Arguments:
+            source: Source passed to :meth:`add`
+
+        Return:
+            ClientMetrics: Metrics of `source` or ``None``
+        """
+        if isinstance(source, ClientMetrics):
+            return source
+        return source.metrics
+
+
+def _sample(name, labels, value):
+    """Render a sample
+
+    Arguments:
+        name (str): Full name of the metric
+        labels (dict): Labels of the sample
+        value (float): Value of the sample
+
+    Return:
+        str: Line terminated by a newline
+    """
+    if labels:
+        pairs = ",".join(f'{key}="{_escape(value)}"'
+                         for key, value in labels.items())
+        return f"{name}{{{pairs}}} {_format(value)}\n"
+    return f"{name} {_format(value)}\n"
+
+
+def _escape(value):
+    """Escape label value
+
+    Arguments:
+        value (object): Label value
+
+    Return:
+        str: Value with backslashes, quotes and newlines escaped
+    """
+    return (str(value).replace("\\", "\\\\")
+                      .replace('"', '\\"')
+                      .replace("\n", "\\n"))
+
+
+def _format(value):
+    """Format sample value
+
+    Arguments:
+        value (float): Value
+
+    Return:
+        str: Value in the notation of the exposition format
+    """
+    if isinstance(value, int):
+        return str(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
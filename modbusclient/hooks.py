@@ -0,0 +1,215 @@
+from collections.abc import Callable
+from logging import getLogger
+import time
+
+from .protocol import ApplicationProtocolHeader
+
+logger = getLogger("modbusclient")
+
+REQUEST = "request"
+RESPONSE = "response"
+ERROR = "error"
+RECONNECT = "reconnect"
+
+#: Events hooks can be registered for
+EVENTS = (REQUEST, RESPONSE, ERROR, RECONNECT)
+
+
+class Hooks:
+    """Callbacks invoked by clients on requests, responses and errors
+
+    Passed to :class:`~modbusclient.Client`,
+    :class:`~modbusclient.asyncio.Client` or the API wrappers to trace
+    requests, capture frames or collect custom metrics. Clients without hooks
+    skip all calls. Hooks are registered for each event via the constructor
+    or the respective decorator and are called in the order registered with
+    the following arguments:
+
+    * ``on_request(header, frame, timestamp)``: After a request has been sent.
+      `header` is the :class:`~modbusclient.ApplicationProtocolHeader` of the
+      request and `frame` a read-only :class:`memoryview` of the complete
+      frame including the MBAP header.
+    * ``on_response(header, frame, timestamp)``: After a response has been
+      received, before it is parsed. Arguments as for ``on_request``.
+    * ``on_error(function, unit, exc, timestamp)``: If a call failed with an
+      exception or, in case of the synchronous client, the server returned
+      an exception response, which is passed as
+      :class:`~modbusclient.error_codes.ModbusError`.
+    * ``on_reconnect(host, port, attempt, timestamp)``: Before each attempt to
+      connect a client except for the first one. `attempt` is the number of
+      the attempt starting at 2.
+
+    Hooks are called synchronously from the I/O path and should return
+    quickly. Exceptions raised by hooks are logged and otherwise ignored.
+    Frames are only valid during the call and must be copied to be kept::
+
+        hooks = Hooks()
+
+        @hooks.on_request
+        def capture(header, frame, timestamp):
+            frames.append((timestamp, bytes(frame)))
+
+        client = Client(host="192.168.1.10", hooks=hooks)
+
+    Args:
+        on_request: Hook called for each request. Defaults to ``None``.
+        on_response: Hook called for each response. Defaults to ``None``.
+        on_error: Hook called for each failed call. Defaults to ``None``.
+        on_reconnect: Hook called before each connection attempt but the
+            first. Defaults to ``None``.
+        clock: Function returning the timestamps passed to the hooks. Defaults
+            to :func:`time.time`.
+    """
+    def __init__(
+        self,
+        on_request: Callable | None = None,
+        on_response: Callable | None = None,
+        on_error: Callable | None = None,
+        on_reconnect: Callable | None = None,
+        clock: Callable[[], float] = time.time
+    ) -> None:
+        self.clock = clock
+        self._hooks = {event: [] for event in EVENTS}
+        for event, hook in zip(EVENTS, (on_request, on_response, on_error,
+                                        on_reconnect)):
+            if hook is not None:
+                self.register(event, hook)
+
+    def register(self, event: str, hook: Callable) -> Callable:
+        """Register a hook
+
+        Args:
+            event: Name of the event. Any of :data:`EVENTS`.
+            hook: Function called on each event
+
+        Return:
+            `hook`
+
+        Raises:
+            ValueError: If `event` is unknown
+        """
+        try:
+            self._hooks[event].append(hook)
+        except KeyError:
+            raise ValueError("Unknown event", event) from None
+        return hook
+
+    def unregister(self, hook: Callable) -> None:
+        """Remove a hook from all events it is registered for
+
+        Args:
+            hook: Function to remove
+        """
+        for hooks in self._hooks.values():
+            while hook in hooks:
+                hooks.remove(hook)
+
+    def on_request(self, hook: Callable) -> Callable:
+        """Register a hook called for each request
+
+        Can be used as decorator.
+
+        Args:
+            hook: Function called with header, frame and timestamp
+
+        Return:
+            `hook`
+        """
+        return self.register(REQUEST, hook)
+
+    def on_response(self, hook: Callable) -> Callable:
+        """Register a hook called for each response
+
+        Can be used as decorator.
+
+        Args:
+            hook: Function called with header, frame and timestamp
+
+        Return:
+            `hook`
+        """
+        return self.register(RESPONSE, hook)
+
+    def on_error(self, hook: Callable) -> Callable:
+        """Register a hook called for each failed call
+
+        Can be used as decorator.
+
+        Args:
+            hook: Function called with function code, unit ID, exception and
+                timestamp
+
+        Return:
+            `hook`
+        """
+        return self.register(ERROR, hook)
+
+    def on_reconnect(self, hook: Callable) -> Callable:
+        """Register a hook called before each connection attempt but the first
+
+        Can be used as decorator.
+
+        Args:
+            hook: Function called with host, port, number of the attempt and
+                timestamp
+
+        Return:
+            `hook`
+        """
+        return self.register(RECONNECT, hook)
+
+    def request(self, header: ApplicationProtocolHeader, frame: bytes) -> None:
+        """Call hooks registered for requests
+
+        Args:
+            header: Header of the request
+            frame: Complete request frame
+        """
+        if self._hooks[REQUEST]:
+            self._call(REQUEST, header, memoryview(frame), self.clock())
+
+    def response(self, header: ApplicationProtocolHeader,
+                 frame: bytes) -> None:
+        """Call hooks registered for responses
+
+        Args:
+            header: Header of the response
+            frame: Complete response frame
+        """
+        if self._hooks[RESPONSE]:
+            self._call(RESPONSE, header, memoryview(frame), self.clock())
+
+    def error(self, function: int, unit: int, exc: BaseException) -> None:
+        """Call hooks registered for errors
+
+        Args:
+            function: Function code of the failed call
+            unit: Unit ID of the failed call
+            exc: Exception raised by the call
+        """
+        if self._hooks[ERROR]:
+            self._call(ERROR, function, unit, exc, self.clock())
+
+    def reconnect(self, host: str, port: int, attempt: int) -> None:
+        """Call hooks registered for reconnects
+
+        Args:
+            host: Host connected to
+            port: Port connected to
+            attempt: Number of the connection attempt
+        """
+        if self._hooks[RECONNECT]:
+            self._call(RECONNECT, host, port, attempt, self.clock())
+
+    def _call(self, event, *args):
+        """Call all hooks registered for an event
+
+        Arguments:
+            event (str): Name of the event
+            *args: Arguments passed verbatim to each hook
+        """
+        for hook in self._hooks[event]:
+            try:
+                hook(*args)
+            except Exception:
+                logger.exception("Error in %s hook %r", event, hook)
@@ -0,0 +1,515 @@
+import asyncio
+from collections import Counter
+from collections.abc import Callable, Iterator
+import math
+from time import perf_counter
+
+from .error_codes import NO_ERROR, ModbusError
+from .protocol import NO_UNIT
+
+TIMEOUT_ERRORS = (TimeoutError, asyncio.TimeoutError)
+
+ENCODE = "encode"
+SEND = "send"
+WAIT = "wait"
+RECEIVE = "receive"
+PARSE = "parse"
+DECODE = "decode"
+
+#: Phases of a call in chronological order
+PHASES = (ENCODE, SEND, WAIT, RECEIVE, PARSE, DECODE)
+
+
+class Histogram:
+    """Latency histogram with bounded relative error
+
+    Values are counted in buckets, whose width grows with the magnitude of
+    the value like in an HDR histogram. Values below ``2**precision`` times
+    the resolution are counted exactly, larger values with a relative error of
+    at most ``2**(1 - precision)``. Recording a value takes constant time and
+    the memory grows only logarithmically with the range of values.
+
+    Args:
+        resolution: Smallest value distinguished. Defaults to 1e-6.
+        precision: Number of significant bits of each bucket. Defaults to 6,
+            i.e. a relative error of about 3%.
+
+    Attributes:
+        count: Number of values recorded
+        sum: Sum of all values recorded
+        min: Smallest value recorded
+        max: Largest value recorded
+    """
+    count: int
+    sum: float
+    min: float
+    max: float
+
+    def __init__(self, resolution: float = 1e-6, precision: int = 6) -> None:
+        if precision < 1:
+            raise ValueError("Expected positive precision", precision)
+        self._resolution = resolution
+        self._bits = precision
+        self._counts = dict()  # bucket index -> count
+        self.count = 0
+        self.sum = 0.
+        self.min = math.inf
+        self.max = 0.
+
+    def __len__(self) -> int:
+        return self.count
+
+    def record(self, value: float) -> None:
+        """Record a value
+
+        Args:
+            value: Value to record. Negative values are counted as 0.
+        """
+        units = int(value / self._resolution) if value > 0 else 0
+        shift = units.bit_length() - self._bits
+        if shift > 0:
+            index = (shift << (self._bits - 1)) + (units >> shift)
+        else:
+            index = units
+        counts = self._counts
+        counts[index] = counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "Histogram") -> None:
+        """Add all values recorded by another histogram
+
+        Args:
+            other: Histogram with identical resolution and precision
+
+        Raises:
+            ValueError: If resolution or precision differ
+        """
+        if (other._resolution, other._bits) != (self._resolution, self._bits):
+            raise ValueError("Incompatible histograms")
+        for index, count in other._counts.items():
+            self._counts[index] = self._counts.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def buckets(self) -> Iterator[tuple[float, int]]:
+        """Iterate over all buckets containing values
+
+        Yield:
+            Upper bound of each bucket and the cumulative number of values
+            recorded below the bound in ascending order of the bounds
+        """
+        total = 0
+        for index in sorted(self._counts):
+            total += self._counts[index]
+            yield self._upper_bound(index), total
+
+    def percentile(self, q: float) -> float:
+        """Get percentile
+
+        Args:
+            q: Percentile in the range [0, 100]
+
+        Return:
+            Upper bound of the bucket containing the percentile, but not more
+            than the largest value recorded. ``nan`` if the histogram is
+            empty.
+        """
+        if not self.count:
+            return math.nan
+        rank = max(math.ceil(q / 100 * self.count), 1)
+        for bound, total in self.buckets():
+            if total >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> dict[str, float]:
+        """Summarize values recorded
+
+        Return:
+            Number of values, their mean, minimum, maximum and the 50th, 90th,
+            99th and 99.9th percentile
+        """
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else math.nan,
+            "min": self.min if self.count else math.nan,
+            "max": self.max if self.count else math.nan,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9)
+        }
+
+    def _upper_bound(self, index):
+        """Get upper bound of a bucket
+
+        Arguments:
+            index (int): Index of the bucket
+
+        Return:
+            float: Smallest value above the bucket
+        """
+        shift = max((index >> (self._bits - 1)) - 1, 0)
+        mantissa = index - (shift << (self._bits - 1))
+        return ((mantissa + 1) << shift) * self._resolution
+
+
+class ClientMetrics:
+    """Counters and latency histograms of a client
+
+    Passed to :class:`~modbusclient.Client` or
+    :class:`~modbusclient.asyncio.Client` to instrument each call. Clients
+    without metrics skip all instrumentation::
+
+        client = Client(host="192.168.1.10", metrics=ClientMetrics())
+        ...
+        print(client.stats()["latency"])
+
+    Latencies are measured per function code and unit ID from the start of a
+    call until its response has been received, including the time spent
+    waiting for a free transaction. Responses with a Modbus exception are
+    included, since the device answered.
+
+    Updates are not synchronized. Metrics shared by several threads may miss
+    counts.
+
+    Args:
+        clock: Function returning the current time in seconds. Defaults to
+            :func:`time.perf_counter`.
+        resolution: Resolution of the latency histograms in seconds. Defaults
+            to 1e-6.
+        precision: Number of significant bits of the latency histograms.
+            Defaults to 6.
+
+    Attributes:
+        requests: Number of requests sent
+        responses: Number of responses received
+        in_flight: Number of calls in progress
+        bytes_sent: Number of bytes sent
+        bytes_received: Number of bytes received
+        retries: Number of connection attempts retried after a failure
+        reconnects: Number of connection attempts following the first one,
+            whether the previous connection failed or was lost
+        timeouts: Number of calls timed out
+        failures: Number of calls aborted otherwise without response, e.g.
+            due to a lost connection
+        errors: Number of responses by error code. Includes error codes
+            generated by this library such as ``UNIT_MISMATCH``.
+        latency: :class:`Histogram` of the call latency in seconds by
+            function code and unit ID
+    """
+    requests: int
+    responses: int
+    in_flight: int
+    bytes_sent: int
+    bytes_received: int
+    retries: int
+    reconnects: int
+    timeouts: int
+    failures: int
+    errors: Counter
+    latency: dict[tuple[int, int], Histogram]
+
+    def __init__(
+        self,
+        clock: Callable[[], float] = perf_counter,
+        resolution: float = 1e-6,
+        precision: int = 6
+    ) -> None:
+        self.clock = clock
+        self._resolution = resolution
+        self._precision = precision
+        self.in_flight = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """Reset all counters and histograms
+
+        Calls in progress are still counted as in flight.
+        """
+        self.requests = 0
+        self.responses = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+        self.reconnects = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.errors = Counter()
+        self.latency = dict()
+
+    def sent(self, nbytes: int) -> None:
+        """Count a request sent
+
+        Args:
+            nbytes: Size of the request in bytes
+        """
+        self.requests += 1
+        self.bytes_sent += nbytes
+
+    def received(self, nbytes: int) -> None:
+        """Count a response received
+
+        Args:
+            nbytes: Size of the response in bytes
+        """
+        self.responses += 1
+        self.bytes_received += nbytes
+
+    def retry(self) -> None:
+        """Count a connection retry"""
+        self.retries += 1
+
+    def reconnect(self) -> None:
+        """Count a connection attempt following the first one"""
+        self.reconnects += 1
+
+    def begin(self) -> float:
+        """Count start of a call
+
+        Return:
+            Start time to be passed to :meth:`end`
+        """
+        self.in_flight += 1
+        return self.clock()
+
+    def end(
+        self,
+        function: int,
+        unit: int,
+        started: float,
+        err_code: int | None = NO_ERROR
+    ) -> None:
+        """Count a call answered by the device
+
+        Args:
+            function: Function code
+            unit: Unit ID
+            started: Start time as returned by :meth:`begin`
+            err_code: Error code of the response. Defaults to ``NO_ERROR``.
+        """
+        elapsed = self.clock() - started
+        self.in_flight -= 1
+        try:
+            histogram = self.latency[function, unit]
+        except KeyError:
+            histogram = Histogram(self._resolution, self._precision)
+            self.latency[function, unit] = histogram
+        histogram.record(elapsed)
+        if err_code:
+            self.errors[err_code] += 1
+
+    def fail(self, function: int, unit: int, started: float,
+             exc: BaseException) -> None:
+        """Count a call, which raised an exception
+
+        Args:
+            function: Function code
+            unit: Unit ID
+            started: Start time as returned by :meth:`begin`
+            exc: Exception raised. A
+                :class:`~modbusclient.error_codes.ModbusError` is counted like
+                a response with the respective error code.
+        """
+        if isinstance(exc, ModbusError):
+            self.end(function, unit, started, exc.args[0])
+            return
+        self.in_flight -= 1
+        if isinstance(exc, TIMEOUT_ERRORS):
+            self.timeouts += 1
+        else:
+            self.failures += 1
+
+    def snapshot(self) -> dict:
+        """Get snapshot of all metrics
+
+        Return:
+            Dictionary containing the counters by attribute name. Errors are
+            given as dictionary by error code, latencies as dictionary
+            containing :meth:`Histogram.summary` by function code and unit ID.
+        """
+        return {
+            "requests": self.requests,
+            "responses": self.responses,
+            "in_flight": self.in_flight,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "retries": self.retries,
+            "reconnects": self.reconnects,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "errors": dict(self.errors),
+            "latency": {key: histogram.summary()
+                        for key, histogram in self.latency.items()}
+        }
+
+
+class PhaseProfile:
+    """Time spent in each phase of calls
+
+    Passed to :class:`~modbusclient.Client` or
+    :class:`~modbusclient.asyncio.Client` to record the duration of the
+    following phases of each call:
+
+    * ``encode``: Creating the request via
+      :func:`~modbusclient.protocol.new_request`
+    * ``send``: Sending the request
+    * ``wait``: Waiting for the first byte of the response
+    * ``receive``: Receiving the rest of the response
+    * ``parse``: Parsing the response via
+      :func:`~modbusclient.protocol.parse_response_body`
+    * ``decode``: Decoding the payloads. Recorded by the API wrappers only.
+
+    Phases are aggregated by request, i.e. by unit ID, function code, start
+    address and number of registers. Reads of a single payload or a block
+    thus map to their own entry. Phases ``encode``, ``parse`` and ``decode``
+    are spent in the CPU of the client, the others mostly in the network and
+    the device::
+
+        profile = PhaseProfile()
+        wrapper = ApiWrapper(api, host="192.168.1.10", profile=profile)
+        wrapper.read()
+        print(profile.totals())
+        print(profile.of_payload(api["power"]))
+
+    Profiling costs additional system calls per response and should only be
+    enabled while investigating performance.
+
+    Args:
+        clock: Function returning the current time in seconds. Defaults to
+            :func:`time.perf_counter`.
+        resolution: Resolution of the histograms in seconds. Defaults to 1e-6.
+        precision: Number of significant bits of the histograms. Defaults to
+            6.
+
+    Attributes:
+        phases: :class:`Histogram` of the duration of each phase in seconds
+            by request key and phase name
+    """
+    phases: dict[tuple[int, int, int, int], dict[str, Histogram]]
+
+    def __init__(
+        self,
+        clock: Callable[[], float] = perf_counter,
+        resolution: float = 1e-6,
+        precision: int = 6
+    ) -> None:
+        self.clock = clock
+        self._resolution = resolution
+        self._precision = precision
+        self.phases = dict()
+
+    @staticmethod
+    def key(
+        unit: int,
+        function: int,
+        start: int,
+        count: int = 1
+    ) -> tuple[int, int, int, int]:
+        """Get key identifying a request
+
+        Args:
+            unit: Unit ID
+            function: Function code
+            start: Address of the first register
+            count: Number of registers. Defaults to 1.
+
+        Return:
+            Unit ID, function code, start address and number of registers
+        """
+        return unit, function, start, count
+
+    def record(self, key: tuple, phase: str, elapsed: float) -> None:
+        """Record the duration of a phase
+
+        Args:
+            key: Key of the request as returned by :meth:`key`
+            phase: Name of the phase
+            elapsed: Duration in seconds
+        """
+        try:
+            histogram = self.phases[key][phase]
+        except KeyError:
+            histogram = Histogram(self._resolution, self._precision)
+            self.phases.setdefault(key, dict())[phase] = histogram
+        histogram.record(elapsed)
+
+    def measure(self, key: tuple, phase: str, function: Callable,
+                *args) -> object:
+        """Call a function and record its duration as phase
+
+        Args:
+            key: Key of the request as returned by :meth:`key`
+            phase: Name of the phase
+            function: Function to call
+            *args: Arguments passed verbatim to `function`
+
+        Return:
+            Result of `function`
+        """
+        started = self.clock()
+        result = function(*args)
+        self.record(key, phase, self.clock() - started)
+        return result
+
+    def of_payload(self, msg, unit: int = NO_UNIT) -> dict[str, Histogram]:
+        """Get phases of reading a single payload
+
+        Args:
+            msg (Payload): Payload read via
+                :meth:`~modbusclient.ApiWrapper.get`
+            unit: Unit ID. Defaults to ``NO_UNIT``.
+
+        Return:
+            Histogram by phase name. Empty if the payload was not read.
+        """
+        key = self.key(unit, msg.reader, msg.address, msg.register_count)
+        return self.phases.get(key, dict())
+
+    def of_block(self, block, unit: int = NO_UNIT) -> dict[str, Histogram]:
+        """Get phases of reading a block
+
+        Args:
+            block (~modbusclient.blocks.Block): Block read via
+                :meth:`~modbusclient.ApiWrapper.get_block`
+            unit: Unit ID. Defaults to ``NO_UNIT``.
+
+        Return:
+            Histogram by phase name. Empty if the block was not read.
+        """
+        key = self.key(unit, block.function, block.start, block.count)
+        return self.phases.get(key, dict())
+
+    def totals(self) -> dict[str, float]:
+        """Get total time spent in each phase
+
+        Return:
+            Sum of the durations in seconds of all requests by phase name in
+            the order of :data:`PHASES`
+        """
+        totals = dict.fromkeys(PHASES, 0.)
+        for phases in self.phases.values():
+            for phase, histogram in phases.items():
+                totals[phase] = totals.get(phase, 0.) + histogram.sum
+        return totals
+
+    def summary(self) -> dict[tuple, dict[str, dict[str, float]]]:
+        """Summarize all phases
+
+        Return:
+            :meth:`Histogram.summary` by request key and phase name
+        """
+        return {key: {phase: histogram.summary()
+                      for phase, histogram in phases.items()}
+                for key, phases in self.phases.items()}
+
+    def reset(self) -> None:
+        """Remove all durations recorded"""
+        self.phases = dict()
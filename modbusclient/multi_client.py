@@ -0,0 +1,594 @@
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+import errno
+import selectors
+import socket
+from time import monotonic
+
+from .blocks import Block
+from .error_codes import ModbusError, UNIT_MISMATCH
+from .payload import Payload
+from .protocol import ApplicationProtocolHeader, NO_UNIT, DEFAULT_PORT
+from .protocol import new_request, parse_response_header, parse_response_body
+
+HEADER_SIZE = ApplicationProtocolHeader.get_parser().size
+
+_CONNECTING = (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY)
+
+
+class FrameParser:
+    """Incremental parser for Modbus TCP responses
+
+    Bytes received from a stream are fed to the parser in chunks of arbitrary
+    size. Complete frames are returned as soon as all of their bytes have been
+    received.
+    """
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def __len__(self) -> int:
+        """Get number of bytes buffered
+
+        Return:
+            Number of bytes received, which do not form a complete frame yet
+        """
+        return len(self._buffer)
+
+    def feed(
+        self,
+        data: bytes
+    ) -> list[tuple[ApplicationProtocolHeader, bytes, int]]:
+        """Add received bytes and extract complete frames
+
+        Args:
+            data: Bytes received
+
+        Return:
+            Header, payload and error code of each complete frame
+
+        Raises:
+            RuntimeError: If the protocol ID of a frame is invalid
+        """
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        offset = 0
+        while len(buffer) - offset >= HEADER_SIZE:
+            header = parse_response_header(
+                bytes(buffer[offset:offset + HEADER_SIZE]))
+            end = offset + HEADER_SIZE + header.msglen - 2
+            if len(buffer) < end:
+                break
+            payload, err_code = parse_response_body(
+                header, bytes(buffer[offset + HEADER_SIZE:end]))
+            frames.append((header, payload, err_code))
+            offset = end
+        if offset:
+            del buffer[:offset]
+        return frames
+
+
+@dataclass(eq=False, slots=True)
+class PendingRequest:
+    """Request submitted to a :class:`MultiClient`
+
+    Attributes:
+        address: Host and port of the server
+        header: Header of the request. The transaction ID is assigned, when the
+            request is sent.
+        message: Request in binary form
+        deadline: Monotonic time at which the request times out or ``None``
+        response: Header, payload and error code of the response. ``None``
+            until the response has been received.
+        error: Exception raised while processing the request or ``None``
+    """
+    address: tuple[str, int]
+    header: ApplicationProtocolHeader
+    message: bytes
+    deadline: float | None = None
+    response: tuple[ApplicationProtocolHeader, bytes, int] | None = None
+    error: BaseException | None = None
+
+    @property
+    def done(self) -> bool:
+        """Check if the request is complete
+
+        Return:
+            ``True`` if a response has been received or an error occurred
+        """
+        return self.response is not None or self.error is not None
+
+    def result(self) -> tuple[ApplicationProtocolHeader, bytes, int]:
+        """Get response of the request
+
+        Return:
+            Header, payload and error code as returned by
+            :meth:`modbusclient.Client.call`
+
+        Raises:
+            RuntimeError: If the request is not complete
+            Exception: Error raised while processing the request
+        """
+        if self.error is not None:
+            raise self.error
+        if self.response is None:
+            raise RuntimeError("Request is not complete")
+        return self.response
+
+
+@dataclass(eq=False)
+class _Connection:
+    """State of a single non-blocking connection"""
+    address: tuple[str, int]
+    sock: socket.socket
+    connecting: bool = True
+    parser: FrameParser = field(default_factory=FrameParser)
+    output: bytearray = field(default_factory=bytearray)
+    backlog: deque = field(default_factory=deque)
+    pending: dict = field(default_factory=dict)  # transaction ID -> request
+    transaction: int = 0
+
+
+class MultiClient:
+    """Synchronous client for many servers in a single thread
+
+    Keeps a non-blocking socket to each server and multiplexes them via
+    :mod:`selectors`. Requests are queued by :meth:`submit` and sent as soon
+    as the respective socket is writable. Responses are parsed incrementally
+    as they arrive and matched to their request by transaction ID. Hence
+    requests to different servers are processed concurrently without threads
+    or an event loop::
+
+        with MultiClient(timeout=1.) as client:
+            requests = [client.submit(address, READ_HOLDING_REGISTERS,
+                                      start=100, count=2)
+                        for address in addresses]
+            client.wait(requests)
+            for request in requests:
+                header, payload, err_code = request.result()
+
+    Connections are established on demand. If a connection fails, all of its
+    requests fail and the next request reconnects. Resolving a host name
+    blocks, so host names must be resolved up front by passing them as
+    ``addresses`` or via :meth:`resolve`. Numeric hosts need not be resolved.
+
+    Args:
+        timeout: Timeout in seconds for each request including the time
+            required to connect. If ``None``, requests wait indefinitely.
+            Defaults to ``None``.
+        max_transactions: Maximum number of requests in flight per connection.
+            Further requests are queued. Defaults to 3.
+        selector: Selector used to multiplex sockets. Defaults to
+            :class:`selectors.DefaultSelector`.
+        addresses: Host and port of the servers to resolve. Empty by default.
+
+    Raises:
+        socket.gaierror: If an address cannot be resolved
+    """
+    def __init__(
+        self,
+        timeout: float | None = None,
+        max_transactions: int = 3,
+        selector: selectors.BaseSelector | None = None,
+        addresses: Iterable[tuple[str, int]] = ()
+    ) -> None:
+        if max_transactions < 1:
+            raise ValueError("Expected positive number of transactions",
+                             max_transactions)
+        self.timeout = timeout
+        self.max_transactions = max_transactions
+        self._selector = selector if selector is not None \
+            else selectors.DefaultSelector()
+        self._connections = dict()  # address -> _Connection
+        self._requests = set()  # incomplete requests
+        self._resolved = dict()  # address -> (family, type, proto, sockaddr)
+        self.resolve(addresses)
+
+    def __enter__(self) -> "MultiClient":
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:
+        self.close()
+
+    @property
+    def connections(self) -> int:
+        """Get number of open connections
+
+        Return:
+            Number of sockets connected or connecting
+        """
+        return len(self._connections)
+
+    @property
+    def pending(self) -> int:
+        """Get number of incomplete requests
+
+        Return:
+            Number of requests submitted, which are not complete yet
+        """
+        return len(self._requests)
+
+    def close(self) -> None:
+        """Close all connections
+
+        Incomplete requests fail with :class:`ConnectionAbortedError`.
+        """
+        for address in list(self._connections):
+            self._fail(address, ConnectionAbortedError("Client closed"))
+        self._selector.close()
+
+    def resolve(self, addresses: Iterable[tuple[str, int]]) -> None:
+        """Resolve addresses of servers
+
+        Blocks until all host names have been resolved. Subsequent
+        connections to the servers use the resolved socket addresses.
+
+        Args:
+            addresses: Host and port of the servers. If a string is passed,
+                the default port is used.
+
+        Raises:
+            socket.gaierror: If an address cannot be resolved
+        """
+        for address in addresses:
+            if isinstance(address, str):
+                address = (address, DEFAULT_PORT)
+            self._resolved[address] = self._getaddrinfo(address, 0)
+
+    def disconnect(self, address: tuple[str, int]) -> None:
+        """Close connection to a server
+
+        Incomplete requests to the server fail with
+        :class:`ConnectionAbortedError`.
+
+        Args:
+            address: Host and port of the server
+        """
+        if address in self._connections:
+            self._fail(address, ConnectionAbortedError("Disconnected"))
+
+    def submit(
+        self,
+        address: tuple[str, int],
+        function: int,
+        payload: bytes = b"",
+        unit: int = NO_UNIT,
+        timeout: float | None = None,
+        **kwargs
+    ) -> PendingRequest:
+        """Queue a request
+
+        The request is sent by subsequent calls to :meth:`poll` or
+        :meth:`wait`.
+
+        Args:
+            address: Host and port of the server. If a string is passed, the
+                default port is used.
+            function: Function code
+            payload: Data sent along with the request. Used only for writing
+                functions. Empty by default.
+            unit: Unit ID of device. Defaults to ``NO_UNIT``.
+            timeout: Timeout in seconds. If ``None``, :attr:`timeout` is used.
+            **kwargs: Keyword arguments passed verbatim to the request of the
+                function
+
+        Return:
+            Handle of the request
+
+        Raises:
+            ValueError: If the host is neither numeric nor resolved
+        """
+        if isinstance(address, str):
+            address = (address, DEFAULT_PORT)
+        if address not in self._resolved:
+            try:
+                self._resolved[address] = self._getaddrinfo(
+                    address, socket.AI_NUMERICHOST)
+            except socket.gaierror:
+                raise ValueError("Host name not resolved", address) from None
+        if timeout is None:
+            timeout = self.timeout
+        header, message = new_request(function=function,
+                                      payload=payload,
+                                      unit=unit,
+                                      **kwargs)
+        deadline = None if timeout is None else monotonic() + timeout
+        request = PendingRequest(address, header, message, deadline)
+        self._requests.add(request)
+        try:
+            conn = self._connections.get(address)
+            if conn is None:
+                conn = self._connect(address)
+        except OSError as exc:
+            self._complete(request, error=exc)
+            return request
+        conn.backlog.append(request)
+        self._flush(conn)
+        return request
+
+    def call(
+        self,
+        address: tuple[str, int],
+        function: int,
+        **kwargs
+    ) -> tuple[ApplicationProtocolHeader, bytes, int]:
+        """Call a function on a server and wait for the result
+
+        Requests to other servers are processed while waiting.
+
+        Args:
+            address: Host and port of the server
+            function: Function code
+            **kwargs: Keyword arguments passed verbatim to :meth:`submit`
+
+        Return:
+            Header, payload and error code of the response
+        """
+        request = self.submit(address, function, **kwargs)
+        self.wait([request])
+        return request.result()
+
+    def read_blocks(
+        self,
+        reads: Iterable[tuple[tuple[str, int], int, Block]],
+        timeout: float | None = None
+    ) -> list[dict[Payload, object] | Exception]:
+        """Read blocks from several servers concurrently
+
+        Args:
+            reads: Address, unit ID and block for each read
+            timeout: Timeout in seconds. If ``None``, :attr:`timeout` is used.
+
+        Return:
+            Decoded values or the exception raised for each read
+        """
+        reads = list(reads)
+        requests = [self.submit(address,
+                                block.function,
+                                unit=unit,
+                                timeout=timeout,
+                                start=block.start,
+                                count=block.count)
+                    for address, unit, block in reads]
+        self.wait(requests)
+        retval = []
+        for (address, unit, block), request in zip(reads, requests):
+            try:
+                header, payload, err_code = request.result()
+                if err_code:
+                    raise ModbusError(err_code)
+                retval.append(block.decode(payload))
+            except Exception as exc:
+                retval.append(exc)
+        return retval
+
+    def wait(
+        self,
+        requests: Iterable[PendingRequest] | None = None,
+        timeout: float | None = None
+    ) -> bool:
+        """Process I/O until requests are complete
+
+        Args:
+            requests: Requests to wait for. If ``None``, all requests submitted
+                are awaited.
+            timeout: Maximum time to wait in seconds. If ``None``, waits until
+                the requests are complete or timed out.
+
+        Return:
+            ``True`` if and only if all requests are complete
+        """
+        if requests is None:
+            requests = self._requests
+        remaining = [req for req in requests if not req.done]
+        deadline = None if timeout is None else monotonic() + timeout
+        while remaining:
+            now = monotonic()
+            if deadline is not None and now >= deadline:
+                return False
+            self.poll(None if deadline is None else deadline - now)
+            remaining = [req for req in remaining if not req.done]
+        return True
+
+    def poll(self, timeout: float | None = 0.) -> int:
+        """Process I/O events once
+
+        Sends queued requests, receives responses and expires requests, which
+        timed out.
+
+        Args:
+            timeout: Maximum time to wait for I/O in seconds. ``None`` waits
+                until an event occurs or the next request times out. Defaults
+                to 0.
+
+        Return:
+            Number of requests completed
+        """
+        before = len(self._requests)
+        next_deadline = min((req.deadline for req in self._requests
+                             if req.deadline is not None), default=None)
+        if next_deadline is not None:
+            wait = max(0., next_deadline - monotonic())
+            timeout = wait if timeout is None else min(timeout, wait)
+        if self._connections:
+            events = self._selector.select(timeout)
+        else:
+            events = []
+        for key, mask in events:
+            conn = key.data
+            if conn.address not in self._connections:
+                continue  # failed while processing a previous event
+            try:
+                if mask & selectors.EVENT_WRITE:
+                    self._on_writable(conn)
+                if mask & selectors.EVENT_READ:
+                    self._on_readable(conn)
+            except Exception as exc:
+                self._fail(conn.address, exc)
+        self._expire(monotonic())
+        return before - len(self._requests)
+
+    def _connect(self, address):
+        """Start a non-blocking connection
+
+        Arguments:
+            address (tuple): Host and port
+
+        Return:
+            _Connection: Connection state
+        """
+        family, type, proto, sockaddr = self._resolved[address]
+        sock = socket.socket(family, type, proto)
+        sock.setblocking(False)
+        err = sock.connect_ex(sockaddr)
+        if err not in _CONNECTING:
+            sock.close()
+            raise OSError(err, errno.errorcode.get(err, "connect failed"),
+                          address)
+        conn = _Connection(address, sock)
+        self._connections[address] = conn
+        self._selector.register(sock, selectors.EVENT_WRITE, conn)
+        return conn
+
+    @staticmethod
+    def _getaddrinfo(address, flags):
+        """Resolve an address
+
+        Arguments:
+            address (tuple): Host and port
+            flags (int): Flags passed to :func:`socket.getaddrinfo`
+
+        Return:
+            tuple: Family, type, protocol and socket address
+        """
+        host, port = address
+        family, type, proto, _, sockaddr = socket.getaddrinfo(
+            host, port, type=socket.SOCK_STREAM, flags=flags)[0]
+        return family, type, proto, sockaddr
+
+    def _flush(self, conn):
+        """Move requests from backlog to output buffer
+
+        Arguments:
+            conn (_Connection): Connection
+        """
+        while conn.backlog and len(conn.pending) < self.max_transactions:
+            request = conn.backlog.popleft()
+            if request.done:
+                continue  # timed out while queued
+            conn.transaction = (conn.transaction + 1) & 0xFFFF
+            while conn.transaction in conn.pending:
+                conn.transaction = (conn.transaction + 1) & 0xFFFF
+            # Transaction ID occupies the first two bytes of the MBAP header
+            request.header.transaction = conn.transaction
+            conn.output += conn.transaction.to_bytes(2, "big")
+            conn.output += request.message[2:]
+            conn.pending[conn.transaction] = request
+        self._update(conn)
+
+    def _update(self, conn):
+        """Register the events of interest for a connection
+
+        Arguments:
+            conn (_Connection): Connection
+        """
+        events = selectors.EVENT_READ
+        if conn.connecting:
+            events = selectors.EVENT_WRITE
+        elif conn.output:
+            events |= selectors.EVENT_WRITE
+        if self._selector.get_key(conn.sock).events != events:
+            self._selector.modify(conn.sock, events, conn)
+
+    def _on_writable(self, conn):
+        """Complete connection or send buffered requests
+
+        Arguments:
+            conn (_Connection): Connection
+        """
+        if conn.connecting:
+            err = conn.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if err:
+                raise ConnectionRefusedError(err, errno.errorcode.get(err, ""),
+                                             conn.address)
+            conn.connecting = False
+        if conn.output:
+            try:
+                sent = conn.sock.send(conn.output)
+            except BlockingIOError:
+                sent = 0
+            del conn.output[:sent]
+        self._update(conn)
+
+    def _on_readable(self, conn):
+        """Receive data and complete requests
+
+        Arguments:
+            conn (_Connection): Connection
+        """
+        try:
+            data = conn.sock.recv(65536)
+        except BlockingIOError:
+            return
+        if not data:
+            raise ConnectionAbortedError("Connection terminated unexpectedly")
+        for header, payload, err_code in conn.parser.feed(data):
+            request = conn.pending.pop(header.transaction, None)
+            if request is None:
+                continue  # response to an expired request
+            if header.unit != request.header.unit and header.unit != NO_UNIT:
+                err_code = UNIT_MISMATCH
+            self._complete(request, response=(header, payload, err_code))
+        self._flush(conn)
+
+    def _complete(self, request, response=None, error=None):
+        """Mark a request as complete
+
+        Arguments:
+            request (PendingRequest): Request
+            response (tuple): Response
+            error (Exception): Error
+        """
+        request.response = response
+        request.error = error
+        self._requests.discard(request)
+
+    def _expire(self, now):
+        """Fail requests, which timed out
+
+        Arguments:
+            now (float): Current monotonic time
+        """
+        expired = [req for req in self._requests
+                   if req.deadline is not None and req.deadline <= now]
+        for request in expired:
+            self._complete(request, error=TimeoutError("Request timed out"))
+            conn = self._connections.get(request.address)
+            if conn is None:
+                continue
+            if conn.connecting:
+                # Nothing has been sent yet. Give up on the connection.
+                self._fail(request.address, TimeoutError("Connect timed out"))
+                continue
+            for tid, req in list(conn.pending.items()):
+                if req is request:
+                    del conn.pending[tid]
+            self._flush(conn)
+
+    def _fail(self, address, error):
+        """Close a connection and fail all of its requests
+
+        Arguments:
+            address (tuple): Host and port
+            error (Exception): Exception set on each request
+        """
+        conn = self._connections.pop(address)
+        try:
+            self._selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        conn.sock.close()
+        for request in list(conn.pending.values()) + list(conn.backlog):
+            if not request.done:
+                self._complete(request, error=error)
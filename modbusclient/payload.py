@@ -35,7 +35,10 @@ class Payload:
             If ``None``, ``READ_HOLDING_REGISTERS`` is assumed if
             ``self.is_writable`` or ``READ_INPUT_REGISTERS`` otherwise.
         writer:
-        **kwargs: Additional properties added verbatim to this instance.
+        **kwargs: Additional properties added verbatim to this instance. Some
+            properties are recognized by other parts of this package such as
+            ``name``, ``units`` or ``poll_interval`` (see
+            :class:`~modbusclient.asyncio.polling.Scheduler`).
     """
     _dtype: DataType
     _address: int
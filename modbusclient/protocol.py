@@ -11,7 +11,9 @@ from struct import Struct
 
 from .error_codes import (
     NO_ERROR,
-    MESSAGE_SIZE_ERROR
+    MESSAGE_SIZE_ERROR,
+    ILLEGAL_FUNCTION_ERROR,
+    ModbusError
 )
 
 from .functions import (
@@ -28,6 +30,8 @@ logger = logging.getLogger('modbusclient')
 MODBUS_PROTOCOL_ID = 0
 NO_UNIT = 0xFF
 DEFAULT_PORT = 502
+MAX_READ_REGISTERS = 125
+MAX_WRITE_REGISTERS = 123
 
 
 class HeaderMixin:
@@ -280,18 +284,23 @@ def new_request(
 
     Raises:
         TypeError: If any keyword argument is not recognized
+        ValueError: If a single register write is requested for more than
+            one register
     """
     try:
         RequestType = REQUEST_TYPES[function]
     except KeyError:
         raise RuntimeError("Unsupported Function ID", function)
     logger.debug(f"Creating {RequestType} request")
-    if payload:
+    # A single register write implies a count of one
+    if function == WRITE_SINGLE_REGISTER and kwargs.pop("count", 1) != 1:
+        raise ValueError("Expected single register", function)
+    if payload and "size" in RequestType.get_fields():
         kwargs['size'] = len(payload)
 
     # It is considered an error to pass arguments not recognized by request type
     request = RequestType(**kwargs)
-    msglen = 2 + len(request) + getattr(request, "size", 0)
+    msglen = 2 + len(request) + len(payload)
     header = ApplicationProtocolHeader(
         transaction=transaction,
         protocol=MODBUS_PROTOCOL_ID,
@@ -355,3 +364,79 @@ def parse_response_body(
         else:
             err_code = NO_ERROR
     return payload, err_code
+
+
+def parse_request_body(
+    header: ApplicationProtocolHeader,
+    buffer: bytes
+) -> tuple[HeaderMixin, bytes]:
+    """Parse request body
+
+    Counterpart of :func:`new_request` for servers. The header of a request is
+    parsed by :func:`parse_response_header`.
+
+    Args:
+        header: Header of the request
+        buffer: Buffer containing the request body following the header
+
+    Return:
+        Request PDU and data to write. The data is empty for read requests.
+
+    Raises:
+        ModbusError: With ``ILLEGAL_FUNCTION_ERROR``, if the function is not
+            supported
+        struct.error if buffer is smaller than required for PDU
+    """
+    try:
+        RequestType = REQUEST_TYPES[header.function]
+    except KeyError:
+        raise ModbusError(ILLEGAL_FUNCTION_ERROR, header.function) from None
+    request = RequestType.from_buffer(buffer)
+    return request, bytes(buffer[len(request):])
+
+
+def new_response(
+    header: ApplicationProtocolHeader,
+    payload: bytes = b"",
+    err_code: int = NO_ERROR,
+    **kwargs) -> bytes:
+    """Create response message
+
+    Counterpart of :func:`parse_response_body` for servers. Transaction ID,
+    unit and function code are copied from the request.
+
+    Args:
+        header: Header of the request
+        payload: Data returned along with the response. Empty by default.
+        err_code: Exception code. If not ``NO_ERROR``, an error response is
+            created and `payload` as well as `kwargs` are ignored.
+        kwargs: Keyword arguments passed verbatim to the response of the
+            function
+
+    Return:
+        Response in binary form
+
+    Raises:
+        RuntimeError: If the function is not supported
+    """
+    function = header.function
+    if err_code != NO_ERROR:
+        function |= ERROR_FLAG
+        response = Error(exception_code=err_code)
+        payload = b""
+    else:
+        try:
+            ResponseType = RESPONSE_TYPES[function]
+        except KeyError:
+            raise RuntimeError("Unsupported Function ID", function)
+        if "size" in ResponseType.get_fields():
+            kwargs['size'] = len(payload)
+        response = ResponseType(**kwargs)
+    response_header = ApplicationProtocolHeader(
+        transaction=header.transaction,
+        protocol=MODBUS_PROTOCOL_ID,
+        msglen=2 + len(response) + len(payload),
+        unit=header.unit,
+        function=function
+    )
+    return b"".join([response_header.to_buffer(), response.to_buffer(), payload])
@@ -0,0 +1,696 @@
+from array import array
+from collections.abc import Callable, Iterable
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import struct
+import sys
+from time import monotonic, sleep
+
+from .blocks import Block
+from .payload import Payload
+from .protocol import NO_UNIT
+
+NEVER = float("-inf")
+TABLE_SIZE = 0x10000
+#: Maximum time in seconds readers of a shared image wait for an update
+MAX_UPDATE_TIME = 1.
+
+# Layout of shared images: sequence number and size, timestamps, registers
+_HEADER = struct.Struct("=QQ")
+_published = set()  # Names of shared images created by this process
+
+
+class RegisterImage:
+    """Mirror of the raw registers of a single register table
+
+    Registers are stored in a compact :class:`array.array` of type ``'H'``
+    along with the monotonic time each register was received. The registers
+    hold the raw bytes as sent by the server in big endian byte order, so that
+    payloads decode directly from the image::
+
+        image.update(block.start, payload)
+        value = image.decode(msg, max_age=1.)
+
+    Args:
+        size: Number of registers. Defaults to 65536.
+        clock: Function returning the current monotonic time in seconds.
+            Defaults to :func:`time.monotonic`.
+    """
+    def __init__(
+        self,
+        size: int = TABLE_SIZE,
+        clock: Callable[[], float] = monotonic
+    ) -> None:
+        self._registers = array("H", bytes(2 * size))
+        self._timestamps = array("d", [NEVER]) * size
+        self._bytes = memoryview(self._registers).cast("B")
+        self._clock = clock
+
+    def __len__(self) -> int:
+        """Get number of registers
+
+        Return:
+            Size of the register table
+        """
+        return len(self._registers)
+
+    def update(
+        self,
+        start: int,
+        buffer: bytes,
+        timestamp: float | None = None
+    ) -> None:
+        """Store registers received from the server
+
+        Args:
+            start: Address of the first register
+            buffer: Raw data as returned by the server. The length must be a
+                multiple of two.
+            timestamp: Monotonic time the registers were received. If ``None``,
+                the current time is used.
+
+        Raises:
+            ValueError: If the registers exceed the table or the buffer has an
+                odd length
+        """
+        if len(buffer) % 2:
+            raise ValueError("Expected even number of bytes", len(buffer))
+        end = start + len(buffer) // 2
+        if start < 0 or end > len(self._registers):
+            raise ValueError("Registers out of range", start, end)
+        if timestamp is None:
+            timestamp = self._clock()
+        self._bytes[2 * start:2 * end] = buffer
+        self._timestamps[start:end] = array("d", [timestamp]) * (end - start)
+
+    def invalidate(self, start: int = 0, count: int | None = None) -> None:
+        """Mark registers as not received
+
+        Args:
+            start: Address of the first register. Defaults to 0.
+            count: Number of registers. If ``None``, all registers following
+                `start` are invalidated.
+        """
+        end = len(self._registers) if count is None else start + count
+        self._timestamps[start:end] = array("d", [NEVER]) * (end - start)
+
+    def timestamp(self, start: int, count: int = 1) -> float:
+        """Get time the oldest of a range of registers was received
+
+        Args:
+            start: Address of the first register
+            count: Number of registers. Defaults to 1.
+
+        Return:
+            Monotonic time in seconds. ``-inf``, if any register has not been
+            received yet.
+        """
+        return min(self._timestamps[start:start + count])
+
+    def is_valid(
+        self,
+        start: int,
+        count: int = 1,
+        max_age: float | None = None
+    ) -> bool:
+        """Check if a range of registers has been received
+
+        Args:
+            start: Address of the first register
+            count: Number of registers. Defaults to 1.
+            max_age: Maximum age of the registers in seconds. If ``None``, any
+                age is accepted.
+
+        Return:
+            ``True`` if and only if all registers have been received within
+            `max_age`
+        """
+        oldest = self.timestamp(start, count)
+        if max_age is None:
+            return oldest != NEVER
+        return self._clock() - oldest <= max_age
+
+    def raw(
+        self,
+        start: int,
+        count: int,
+        max_age: float | None = None
+    ) -> bytes:
+        """Get raw data of a range of registers
+
+        Args:
+            start: Address of the first register
+            count: Number of registers
+            max_age: Maximum age of the registers in seconds. If ``None``, any
+                age is accepted.
+
+        Return:
+            Raw data as sent by the server
+
+        Raises:
+            KeyError: If any register has not been received within `max_age`
+        """
+        if not self.is_valid(start, count, max_age):
+            raise KeyError(start, count)
+        return self._bytes[2 * start:2 * (start + count)].tobytes()
+
+    def registers(self, start: int, count: int) -> list[int]:
+        """Get register values
+
+        Args:
+            start: Address of the first register
+            count: Number of registers
+
+        Return:
+            Unsigned 16-bit value of each register. Registers not received yet
+            are 0.
+        """
+        values = array("H")
+        values.frombytes(self._bytes[2 * start:2 * (start + count)])
+        if sys.byteorder == "little":
+            values.byteswap()
+        return values.tolist()
+
+    def decode(self, msg: Payload, max_age: float | None = None) -> object:
+        """Decode a payload from the image
+
+        Args:
+            msg: Payload to decode
+            max_age: Maximum age of the registers in seconds. If ``None``, the
+                ``max_age`` attribute of `msg` is used, if present, and any
+                age is accepted otherwise.
+
+        Return:
+            Decoded value
+
+        Raises:
+            KeyError: If any register of `msg` has not been received within
+                `max_age`
+        """
+        if max_age is None:
+            max_age = getattr(msg, "max_age", None)
+        start = msg.address
+        end = start + msg.register_count
+        if not self.is_valid(start, end - start, max_age):
+            raise KeyError(start, end - start)
+        return msg.decode(self._bytes[2 * start:2 * end])
+
+    def close(self) -> None:
+        """Release resources held by the image
+
+        Does nothing for images in private memory.
+        """
+
+
+class SharedImage(RegisterImage):
+    """Register image published in shared memory
+
+    Allows one process to poll a device and publish the register image to
+    other processes on the same host, which decode payloads directly from
+    shared memory without additional requests to the device::
+
+        # Publisher
+        image = SharedImage("inverter", create=True)
+        image.update(block.start, payload)
+
+        # Consumer
+        image = SharedImage("inverter")
+        value = image.decode(msg, max_age=1.)
+
+    The block of shared memory contains a sequence number, the timestamp of
+    each register and the registers. Access is synchronised by a sequence
+    lock: The publisher increments the sequence number before and after
+    each update, so that it is odd while the image is modified. Readers do not
+    take a lock. Instead they retry a read, while the sequence number is odd
+    or has changed during the read. Hence there must not be more than one
+    publisher per image, while the number of consumers is not limited. If
+    no consistent state can be read within ``MAX_UPDATE_TIME`` seconds, e.g.
+    because the publisher died during an update, the read raises a
+    :class:`TimeoutError`.
+
+    Timestamps are compared across processes. The clock must therefore be
+    system wide like :func:`time.monotonic`.
+
+    Args:
+        name: Name of the shared memory block. If ``None``, a unique name is
+            chosen, which requires `create` to be ``True``.
+        size: Number of registers. Only used if `create` is ``True``. Defaults
+            to 65536.
+        clock: Function returning the current monotonic time in seconds.
+            Defaults to :func:`time.monotonic`.
+        create: If ``True``, create a new block of shared memory and publish
+            the image. Otherwise attach read only to the image published by
+            another process. Defaults to ``False``.
+
+    Raises:
+        FileExistsError: If `create` is ``True`` and a block named `name`
+            exists already
+        FileNotFoundError: If `create` is ``False`` and no block named `name`
+            exists
+    """
+    def __init__(
+        self,
+        name: str | None = None,
+        size: int = TABLE_SIZE,
+        clock: Callable[[], float] = monotonic,
+        create: bool = False
+    ) -> None:
+        if create:
+            shm = SharedMemory(name, create=True, size=_HEADER.size + 10 * size)
+            _HEADER.pack_into(shm.buf, 0, 0, size)
+            _published.add(shm.name)
+            buf = shm.buf
+        else:
+            shm = _attach(name)
+            size = _HEADER.unpack_from(shm.buf)[1]
+            buf = shm.buf.toreadonly()
+        offset = _HEADER.size + 8 * size
+        self._shm = shm
+        self._owner = create
+        self._header = buf[:_HEADER.size].cast("Q")
+        self._timestamps = buf[_HEADER.size:offset].cast("d")
+        self._bytes = buf[offset:offset + 2 * size]
+        self._registers = self._bytes.cast("H")
+        self._clock = clock
+        if create:
+            self._timestamps[:] = array("d", [NEVER]) * size
+
+    def __enter__(self) -> "SharedImage":
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:
+        self.close()
+
+    @property
+    def name(self) -> str:
+        """Get name of the shared memory block
+
+        Return:
+            Name passed to consumers
+        """
+        return self._shm.name
+
+    @property
+    def sequence(self) -> int:
+        """Get sequence number
+
+        Return:
+            Number incremented twice by each update. Consumers may compare it
+            to a previous value to find out, if the image has changed.
+        """
+        return self._header[0]
+
+    def update(
+        self,
+        start: int,
+        buffer: bytes,
+        timestamp: float | None = None
+    ) -> None:
+        sequence = self._header[0]
+        self._header[0] = sequence + 1
+        try:
+            super().update(start, buffer, timestamp)
+        finally:
+            self._header[0] = sequence + 2
+
+    def invalidate(self, start: int = 0, count: int | None = None) -> None:
+        sequence = self._header[0]
+        self._header[0] = sequence + 1
+        try:
+            super().invalidate(start, count)
+        finally:
+            self._header[0] = sequence + 2
+
+    def timestamp(self, start: int, count: int = 1) -> float:
+        return self._read(super().timestamp, start, count)
+
+    def raw(
+        self,
+        start: int,
+        count: int,
+        max_age: float | None = None
+    ) -> bytes:
+        return self._read(super().raw, start, count, max_age)
+
+    def registers(self, start: int, count: int) -> list[int]:
+        return self._read(super().registers, start, count)
+
+    def decode(self, msg: Payload, max_age: float | None = None) -> object:
+        return self._read(super().decode, msg, max_age)
+
+    def close(self) -> None:
+        """Detach from the shared memory block
+
+        The block is removed, if the image has been created by this process.
+        """
+        if self._shm.buf is None:
+            return
+        for view in (self._registers,
+                     self._bytes,
+                     self._timestamps,
+                     self._header):
+            view.release()
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+            _published.discard(self._shm.name)
+
+    def _read(self, fn, *args):
+        """Call a function until the image has not changed during the call
+
+        Arguments:
+            fn (callable): Function reading from the image
+            *args: Arguments passed to `fn`
+
+        Return:
+            Result of `fn` for a consistent state of the image
+
+        Raise:
+            TimeoutError: If the image has been updated for longer than
+            ``MAX_UPDATE_TIME``
+        """
+        header = self._header
+        deadline = None
+        while True:
+            sequence = header[0]
+            if not sequence & 1:
+                try:
+                    retval = fn(*args)
+                except Exception:
+                    if header[0] == sequence:
+                        raise
+                else:
+                    if header[0] == sequence:
+                        return retval
+            # Image modified by the publisher during the read
+            now = monotonic()
+            if deadline is None:
+                deadline = now + MAX_UPDATE_TIME
+            elif now > deadline:
+                raise TimeoutError("Image is being updated", self.name)
+            sleep(0)
+
+
+def _attach(name):
+    """Attach to an existing block of shared memory
+
+    Unlike the creating process, consumers shall not remove the block on exit.
+    Before Python 3.13 the block is always registered with the resource
+    tracker, which would remove it, once the consumer terminates. Blocks
+    created by this process remain registered, since they share the entry of
+    the creator.
+
+    Arguments:
+        name (str): Name of the block
+
+    Return:
+        SharedMemory: Attached block
+    """
+    try:
+        return SharedMemory(name, track=False)
+    except TypeError:
+        shm = SharedMemory(name)
+        if shm.name not in _published:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class DeviceImage:
+    """Register images of all units and register tables of a device
+
+    Holds one :class:`RegisterImage` per unit and register table, which is
+    created on first use. The table is identified by the function code used to
+    read it (e.g. ``READ_HOLDING_REGISTERS``). Passing a device image to
+    :class:`~modbusclient.ApiWrapper` or
+    :class:`~modbusclient.asyncio.ApiWrapper` stores every response in the
+    image, so that several consumers share a single read::
+
+        image = DeviceImage()
+        wrapper = ApiWrapper(api, host="192.168.1.10", image=image)
+        wrapper.read(["power"])
+        power = image.decode(wrapper.unit, api["power"])
+
+    :meth:`view` returns a mapping, which can be passed to ``cached_read`` to
+    read only messages whose registers are missing or older than the
+    ``max_age`` of the respective payload.
+
+    If several processes consume the data of the same device, the process
+    polling the device may publish the image in shared memory by passing a
+    `name`. Each table is then stored in a :class:`SharedImage` named
+    ``<name>_<unit>_<function>``. The consumers create a device image with
+    the same name and ``create=False`` to decode payloads without requests to
+    the device::
+
+        with DeviceImage(name="inverter", create=False) as image:
+            power = image.decode(3, api["power"], max_age=1.)
+
+    Args:
+        size: Number of registers per table. Defaults to 65536.
+        clock: Function returning the current monotonic time in seconds.
+            Defaults to :func:`time.monotonic`.
+        name: Prefix of the names of the shared memory blocks. If ``None``,
+            the image is private to this process. Defaults to ``None``.
+        create: If ``True``, publish the tables under `name`. Otherwise attach
+            read only to the tables published by another process. Ignored if
+            `name` is ``None``. Defaults to ``True``.
+    """
+    def __init__(
+        self,
+        size: int = TABLE_SIZE,
+        clock: Callable[[], float] = monotonic,
+        name: str | None = None,
+        create: bool = True
+    ) -> None:
+        self._size = size
+        self._clock = clock
+        self._name = name
+        self._create = create
+        self._tables = dict()  # (unit, function) -> RegisterImage
+
+    def __enter__(self) -> "DeviceImage":
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:
+        self.close()
+
+    @property
+    def name(self) -> str | None:
+        """Get prefix of the names of the shared memory blocks
+
+        Return:
+            Name passed to the constructor. ``None``, if the image is private
+            to this process.
+        """
+        return self._name
+
+    def table(self, unit: int, function: int) -> RegisterImage:
+        """Get image of a register table
+
+        Args:
+            unit: Modbus unit ID
+            function: Function code used to read the table
+
+        Return:
+            Image of the table, which is created if necessary
+
+        Raises:
+            KeyError: If the image is attached to another process, which has
+                not published the table (yet)
+        """
+        key = (unit, function)
+        image = self._tables.get(key)
+        if image is None:
+            if self._name is None:
+                image = RegisterImage(self._size, self._clock)
+            else:
+                try:
+                    image = SharedImage(f"{self._name}_{unit}_{function}",
+                                        self._size,
+                                        self._clock,
+                                        create=self._create)
+                except FileNotFoundError:
+                    raise KeyError(key) from None
+            self._tables[key] = image
+        return image
+
+    def get(self, unit: int, function: int) -> RegisterImage | None:
+        """Get image of a register table, if it exists
+
+        Unlike :meth:`table`, no table is created or attached.
+
+        Args:
+            unit: Modbus unit ID
+            function: Function code used to read the table
+
+        Return:
+            Image of the table or ``None``
+        """
+        return self._tables.get((unit, function))
+
+    def invalidate(
+        self,
+        unit: int,
+        start: int = 0,
+        count: int | None = None
+    ) -> None:
+        """Mark registers of all existing tables of a unit as not received
+
+        Args:
+            unit: Modbus unit ID
+            start: Address of the first register. Defaults to 0.
+            count: Number of registers. If ``None``, all registers following
+                `start` are invalidated.
+        """
+        for (table_unit, function), image in self._tables.items():
+            if table_unit == unit:
+                image.invalidate(start, count)
+
+    def discard(self, unit: int) -> None:
+        """Release all tables of a unit
+
+        Args:
+            unit: Modbus unit ID
+        """
+        for key in [key for key in self._tables if key[0] == unit]:
+            self._tables.pop(key).close()
+
+    def update(
+        self,
+        unit: int,
+        function: int,
+        start: int,
+        buffer: bytes,
+        timestamp: float | None = None
+    ) -> None:
+        """Store registers received from the server
+
+        Args:
+            unit: Modbus unit ID
+            function: Function code used to read the registers
+            start: Address of the first register
+            buffer: Raw data as returned by the server
+            timestamp: Monotonic time the registers were received. If ``None``,
+                the current time is used.
+        """
+        self.table(unit, function).update(start, buffer, timestamp)
+
+    def update_block(
+        self,
+        unit: int,
+        block: Block,
+        buffer: bytes,
+        timestamp: float | None = None
+    ) -> None:
+        """Store a block received from the server
+
+        Args:
+            unit: Modbus unit ID
+            block: Block read
+            buffer: Raw data of the entire block as returned by the server
+            timestamp: Monotonic time the block was received. If ``None``,
+                the current time is used.
+        """
+        self.update(unit, block.function, block.start, buffer, timestamp)
+
+    def decode(
+        self,
+        unit: int,
+        msg: Payload,
+        max_age: float | None = None
+    ) -> object:
+        """Decode a payload from the image
+
+        Args:
+            unit: Modbus unit ID
+            msg: Payload to decode
+            max_age: Maximum age in seconds. See :meth:`RegisterImage.decode`.
+
+        Return:
+            Decoded value
+
+        Raises:
+            KeyError: If any register of `msg` has not been received within
+                `max_age`
+        """
+        return self.table(unit, msg.reader).decode(msg, max_age)
+
+    def decode_all(
+        self,
+        unit: int,
+        messages: Iterable[Payload],
+        max_age: float | None = None
+    ) -> dict[Payload, object]:
+        """Decode all payloads available in the image
+
+        Args:
+            unit: Modbus unit ID
+            messages: Payloads to decode
+            max_age: Maximum age in seconds. See :meth:`RegisterImage.decode`.
+
+        Return:
+            Dictionary containing Payload as key and decoded value as value
+            for each payload whose registers are valid
+        """
+        retval = dict()
+        for msg in messages:
+            try:
+                retval[msg] = self.decode(unit, msg, max_age)
+            except KeyError:
+                pass
+        return retval
+
+    def close(self) -> None:
+        """Release all tables
+
+        Shared memory blocks published by this image are removed.
+        """
+        for image in self._tables.values():
+            image.close()
+        self._tables.clear()
+
+    def view(self, unit: int, max_age: float | None = None) -> "ImageView":
+        """Get a read only mapping of a unit
+
+        Args:
+            unit: Modbus unit ID
+            max_age: Maximum age in seconds. See :meth:`RegisterImage.decode`.
+
+        Return:
+            Mapping decoding payloads from the image of `unit`
+        """
+        return ImageView(self, unit, max_age)
+
+
+class ImageView:
+    """Mapping decoding payloads from a :class:`DeviceImage`
+
+    Looking up a payload, whose registers are missing or too old, raises a
+    :class:`KeyError`, which allows to use a view as cache for ``cached_read``.
+
+    Args:
+        image: Device image
+        unit: Modbus unit ID. Defaults to ``NO_UNIT``.
+        max_age: Maximum age in seconds. See :meth:`RegisterImage.decode`.
+    """
+    def __init__(
+        self,
+        image: DeviceImage,
+        unit: int = NO_UNIT,
+        max_age: float | None = None
+    ) -> None:
+        self._image = image
+        self._unit = unit
+        self._max_age = max_age
+
+    def __getitem__(self, msg: Payload) -> object:
+        return self._image.decode(self._unit, msg, self._max_age)
+
+    def __contains__(self, msg: Payload) -> bool:
+        try:
+            table = self._image.table(self._unit, msg.reader)
+        except KeyError:
+            return False
+        max_age = self._max_age
+        if max_age is None:
+            max_age = getattr(msg, "max_age", None)
+        return table.is_valid(msg.address, msg.register_count, max_age)
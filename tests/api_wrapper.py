@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 from modbusclient import Payload, AtomicType
 from modbusclient import as_payload, iter_payloads
+from modbusclient import ApiWrapper, DeviceImage
+from modbusclient.asyncio import ApiWrapper as AsyncApiWrapper
+from modbusclient.functions import READ_HOLDING_REGISTERS
+
+from tests.asyncio_client import Server, ServerThread
 
 import unittest
 
@@ -45,8 +50,77 @@ class ApiWrapperTestCase(unittest.TestCase):
                             set(self.msg))
 
 
+def settings():
+    """Settings of which registers 11, 12 and 15 differ from the test server"""
+    short = AtomicType("H")
+    return {
+        Payload(AtomicType("I"), 10, mode="rw"): 0x0A000C,
+        Payload(short, 12, mode="rw"): 13,
+        Payload(short, 13, mode="rw"): 13,
+        Payload(short, 15, mode="rw"): 1,
+        Payload(short, 16, mode="rw"): 16,
+        Payload(short, 20): 0,
+    }
+
+
+class SetFromTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server()
+        self.thread = ServerThread(self.server)
+        (host, port), = self.thread.start()
+        self.image = DeviceImage(size=100)
+        self.wrapper = ApiWrapper(host=host,
+                                  port=port,
+                                  timeout=1.,
+                                  connect=True,
+                                  image=self.image)
+
+    def tearDown(self):
+        self.wrapper.disconnect()
+        self.thread.stop()
+
+    def test_deduplicate(self):
+        values = settings()
+        retval = self.wrapper.set_from(values, deduplicate=True)
+        del values[list(values)[-1]]  # read only
+        self.assertDictEqual(retval, values)
+        self.assertListEqual(self.server.requests, [10, 15])
+        self.assertListEqual(self.server.writes, [(11, (12, 13)), (15, (1,))])
+        table = self.image.table(0xFF, READ_HOLDING_REGISTERS)
+        self.assertListEqual(table.registers(10, 7),
+                             [10, 12, 13, 13, 0, 1, 16])
+
+        # Device holds all values now
+        self.assertDictEqual(self.wrapper.set_from(values, deduplicate=True),
+                             values)
+        self.assertEqual(len(self.server.writes), 2)
+
+
+class AsyncSetFromTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = Server()
+        port = await self.server.start()
+        self.wrapper = AsyncApiWrapper(host="127.0.0.1", port=port, timeout=1.)
+        await self.wrapper.connect()
+
+    async def asyncTearDown(self):
+        self.wrapper.disconnect()
+        await self.server.stop()
+
+    async def test_deduplicate(self):
+        values = settings()
+        retval = await self.wrapper.set_from(values, deduplicate=True)
+        self.assertEqual(len(retval), 5)
+        self.assertListEqual(self.server.writes, [(11, (12, 13)), (15, (1,))])
+
+
 def suite():
-    return unittest.TestLoader().loadTestsFromTestCase(ApiWrapperTestCase)
+    suite = unittest.TestSuite()
+    for case in (ApiWrapperTestCase, SetFromTestCase, AsyncSetFromTestCase):
+        suite.addTests(unittest.TestLoader().loadTestsFromTestCase(case))
+    return suite
 
 
 if __name__ == '__main__':
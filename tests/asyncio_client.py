@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+from modbusclient.asyncio import Client, HIGH_PRIORITY
+from modbusclient.breaker import CircuitBreaker, CircuitOpenError, OPEN
+from modbusclient.protocol import (
+    ApplicationProtocolHeader,
+    Error,
+    ReadRequest,
+    ReadResponse,
+    WriteRequest,
+    WriteResponse,
+    parse_response_header
+)
+from modbusclient.error_codes import ILLEGAL_DATA_ADDRESS
+from modbusclient.functions import (
+    ERROR_FLAG,
+    READ_HOLDING_REGISTERS,
+    WRITE_MULTIPLE_REGISTERS
+)
+
+import asyncio
+import socket
+import struct
+import threading
+import time
+import unittest
+import unittest.mock
+
+
+class Server:
+    """Minimal Modbus server answering requests after a fixed delay
+
+    Registers not written yet hold their own address. Reads of registers
+    contained in ``illegal`` fail with the exception code ``error``, which
+    defaults to ``ILLEGAL_DATA_ADDRESS``. Requests to
+    units contained in ``silent`` are never answered.
+    """
+
+    def __init__(self, delay=0., silent=()):
+        self.delay = delay
+        self.silent = set(silent)
+        self.requests = []
+        self.writes = []
+        self.registers = dict()
+        self.illegal = set()
+        self.error = ILLEGAL_DATA_ADDRESS
+        self.writers = []
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.serve, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def serve(self, reader, writer):
+        nbytes = ApplicationProtocolHeader.get_parser().size
+        self.writers.append(writer)
+        try:
+            while True:
+                header = parse_response_header(await reader.readexactly(nbytes))
+                body = await reader.readexactly(header.msglen - 2)
+                if header.function == WRITE_MULTIPLE_REGISTERS:
+                    self.write(writer, header, body)
+                    continue
+                request = ReadRequest.from_buffer(body)
+                self.requests.append(request.start)
+                if header.unit in self.silent:
+                    continue
+                asyncio.create_task(self.respond(writer, header, request))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+        finally:
+            self.writers.remove(writer)
+
+    def write(self, writer, header, body):
+        request = WriteRequest.from_buffer(body)
+        values = struct.unpack_from(f"!{request.count}H", body, len(request))
+        self.writes.append((request.start, values))
+        for i, value in enumerate(values):
+            self.registers[request.start + i] = value
+        response = WriteResponse(start=request.start, count=request.count)
+        header.msglen = 2 + len(response)
+        writer.write(header.to_buffer() + response.to_buffer())
+
+    async def respond(self, writer, header, request):
+        await asyncio.sleep(self.delay)
+        end = request.start + request.count
+        if not self.illegal.isdisjoint(range(request.start, end)):
+            header.function |= ERROR_FLAG
+            header.msglen = 3
+            error = Error(exception_code=self.error)
+            writer.write(header.to_buffer() + error.to_buffer())
+            return
+        data = struct.pack(f"!{request.count}H",
+                           *(self.registers.get(i, i) for i in
+                             range(request.start, request.start + request.count)))
+        header.msglen = 3 + len(data)
+        response = ReadResponse(size=len(data))
+        writer.write(header.to_buffer() + response.to_buffer() + data)
+
+
+class ServerThread:
+    """Run servers in the event loop of a background thread
+
+    Used to test synchronous clients.
+    """
+
+    def __init__(self, *servers):
+        self.servers = servers
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return [("127.0.0.1", self.run(server.start()))
+                for server in self.servers]
+
+    def stop(self):
+        for server in self.servers:
+            self.run(server.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+class ClientTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = Server(delay=0.02)
+        self.port = await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+
+    async def requested(self, n=1):
+        while len(self.server.requests) < n:
+            await asyncio.sleep(0.001)
+
+    async def read(self, client, start, **kwargs):
+        header, payload, err_code = await client.call(READ_HOLDING_REGISTERS,
+                                                      start=start,
+                                                      count=2,
+                                                      **kwargs)
+        return struct.unpack("!2H", payload)
+
+    async def test_call(self):
+        client = Client("127.0.0.1", self.port)
+        results = await asyncio.gather(*[self.read(client, i) for i in range(10)])
+        self.assertListEqual(results, [(i, i + 1) for i in range(10)])
+        client.disconnect()
+        self.assertFalse(client.is_connected())
+
+    async def test_cancel_connect(self):
+        client = Client("127.0.0.1", self.port, timeout=1.)
+        connected = asyncio.Event()
+        writers = []
+        open_connection = asyncio.open_connection
+
+        async def connect(*args):
+            reader, writer = await open_connection(*args)
+            writers.append(writer)
+            connected.set()
+            return reader, writer
+
+        with unittest.mock.patch("asyncio.open_connection", connect):
+            task = asyncio.create_task(client.connect())
+            await connected.wait()
+            # connection established, but not yet handed to the client
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        await asyncio.sleep(0)
+        self.assertFalse(client.is_connected())
+        self.assertTrue(writers[0].is_closing())
+
+    async def test_priority(self):
+        client = Client("127.0.0.1", self.port, max_transactions=1)
+        tasks = [asyncio.create_task(self.read(client, 1))]
+        await self.requested()
+        for start in [2, 3]:
+            tasks.append(asyncio.create_task(self.read(client, start)))
+            await asyncio.sleep(0.001)
+        tasks.append(asyncio.create_task(
+            self.read(client, 100, priority=HIGH_PRIORITY)))
+        await asyncio.gather(*tasks)
+        self.assertListEqual(self.server.requests, [1, 100, 2, 3])
+        client.disconnect()
+
+    async def test_reserved(self):
+        client = Client("127.0.0.1", self.port,
+                        max_transactions=2,
+                        reserved_transactions=1)
+        tasks = [asyncio.create_task(self.read(client, 1))]
+        await self.requested()
+        tasks.append(asyncio.create_task(self.read(client, 2)))
+        await asyncio.sleep(0.005)
+        self.assertListEqual(self.server.requests, [1])
+        tasks.append(asyncio.create_task(
+            self.read(client, 100, priority=HIGH_PRIORITY)))
+        await asyncio.sleep(0.005)
+        self.assertListEqual(self.server.requests, [1, 100])
+        await asyncio.gather(*tasks)
+        self.assertListEqual(self.server.requests, [1, 100, 2])
+        client.disconnect()
+        self.assertRaises(ValueError, Client, max_transactions=1,
+                          reserved_transactions=1)
+
+    async def test_disconnect(self):
+        client = Client("127.0.0.1", self.port, max_transactions=1)
+        tasks = [asyncio.create_task(self.read(client, i)) for i in range(2)]
+        await self.requested()
+        client.disconnect()
+        with self.assertRaises(asyncio.CancelledError):
+            await tasks[0]
+        with self.assertRaises(ConnectionAbortedError):
+            await tasks[1]
+
+    async def test_timeout(self):
+        self.server.silent.add(7)
+        client = Client("127.0.0.1", self.port, max_transactions=1)
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.read(client, 1, unit=7, timeout=0.05)
+        # transaction is released and a late response would be discarded
+        self.server.silent.clear()
+        self.assertEqual(await self.read(client, 2, timeout=0.5), (2, 3))
+        self.assertNotEqual(client._wire_id(0), 0)
+        client.disconnect()
+
+    async def test_breaker(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        now = [0.]
+        breaker = CircuitBreaker(failure_threshold=2, base_delay=60.,
+                                 clock=lambda: now[0])
+        client = Client("127.0.0.1", port, max_retries=5, breaker=breaker)
+        for i in range(2):
+            with self.assertRaises(ConnectionRefusedError):
+                await self.read(client, 1)
+        self.assertEqual(breaker.state, OPEN)
+        t0 = time.monotonic()
+        with self.assertRaises(CircuitOpenError):
+            await self.read(client, 1)
+        self.assertLess(time.monotonic() - t0, 0.1)
+
+        # successful probe closes the breaker
+        client = Client("127.0.0.1", self.port, breaker=breaker)
+        now[0] += 60.
+        self.assertEqual(await self.read(client, 1), (1, 2))
+        self.assertEqual(breaker.failures, 0)
+        client.disconnect()
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(ClientTestCase)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
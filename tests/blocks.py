@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+from modbusclient import Payload, AtomicType, String
+from modbusclient.blocks import Block, plan_blocks, to_registers, plan_writes
+from modbusclient.functions import READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS
+
+import unittest
+
+
+class BlocksTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Set up test parameters
+        """
+        self.short = AtomicType("h")
+        self.int = AtomicType("i")
+        self.msg = [
+            Payload(self.short, 100),
+            Payload(self.int, 101),
+            Payload(self.short, 103),
+            Payload(self.short, 105),
+            Payload(self.short, 102, mode="rw"),
+            Payload(String(3), 106),
+        ]
+
+    def test_plan_blocks(self):
+        blocks = plan_blocks(self.msg)
+        self.assertEqual(len(blocks), 3)
+        self.assertEqual(blocks[0], Block(READ_HOLDING_REGISTERS, 102, 1,
+                                          (self.msg[4],)))
+        self.assertEqual(blocks[1], Block(READ_INPUT_REGISTERS, 100, 4,
+                                          tuple(self.msg[:3])))
+        self.assertEqual(blocks[2], Block(READ_INPUT_REGISTERS, 105, 3,
+                                          (self.msg[3], self.msg[5])))
+        self.assertEqual(blocks[2].end, 108)
+
+        blocks = plan_blocks(self.msg, max_gap=1)
+        self.assertEqual([(b.start, b.count) for b in blocks],
+                         [(102, 1), (100, 8)])
+
+        blocks = plan_blocks(self.msg, max_count=3)
+        self.assertEqual([(b.start, b.count) for b in blocks],
+                         [(102, 1), (100, 3), (103, 1), (105, 3)])
+
+    def test_gap_and_size(self):
+        msg = [Payload(self.short, 100), Payload(self.short, 103)]
+        self.assertEqual(len(plan_blocks(msg)), 2)
+        self.assertEqual(len(plan_blocks(msg, max_gap=1)), 2)
+        blocks = plan_blocks(msg, max_gap=2)
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0].count, 4)
+        self.assertEqual(len(plan_blocks(msg, max_gap=2, max_count=3)), 2)
+
+    def test_overlap(self):
+        msg = [Payload(self.int, 100), Payload(self.short, 101)]
+        blocks = plan_blocks(msg)
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0].count, 2)
+
+    def test_priority(self):
+        block = Block(READ_INPUT_REGISTERS, 100, 2, (
+            Payload(self.short, 100),
+            Payload(self.short, 101, priority=2)
+        ))
+        self.assertEqual(block.priority, 2)
+        self.assertEqual(plan_blocks(self.msg)[0].priority, 0)
+
+        # Payloads of different priority are read separately
+        low = Payload(self.short, 100)
+        high = Payload(self.short, 101, priority=2)
+        blocks = plan_blocks([low, high, Payload(self.short, 102)])
+        self.assertEqual([(b.start, b.count, b.priority) for b in blocks],
+                         [(100, 1, 0), (102, 1, 0), (101, 1, 2)])
+
+    def test_decode(self):
+        block = Block(READ_INPUT_REGISTERS, 100, 4, tuple(self.msg[:3]))
+        buffer = b"".join([self.short.encode(-1),
+                           self.int.encode(123456),
+                           self.short.encode(7)])
+        self.assertDictEqual(block.decode(buffer), {
+            self.msg[0]: -1,
+            self.msg[1]: 123456,
+            self.msg[2]: 7
+        })
+        self.assertDictEqual(block.registers(buffer[:4]), {
+            100: buffer[:2],
+            101: buffer[2:4]
+        })
+        self.assertDictEqual(block.split(buffer), {
+            self.msg[0]: buffer[:2],
+            self.msg[1]: buffer[2:6],
+            self.msg[2]: buffer[6:]
+        })
+
+    def test_plan_writes(self):
+        registers = to_registers({
+            Payload(self.int, 10, mode="rw"): self.int.encode(0x10002),
+            Payload(self.short, 12, mode="rw"): self.short.encode(3),
+            Payload(self.short, 14, mode="rw"): self.short.encode(5),
+        })
+        self.assertDictEqual(registers, {10: b"\x00\x01", 11: b"\x00\x02",
+                                         12: b"\x00\x03", 14: b"\x00\x05"})
+        self.assertListEqual(plan_writes(registers), [
+            (10, b"\x00\x01\x00\x02\x00\x03"),
+            (14, b"\x00\x05")
+        ])
+        current = {11: b"\x00\x02", 14: b"\x00\x05"}
+        self.assertListEqual(plan_writes(registers, current), [
+            (10, b"\x00\x01"),
+            (12, b"\x00\x03")
+        ])
+        self.assertListEqual(plan_writes(registers, max_count=2), [
+            (10, b"\x00\x01\x00\x02"),
+            (12, b"\x00\x03"),
+            (14, b"\x00\x05")
+        ])
+        self.assertListEqual(plan_writes(registers, dict(registers)), [])
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(BlocksTestCase)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+from modbusclient.breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    backoff,
+    CLOSED,
+    OPEN,
+    HALF_OPEN
+)
+
+import unittest
+
+
+class BackoffTestCase(unittest.TestCase):
+
+    def test_backoff(self):
+        self.assertListEqual([backoff(i, 0.5, 3.) for i in range(1, 6)],
+                             [0.5, 1., 2., 3., 3.])
+        self.assertEqual(backoff(2, 1., 10., jitter=0.5, random=lambda: 0.5),
+                         1.5)
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Set up test parameters
+        """
+        self.now = 100.
+        self.breaker = CircuitBreaker(failure_threshold=2,
+                                      base_delay=1.,
+                                      max_delay=3.,
+                                      jitter=0.5,
+                                      clock=lambda: self.now,
+                                      random=lambda: 0.)
+
+    def test_construction(self):
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertEqual(self.breaker.retry_in, 0.)
+        self.assertRaises(ValueError, CircuitBreaker, 0)
+        self.assertRaises(ValueError, CircuitBreaker, jitter=2.)
+
+    def test_trip(self):
+        breaker = self.breaker
+        breaker.check()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.trips, 1)
+        self.assertEqual(breaker.retry_in, 1.)
+        with self.assertRaises(CircuitOpenError) as ctx:
+            breaker.check()
+        self.assertEqual(ctx.exception.retry_in, 1.)
+        self.assertIsInstance(ctx.exception, ConnectionError)
+        self.assertEqual(breaker.rejected, 1)
+
+    def test_half_open(self):
+        breaker = self.breaker
+        breaker.record_failure()
+        breaker.record_failure()
+        self.now += 1.
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        # only a single probe is permitted
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.trips, 2)
+        self.assertEqual(breaker.retry_in, 2.)
+
+        self.now += 2.
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.retry_in, 3.)
+
+        self.now += 3.
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.trips, 0)
+        self.assertEqual(breaker.failures, 0)
+
+    def test_lost_probe(self):
+        breaker = self.breaker
+        breaker.record_failure()
+        breaker.record_failure()
+        self.now += 1.
+        self.assertTrue(breaker.allow())
+        self.now += 1.
+        self.assertFalse(breaker.allow())
+        self.now += 1.
+        self.assertTrue(breaker.allow())
+
+    def test_jitter(self):
+        breaker = CircuitBreaker(1, base_delay=2., jitter=0.5,
+                                 clock=lambda: self.now,
+                                 random=lambda: 1.)
+        breaker.record_failure()
+        self.assertEqual(breaker.retry_in, 1.)
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite([
+        loader.loadTestsFromTestCase(BackoffTestCase),
+        loader.loadTestsFromTestCase(CircuitBreakerTestCase)
+    ])
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+from modbusclient import ApiWrapper, Cache, NegativeCache, Payload, AtomicType
+from modbusclient.asyncio import ApiWrapper as AsyncApiWrapper
+from modbusclient.error_codes import ILLEGAL_DATA_ADDRESS, SERVER_DEVICE_BUSY
+
+from tests.asyncio_client import Server, ServerThread
+
+import unittest
+
+
+class CacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Set up test parameters
+        """
+        self.now = 100.
+        self.power = Payload(AtomicType("H"), address=3, max_age=1.)
+        self.serial = Payload(AtomicType("H"), address=4, max_age=3600.)
+        self.other = Payload(AtomicType("H"), address=5)
+
+    def clock(self):
+        return self.now
+
+    def test_expiry(self):
+        cache = Cache(max_age=10., clock=self.clock)
+        cache.update({self.power: 1, self.serial: 2, self.other: 3})
+        self.assertEqual(cache[self.power], 1)
+        self.assertEqual(cache.expires_in(self.other), 10.)
+        self.now += 5.
+        self.assertRaises(KeyError, cache.__getitem__, self.power)
+        self.assertNotIn(self.power, cache)
+        self.assertIn(self.other, cache)
+        self.assertEqual(cache[self.serial], 2)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        self.assertAlmostEqual(cache.hit_rate, 2 / 3)
+        self.now += 5.
+        self.assertEqual(cache.expire(), 2)
+        self.assertListEqual(list(cache), [self.serial])
+        self.assertEqual(cache.expire(), 0)
+        self.assertEqual(len(cache), 1)
+
+        cache = Cache(clock=self.clock)
+        cache[self.other] = 3
+        self.now += 1e6
+        self.assertIsNone(cache.expires_in(self.other))
+        self.assertEqual(cache[self.other], 3)
+
+    def test_lru(self):
+        cache = Cache(max_size=2, clock=self.clock)
+        cache[self.power] = 1
+        cache[self.serial] = 2
+        cache[self.power]
+        cache[self.other] = 3
+        self.assertListEqual(list(cache), [self.power, self.other])
+        self.assertEqual(cache.evictions, 1)
+        self.assertRaises(ValueError, Cache, max_size=0)
+
+
+class NegativeCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Set up test parameters
+        """
+        self.now = 100.
+        self.cache = NegativeCache(base_delay=10.,
+                                   max_delay=25.,
+                                   clock=lambda: self.now,
+                                   random=lambda: 0.)
+        self.msg = [Payload(AtomicType("H"), address=i) for i in range(3)]
+
+    def test_backoff(self):
+        cache = self.cache
+        self.assertFalse(cache.record_failure(self.msg[0], SERVER_DEVICE_BUSY))
+        self.assertFalse(cache.is_suppressed(self.msg[0]))
+        self.assertTrue(cache.record_failure(self.msg[0], ILLEGAL_DATA_ADDRESS))
+        self.assertTrue(cache.is_suppressed(self.msg[0]))
+        self.assertListEqual(cache.filter(self.msg), self.msg[1:])
+        self.assertEqual(cache.skipped, 1)
+        self.assertDictEqual(cache.suppressed(),
+                             {self.msg[0]: (ILLEGAL_DATA_ADDRESS, 10.)})
+        # Probe after delay, which doubles on each failure
+        self.now += 10.
+        self.assertFalse(cache.is_suppressed(self.msg[0]))
+        self.assertDictEqual(cache.suppressed(), {})
+        self.assertEqual(len(cache), 1)
+        cache.record_failure(self.msg[0], ILLEGAL_DATA_ADDRESS)
+        self.assertEqual(cache.suppressed()[self.msg[0]][1], 20.)
+        cache.record_failure(self.msg[0], ILLEGAL_DATA_ADDRESS)
+        self.assertEqual(cache.suppressed()[self.msg[0]][1], 25.)
+        cache.record_success(self.msg[0])
+        self.assertEqual(len(cache), 0)
+
+
+class CachedReadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server()
+        self.thread = ServerThread(self.server)
+        (host, port), = self.thread.start()
+        self.address = (host, port)
+        self.msg = [Payload(AtomicType("H"), address=i, max_age=1. + i)
+                    for i in range(3, 7)]
+        self.wrapper = ApiWrapper({msg.address: msg for msg in self.msg},
+                                  host=host,
+                                  port=port,
+                                  timeout=1.,
+                                  connect=True,
+                                  negative_cache=NegativeCache(
+                                      clock=lambda: self.now))
+        self.now = 0.
+
+    def tearDown(self):
+        self.wrapper.disconnect()
+        self.thread.stop()
+
+    def test_cached_read(self):
+        cache = Cache(clock=lambda: self.now)
+        values = {msg: msg.address for msg in self.msg}
+        self.assertDictEqual(self.wrapper.cached_read(cache), values)
+        self.assertListEqual(self.server.requests, [3])
+        self.assertDictEqual(dict(cache), values)
+
+        # Only the first two messages have expired
+        self.now = 5.5
+        hits = cache.hits
+        self.assertDictEqual(self.wrapper.cached_read(cache), values)
+        self.assertListEqual(self.server.requests, [3, 3])
+        self.assertEqual(cache.hits - hits, 2)
+
+        # Plain dictionaries are not updated
+        cache = {self.msg[1]: 0}
+        values[self.msg[1]] = 0
+        self.assertDictEqual(self.wrapper.cached_read(cache, max_gap=1),
+                             values)
+        self.assertListEqual(self.server.requests, [3, 3, 3])
+        self.assertDictEqual(cache, {self.msg[1]: 0})
+
+    def test_negative_cache(self):
+        self.server.illegal.add(4)
+        negative = self.wrapper.negative_cache
+        values = {msg: msg.address for msg in self.msg if msg.address != 4}
+        self.assertDictEqual(self.wrapper.cached_read(dict()), values)
+        # Block failed and payloads were read one by one
+        self.assertListEqual(self.server.requests, [3, 3, 4, 5, 6])
+        self.assertListEqual(list(negative.suppressed()), [self.msg[1]])
+
+        self.assertDictEqual(self.wrapper.cached_read(dict()), values)
+        self.assertListEqual(self.server.requests[5:], [3, 5])
+        self.assertDictEqual(self.wrapper.read(), values)
+        self.assertListEqual(self.server.requests[7:], [3, 5, 6])
+        self.assertEqual(negative.skipped, 2)
+
+    def test_fallback(self):
+        self.server.illegal.add(4)
+        wrapper = ApiWrapper({msg.address: msg for msg in self.msg},
+                             host=self.address[0],
+                             port=self.address[1],
+                             timeout=1.,
+                             connect=True)
+        values = {msg: msg.address for msg in self.msg if msg.address != 4}
+        try:
+            # Payloads are read one by one without a negative cache, too
+            self.assertDictEqual(wrapper.cached_read(dict()), values)
+            self.assertListEqual(self.server.requests, [3, 3, 4, 5, 6])
+            # Other exceptions apply to the entire device
+            self.server.error = SERVER_DEVICE_BUSY
+            self.assertDictEqual(wrapper.cached_read(dict()), dict())
+            self.assertListEqual(self.server.requests[5:], [3])
+        finally:
+            wrapper.disconnect()
+
+
+class AsyncNegativeCacheTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = Server()
+        self.server.illegal.add(4)
+        self.port = port = await self.server.start()
+        self.msg = [Payload(AtomicType("H"), address=i) for i in range(3, 7)]
+        self.wrapper = AsyncApiWrapper({msg.address: msg for msg in self.msg},
+                                       host="127.0.0.1",
+                                       port=port,
+                                       timeout=1.,
+                                       negative_cache=NegativeCache())
+        await self.wrapper.connect()
+
+    async def asyncTearDown(self):
+        self.wrapper.disconnect()
+        await self.server.stop()
+
+    async def test_poll(self):
+        values = {msg: msg.address for msg in self.msg if msg.address != 4}
+        polling = self.wrapper.poll(interval=0.01, align=False)
+        for i in range(2):
+            snapshot = await anext(polling)
+            self.assertDictEqual(snapshot.values, values)
+        await polling.aclose()
+        self.assertListEqual(self.server.requests, [3, 3, 4, 5, 6, 3, 5])
+        self.assertListEqual(list(self.wrapper.negative_cache.suppressed()),
+                             [self.msg[1]])
+
+    async def test_fallback(self):
+        wrapper = AsyncApiWrapper({msg.address: msg for msg in self.msg},
+                                  host="127.0.0.1",
+                                  port=self.port,
+                                  timeout=1.)
+        values = {msg: msg.address for msg in self.msg if msg.address != 4}
+        try:
+            # Payloads are read one by one without a negative cache, too
+            self.assertDictEqual(await wrapper.cached_read(dict()), values)
+            self.assertListEqual(self.server.requests, [3, 3, 4, 5, 6])
+            # Other exceptions apply to the entire device
+            self.server.error = SERVER_DEVICE_BUSY
+            self.assertDictEqual(await wrapper.cached_read(dict()), dict())
+            self.assertListEqual(self.server.requests[5:], [3])
+        finally:
+            wrapper.disconnect()
+
+
+def suite():
+    suite = unittest.TestSuite()
+    for case in (CacheTestCase,
+                 NegativeCacheTestCase,
+                 CachedReadTestCase,
+                 AsyncNegativeCacheTestCase):
+        suite.addTests(unittest.TestLoader().loadTestsFromTestCase(case))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
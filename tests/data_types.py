@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import pickle
 import unittest
 from modbusclient.data_types import (
     DataType,
@@ -157,6 +158,15 @@ class DataTypeTestCase(unittest.TestCase):
         result = dt.decode(encoded)
         self.assertEqual(len(result), 1)
 
+    def test_pickle(self):
+        """Test that DataType survives a pickle roundtrip"""
+        dt = DataType("<I", swap_words=True)
+        restored = pickle.loads(pickle.dumps(dt))
+        self.assertEqual(len(restored), 4)
+        self.assertEqual(restored.encode(1), dt.encode(1))
+        self.assertEqual(restored.decode(b"\x01\x00\x02\x00"),
+                         dt.decode(b"\x01\x00\x02\x00"))
+
 
 class AtomicTypeTestCase(unittest.TestCase):
     """Test cases for AtomicType class"""
@@ -264,6 +274,11 @@ class StringTestCase(unittest.TestCase):
         result2 = s_swap.encode("tüst")
         self.assertEqual(len(result2), 6)
 
+    def test_pickle(self):
+        """Test that String keeps its encoding when pickled"""
+        s = pickle.loads(pickle.dumps(String(4, encoding="latin1")))
+        self.assertEqual(s.decode(b"t\xfcst"), "t\xfcst")
+
 
 class SwapWordsTestCase(unittest.TestCase):
     """Test cases for swap_words function"""
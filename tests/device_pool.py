@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+from modbusclient import ApiWrapper, Client, DevicePool, Payload, AtomicType
+from modbusclient.functions import READ_HOLDING_REGISTERS
+
+from tests.asyncio_client import Server, ServerThread
+
+from concurrent.futures import ThreadPoolExecutor
+import socket
+import struct
+import time
+import unittest
+
+
+class DevicePoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.servers = [Server(delay=0.05), Server(delay=0.05)]
+        self.thread = ServerThread(*self.servers)
+        self.addresses = self.thread.start()
+        self.api = {i: Payload(AtomicType("H"), address=i) for i in (3, 5)}
+
+    def tearDown(self):
+        self.thread.stop()
+
+    def device(self, address, **kwargs):
+        host, port = address
+        return ApiWrapper(self.api, host=host, port=port, timeout=1., **kwargs)
+
+    def test_thread_safe_client(self):
+        self.servers[0].delay = 0.
+        host, port = self.addresses[0]
+        with Client(host, port, timeout=1., thread_safe=True) as client:
+            self.assertTrue(client.thread_safe)
+
+            def read(start):
+                header, payload, err_code = client.call(READ_HOLDING_REGISTERS,
+                                                        start=start,
+                                                        count=2)
+                return payload == struct.pack("!2H", start, start + 1)
+
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                self.assertTrue(all(executor.map(read, range(200))))
+        self.assertFalse(Client(connect=False).thread_safe)
+
+    def test_poll(self):
+        devices = [self.device(address) for address in self.addresses]
+        with DevicePool(devices, max_workers=2) as pool:
+            begin = time.monotonic()
+            futures = pool.poll()
+            self.assertEqual(list(futures), devices)
+            for future in futures.values():
+                self.assertEqual(future.result(),
+                                 {self.api[3]: 3, self.api[5]: 5})
+            # Two reads per device, devices polled in parallel
+            self.assertLess(time.monotonic() - begin, 0.19)
+            self.assertTrue(all(device.is_connected() for device in devices))
+        self.assertFalse(any(device.is_connected() for device in devices))
+
+    def test_serialized_per_device(self):
+        device = self.device(self.addresses[0])
+        with DevicePool([device], max_workers=4) as pool:
+            futures = [pool.read(device, [self.api[3]]),
+                       pool.submit(device, ApiWrapper.get, 5),
+                       pool.read(device, [self.api[3]])]
+            self.assertEqual(pool.pending(device), 3)
+            self.assertEqual(futures[1].result(), 5)
+        self.assertEqual(self.servers[0].requests, [3, 5, 3])
+        self.assertEqual(pool.pending(device), 0)
+
+    def test_error(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        address = sock.getsockname()
+        sock.close()
+        devices = [self.device(address), self.device(self.addresses[0])]
+        with DevicePool(devices) as pool:
+            futures = pool.poll()
+            self.assertRaises(ConnectionRefusedError, futures[devices[0]].result)
+            self.assertEqual(len(futures[devices[1]].result()), 2)
+            future = pool.submit(devices[1], lambda device: 1 / 0)
+            self.assertRaises(ZeroDivisionError, future.result)
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(DevicePoolTestCase)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
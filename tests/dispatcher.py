@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+from modbusclient.asyncio import Client, UnitDispatcher, HIGH_PRIORITY
+from modbusclient.functions import READ_HOLDING_REGISTERS
+from tests.asyncio_client import Server
+
+import asyncio
+import struct
+import unittest
+
+
+class UnitDispatcherTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = Server(delay=0.01)
+        self.port = await self.server.start()
+        self.client = Client("127.0.0.1", self.port, max_transactions=4)
+
+    async def asyncTearDown(self):
+        self.client.disconnect()
+        await self.server.stop()
+
+    async def read(self, dispatcher, unit, start, **kwargs):
+        header, payload, err_code = await dispatcher.call(
+            READ_HOLDING_REGISTERS,
+            unit=unit,
+            start=start,
+            count=1,
+            **kwargs
+        )
+        return struct.unpack("!H", payload)[0]
+
+    def test_construction(self):
+        dispatcher = UnitDispatcher(self.client)
+        self.assertIs(dispatcher.client, self.client)
+        self.assertEqual(dispatcher.max_in_flight, 1)
+        self.assertEqual(dispatcher.max_total, 4)
+        self.assertRaises(ValueError, UnitDispatcher, self.client, 0)
+
+    async def test_round_robin(self):
+        dispatcher = UnitDispatcher(self.client, max_total=1)
+        # unit 1 floods the queue before units 2 and 3 enqueue their requests
+        tasks = [asyncio.create_task(self.read(dispatcher, 1, 100 + i))
+                 for i in range(4)]
+        tasks += [asyncio.create_task(self.read(dispatcher, unit, 100 * unit))
+                  for unit in (2, 3)]
+        await asyncio.sleep(0)
+        self.assertEqual(dispatcher.queued(1), 3)
+        self.assertEqual(dispatcher.in_flight(1), 1)
+        results = await asyncio.gather(*tasks)
+        self.assertListEqual(results, [100, 101, 102, 103, 200, 300])
+        self.assertListEqual(self.server.requests,
+                             [100, 101, 200, 300, 102, 103])
+
+    async def test_in_flight(self):
+        dispatcher = UnitDispatcher(self.client, max_in_flight=2)
+        tasks = [asyncio.create_task(self.read(dispatcher, 1, i))
+                 for i in range(5)]
+        tasks.append(asyncio.create_task(
+            self.read(dispatcher, 1, 100, priority=HIGH_PRIORITY)))
+        await asyncio.sleep(0)
+        self.assertEqual(dispatcher.in_flight(1), 2)
+        self.assertEqual(dispatcher.queued(1), 4)
+        await asyncio.gather(*tasks)
+        self.assertListEqual(self.server.requests[:3], [0, 1, 100])
+        self.assertEqual(dispatcher.in_flight(1), 0)
+
+    async def test_dead_unit(self):
+        self.server.silent.add(9)
+        dispatcher = UnitDispatcher(self.client, timeout=0.1)
+        dead = [asyncio.create_task(self.read(dispatcher, 9, i))
+                for i in range(2)]
+        healthy = await asyncio.gather(
+            *[self.read(dispatcher, 1, i) for i in range(5)])
+        self.assertListEqual(healthy, list(range(5)))
+        # second request to the dead unit has not been sent yet
+        self.assertEqual(self.server.requests.count(0), 2)
+        for task in dead:
+            with self.assertRaises(asyncio.TimeoutError):
+                await task
+        self.assertEqual(dispatcher.in_flight(9), 0)
+
+    async def test_cancel(self):
+        dispatcher = UnitDispatcher(self.client, max_total=1)
+        tasks = [asyncio.create_task(self.read(dispatcher, unit, unit))
+                 for unit in (1, 2, 3)]
+        await asyncio.sleep(0)
+        tasks[1].cancel()
+        self.assertListEqual(await asyncio.gather(tasks[0], tasks[2]), [1, 3])
+        self.assertEqual(dispatcher.queued(2), 0)
+        self.assertListEqual(self.server.requests, [1, 3])
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(UnitDispatcherTestCase)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
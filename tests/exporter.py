@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+from modbusclient import (
+    ApiWrapper,
+    AtomicType,
+    Cache,
+    ClientMetrics,
+    Payload,
+    PrometheusExporter
+)
+from modbusclient.asyncio import MetricsServer
+from modbusclient.error_codes import ILLEGAL_DATA_ADDRESS, ModbusError
+from modbusclient.functions import READ_HOLDING_REGISTERS
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+
+def samples(text):
+    """Get samples of rendered metrics by name including labels"""
+    return dict(line.rsplit(" ", 1) for line in text.splitlines()
+                if not line.startswith("#"))
+
+
+class PrometheusExporterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.
+        self.metrics = ClientMetrics(clock=lambda: self.now)
+        self.exporter = PrometheusExporter()
+
+    def record(self):
+        metrics = self.metrics
+        for elapsed in (0.01, 0.02):
+            started = metrics.begin()
+            self.now += elapsed
+            metrics.sent(12)
+            metrics.end(READ_HOLDING_REGISTERS, 1, started)
+        started = metrics.begin()
+        metrics.fail(READ_HOLDING_REGISTERS, 1, started,
+                     ModbusError(ILLEGAL_DATA_ADDRESS))
+        metrics.begin()
+        metrics.fail(READ_HOLDING_REGISTERS, 1, started, TimeoutError())
+        metrics.retry()
+        metrics.reconnect()
+        metrics.reconnect()
+
+    def test_render(self):
+        self.record()
+        self.exporter.add(self.metrics, device='pv "east"')
+        text = self.exporter.render()
+        self.assertTrue(text.endswith("\n"))
+        self.assertIn("# TYPE modbus_requests_total counter\n", text)
+        self.assertIn("# TYPE modbus_request_duration_seconds summary\n",
+                      text)
+
+        values = samples(text)
+        device = 'device="pv \\"east\\""'
+        series = f'{device},function="3",unit="1"'
+        self.assertEqual(values[f"modbus_requests_total{{{device}}}"], "2")
+        self.assertEqual(values[f"modbus_sent_bytes_total{{{device}}}"], "24")
+        self.assertEqual(values[f"modbus_reconnects_total{{{device}}}"], "2")
+        self.assertEqual(
+            values[f"modbus_connect_retries_total{{{device}}}"], "1")
+        self.assertEqual(values[f"modbus_timeouts_total{{{device}}}"], "1")
+        self.assertEqual(values[f"modbus_requests_in_flight{{{device}}}"],
+                         "0")
+        self.assertEqual(values[f'modbus_errors_total{{{device},code="2"}}'],
+                         "1")
+        self.assertEqual(
+            values[f"modbus_request_duration_seconds_count{{{series}}}"], "3")
+        self.assertAlmostEqual(
+            float(values[f'modbus_request_duration_seconds{{{series},'
+                         f'quantile="0.999"}}']), 0.02)
+
+    def test_sources(self):
+        wrapper = ApiWrapper(metrics=self.metrics)
+        self.exporter.add(wrapper, device="a")
+        self.exporter.add(ApiWrapper(), device="b")
+        cache = Cache()
+        cache[Payload(AtomicType("H"), address=0)] = 1
+        for i in range(3):
+            cache.get(Payload(AtomicType("H"), address=i))
+        self.exporter.add_cache(cache, device="a")
+
+        values = samples(self.exporter.render())
+        self.assertIn('modbus_requests_total{device="a"}', values)
+        self.assertNotIn('modbus_requests_total{device="b"}', values)
+        self.assertEqual(values['modbus_cache_hits_total{device="a"}'], "1")
+        self.assertEqual(values['modbus_cache_misses_total{device="a"}'], "2")
+        self.assertEqual(values['modbus_cache_entries{device="a"}'], "1")
+        self.assertAlmostEqual(
+            float(values['modbus_cache_hit_ratio{device="a"}']), 1 / 3)
+
+        self.exporter.remove(wrapper)
+        self.exporter.remove(cache)
+        self.assertDictEqual(samples(self.exporter.render()), dict())
+
+    def test_write(self):
+        self.exporter.add(self.metrics)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "modbus.prom")
+            self.exporter.write(path)
+            self.exporter.write(path)
+            self.assertListEqual(os.listdir(tmp), ["modbus.prom"])
+            with open(path) as f:
+                self.assertEqual(f.read(), self.exporter.render())
+
+
+class MetricsServerTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.exporter = PrometheusExporter()
+        self.exporter.add(ClientMetrics(), device="a")
+        self.server = MetricsServer(self.exporter)
+        self.port = await self.server.start(port=0)
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+
+    async def get(self, request):
+        reader, writer = await asyncio.open_connection("127.0.0.1",
+                                                       self.port)
+        writer.write(request)
+        response = await reader.read()
+        writer.close()
+        head, body = response.split(b"\r\n\r\n", 1)
+        return head.decode().split("\r\n"), body.decode()
+
+    async def test_get(self):
+        head, body = await self.get(b"GET /metrics HTTP/1.1\r\n"
+                                    b"Host: localhost\r\n\r\n")
+        self.assertEqual(head[0], "HTTP/1.1 200 OK")
+        self.assertIn("Content-Type: text/plain; version=0.0.4; "
+                      "charset=utf-8", head)
+        self.assertEqual(body, self.exporter.render())
+
+        head, body = await self.get(b"HEAD /metrics?x=1 HTTP/1.1\r\n\r\n")
+        self.assertEqual(head[0], "HTTP/1.1 200 OK")
+        self.assertEqual(body, "")
+        self.assertEqual(self.server.scrapes, 2)
+
+        head, body = await self.get(b"GET / HTTP/1.1\r\n\r\n")
+        self.assertEqual(head[0], "HTTP/1.1 404 Not Found")
+        head, body = await self.get(b"POST /metrics HTTP/1.1\r\n\r\n")
+        self.assertEqual(head[0], "HTTP/1.1 405 Method Not Allowed")
+        self.assertEqual(self.server.scrapes, 2)
+
+    async def test_stop(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1",
+                                                       self.port)
+        writer.write(b"GET /metrics HTTP/1.1\r\n")
+        await asyncio.sleep(0.01)
+        await self.server.stop()
+        self.assertEqual(await reader.read(), b"")
+        writer.close()
+
+
+def suite():
+    suite = unittest.TestSuite()
+    for case in (PrometheusExporterTestCase, MetricsServerTestCase):
+        suite.addTests(unittest.TestLoader().loadTestsFromTestCase(case))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+from modbusclient import Payload, AtomicType
+from modbusclient.asyncio import Device, FleetPoller
+from modbusclient.breaker import CircuitBreaker, CircuitOpenError
+from tests.asyncio_client import Server
+
+import asyncio
+import socket
+import unittest
+
+
+class FleetPollerTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        dtype = AtomicType("H")
+        self.api = {
+            "a": Payload(dtype, 100, name="a"),
+            "b": Payload(dtype, 101, name="b"),
+            "c": Payload(dtype, 105, name="c", poll_interval=10.)
+        }
+        self.servers = [Server() for i in range(3)]
+        self.ports = [await server.start() for server in self.servers]
+
+    async def asyncTearDown(self):
+        for server in self.servers:
+            await server.stop()
+
+    def test_construction(self):
+        devices = [Device("127.0.0.1", port, api=self.api)
+                   for port in self.ports]
+        poller = FleetPoller(devices, max_concurrency=2, max_connections=2)
+        self.assertEqual(poller.devices, tuple(devices))
+        self.assertEqual(poller.connections, 0)
+        self.assertFalse(poller.is_running())
+        self.assertRaises(ValueError, FleetPoller, devices,
+                          max_concurrency=2, max_connections=1)
+        self.assertEqual(len(devices[0].payloads()), 3)
+        device = Device("127.0.0.1", api=self.api, selection=("a",))
+        self.assertEqual(device.payloads(), (self.api["a"],))
+
+    async def test_poll(self):
+        devices = [Device("127.0.0.1", port, unit=unit, api=self.api)
+                   for port in self.ports for unit in (1, 2)]
+        counts = {device: 0 for device in devices}
+        async with FleetPoller(devices, interval=0.05) as poller:
+            async for snapshot in poller:
+                self.assertIsNone(snapshot.error)
+                if counts[snapshot.device] == 0:
+                    self.assertDictEqual(snapshot.values,
+                                         {msg: msg.address
+                                          for msg in self.api.values()})
+                else:
+                    self.assertDictEqual(snapshot.values,
+                                         {self.api["a"]: 100,
+                                          self.api["b"]: 101})
+                counts[snapshot.device] += 1
+                if min(counts.values()) == 2:
+                    break
+            # devices sharing host and port share a connection
+            self.assertEqual(poller.connections, 3)
+        self.assertEqual(poller.connections, 0)
+        self.assertFalse(poller.is_running())
+        # blocks 100:102 and 105:106 in first cycle
+        for server in self.servers:
+            self.assertIn(105, server.requests)
+            self.assertEqual(server.requests.count(105), 2)
+
+    async def test_connection_budget(self):
+        devices = [Device("127.0.0.1", port, api=self.api)
+                   for port in self.ports]
+        poller = FleetPoller(devices,
+                             interval=0.01,
+                             max_concurrency=1,
+                             max_connections=1)
+        n = 0
+        async for snapshot in poller:
+            self.assertIsNone(snapshot.error)
+            self.assertLessEqual(poller.connections, 1)
+            n += 1
+            if n == 6:
+                break
+        await poller.stop()
+        self.assertGreaterEqual(poller.statistics.cycles, 6)
+
+    async def test_unreachable(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        dead = Device("127.0.0.1", port, api=self.api, name="dead")
+        alive = Device("127.0.0.1", self.ports[0], api=self.api)
+        errors = 0
+        values = 0
+        async with FleetPoller([dead, alive], interval=0.02,
+                               timeout=0.1) as poller:
+            async for snapshot in poller:
+                if snapshot.device is dead:
+                    self.assertIsInstance(snapshot.error, OSError)
+                    self.assertDictEqual(snapshot.values, {})
+                    errors += 1
+                else:
+                    values += 1
+                if errors >= 2 and values >= 2:
+                    break
+        self.assertGreaterEqual(poller.statistics.errors, 2)
+
+    async def test_shared_connection(self):
+        server = Server(delay=0.02)
+        port = await server.start()
+        server.illegal.add(105)
+        bad = Device("127.0.0.1", port, unit=1, api=self.api, name="bad")
+        good = Device("127.0.0.1", port, unit=2, api=self.api,
+                      selection=("a", "b"), name="good")
+        counts = {bad: 0, good: 0}
+
+        async def consume(poller):
+            async for snapshot in poller:
+                if snapshot.device is good:
+                    self.assertIsNone(snapshot.error)
+                counts[snapshot.device] += 1
+                if min(counts.values()) >= 5:
+                    return
+
+        try:
+            async with FleetPoller([bad, good], interval=0.01,
+                                   max_concurrency=4) as poller:
+                await asyncio.wait_for(consume(poller), 5.)
+                self.assertTrue(all(not task.done()
+                                    for task in poller._tasks))
+                self.assertEqual(len(server.writers), 1)
+        finally:
+            await server.stop()
+        self.assertEqual(poller.statistics.errors, 1)
+
+    async def test_cancel(self):
+        server = Server(delay=0.2)
+        port = await server.start()
+        device = Device("127.0.0.1", port, api=self.api)
+        try:
+            async with FleetPoller([device], interval=0.01) as poller:
+                while not server.requests:
+                    await asyncio.sleep(0.01)
+                # Closing the connection fails the call pending
+                client, = poller._connections.values()
+                client.disconnect()
+                async for snapshot in poller:
+                    break
+                self.assertIsInstance(snapshot.error, ConnectionAbortedError)
+
+                # Cancelling the workers is not mistaken for a closed
+                # connection
+                while len(server.requests) < 2:
+                    await asyncio.sleep(0.01)
+                workers = poller._tasks[1:]
+                for task in workers:
+                    task.cancel()
+                await asyncio.wait(workers, timeout=1.)
+                self.assertTrue(all(task.cancelled() for task in workers))
+        finally:
+            await server.stop()
+        self.assertEqual(poller.statistics.errors, 1)
+
+    async def test_breaker(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        dead = Device("127.0.0.1", port, api=self.api)
+        errors = []
+        async with FleetPoller([dead], interval=0.01,
+                               breaker=lambda: CircuitBreaker(2, 60.)) as poller:
+            async for snapshot in poller:
+                errors.append(snapshot.error)
+                if len(errors) == 4:
+                    break
+        self.assertIsInstance(errors[0], ConnectionRefusedError)
+        self.assertIsInstance(errors[1], ConnectionRefusedError)
+        self.assertIsInstance(errors[2], CircuitOpenError)
+        self.assertIsInstance(errors[3], CircuitOpenError)
+        self.assertEqual(poller.breaker(dead).rejected, 2)
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(FleetPollerTestCase)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
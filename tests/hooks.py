@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+from modbusclient import Client, Hooks
+from modbusclient.asyncio import Client as AsyncClient
+from modbusclient.error_codes import ModbusError
+from modbusclient.functions import READ_HOLDING_REGISTERS
+from modbusclient.protocol import NO_UNIT
+
+from tests.asyncio_client import Server, ServerThread
+
+import asyncio
+import unittest
+
+# 7 bytes MBAP header, function code, start address and count
+REQUEST_SIZE = 12
+# 7 bytes MBAP header, function code, size and two registers
+RESPONSE_SIZE = 13
+
+
+class Recorder:
+    """Hooks recording all events"""
+
+    def __init__(self):
+        self.events = []
+        self.hooks = Hooks(on_request=self.frame("request"),
+                           on_response=self.frame("response"),
+                           on_error=self.error,
+                           on_reconnect=self.reconnect,
+                           clock=lambda: 1.5)
+
+    def frame(self, event):
+        def hook(header, frame, timestamp):
+            self.assertIsMemoryview(frame)
+            self.events.append((event, header.transaction, bytes(frame),
+                                timestamp))
+        return hook
+
+    @staticmethod
+    def assertIsMemoryview(frame):
+        if not isinstance(frame, memoryview) or not frame.readonly:
+            raise TypeError("Expected read-only memoryview", frame)
+
+    def error(self, function, unit, exc, timestamp):
+        self.events.append(("error", function, unit, type(exc)))
+
+    def reconnect(self, host, port, attempt, timestamp):
+        self.events.append(("reconnect", attempt))
+
+    def of(self, event):
+        return [e for e in self.events if e[0] == event]
+
+
+class HooksTestCase(unittest.TestCase):
+
+    def test_register(self):
+        hooks = Hooks()
+        calls = []
+
+        @hooks.on_error
+        def first(*args):
+            calls.append("first")
+            raise RuntimeError("Broken hook")
+
+        hooks.on_error(lambda *args: calls.append("second"))
+        with self.assertLogs("modbusclient", "ERROR"):
+            hooks.error(READ_HOLDING_REGISTERS, 1, OSError())
+        self.assertListEqual(calls, ["first", "second"])
+
+        hooks.unregister(first)
+        hooks.error(READ_HOLDING_REGISTERS, 1, OSError())
+        self.assertListEqual(calls, ["first", "second", "second"])
+        self.assertRaises(ValueError, hooks.register, "send", first)
+
+
+class SyncHooksTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server()
+        self.thread = ServerThread(self.server)
+        (host, port), = self.thread.start()
+        self.recorder = Recorder()
+        self.client = Client(host, port, timeout=1.,
+                             hooks=self.recorder.hooks)
+
+    def tearDown(self):
+        self.client.disconnect()
+        self.thread.stop()
+
+    def test_call(self):
+        self.server.illegal.add(10)
+        for start in (0, 10):
+            self.client.call(READ_HOLDING_REGISTERS, start=start, count=2,
+                             transaction=start)
+        requests = self.recorder.of("request")
+        responses = self.recorder.of("response")
+        self.assertListEqual([e[1] for e in requests], [0, 10])
+        self.assertListEqual([len(e[2]) for e in requests], 2 * [REQUEST_SIZE])
+        self.assertListEqual([len(e[2]) for e in responses],
+                             [RESPONSE_SIZE, 9])
+        self.assertEqual(responses[0][2][-4:], b"\x00\x00\x00\x01")
+        self.assertEqual(responses[0][3], 1.5)
+        self.assertListEqual(self.recorder.of("error"),
+                             [("error", READ_HOLDING_REGISTERS, NO_UNIT,
+                               ModbusError)])
+
+        self.client.connect()
+        self.client.connect()
+        self.assertListEqual(self.recorder.of("reconnect"),
+                             [("reconnect", 2), ("reconnect", 3)])
+
+
+class AsyncHooksTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = Server(silent=[2])
+        self.recorder = Recorder()
+        self.client = AsyncClient("127.0.0.1",
+                                  await self.server.start(),
+                                  timeout=0.2,
+                                  max_retries=3,
+                                  retry_delay=0.001,
+                                  hooks=self.recorder.hooks)
+
+    async def asyncTearDown(self):
+        self.client.disconnect()
+        await self.server.stop()
+
+    async def read(self, start=0, unit=1):
+        return await self.client.call(READ_HOLDING_REGISTERS,
+                                      start=start,
+                                      count=2,
+                                      unit=unit)
+
+    async def test_call(self):
+        await asyncio.gather(*(self.read(i) for i in range(3)))
+        self.server.illegal.add(10)
+        with self.assertRaises(ModbusError):
+            await self.read(10)
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.read(unit=2)
+
+        self.assertEqual(len(self.recorder.of("request")), 5)
+        responses = self.recorder.of("response")
+        self.assertListEqual(sorted(len(e[2]) for e in responses),
+                             [9] + 3 * [RESPONSE_SIZE])
+        self.assertListEqual(self.recorder.of("error"), [
+            ("error", READ_HOLDING_REGISTERS, 1, ModbusError),
+            ("error", READ_HOLDING_REGISTERS, 2, asyncio.TimeoutError)
+        ])
+        self.assertListEqual(self.recorder.of("reconnect"), [])
+
+    async def test_reconnect(self):
+        await self.server.stop()
+        with self.assertRaises(OSError):
+            await self.read()
+        self.assertListEqual(self.recorder.of("reconnect"),
+                             [("reconnect", 2), ("reconnect", 3)])
+        self.assertListEqual(self.recorder.of("error"),
+                             [("error", READ_HOLDING_REGISTERS, 1,
+                               ConnectionRefusedError)])
+
+
+def suite():
+    suite = unittest.TestSuite()
+    for case in (HooksTestCase, SyncHooksTestCase, AsyncHooksTestCase):
+        suite.addTests(unittest.TestLoader().loadTestsFromTestCase(case))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+from modbusclient import ApiWrapper, AtomicType, Client, ClientMetrics
+from modbusclient import Histogram, Hooks, Payload, PhaseProfile
+from modbusclient.asyncio import ApiWrapper as AsyncApiWrapper
+from modbusclient.asyncio import Client as AsyncClient
+from modbusclient.blocks import plan_blocks
+from modbusclient.error_codes import ILLEGAL_DATA_ADDRESS, ModbusError
+from modbusclient.functions import READ_HOLDING_REGISTERS
+from modbusclient.metrics import PHASES
+from modbusclient.protocol import NO_UNIT
+
+from tests.asyncio_client import Server, ServerThread
+
+import asyncio
+import math
+import time
+import unittest
+
+# 7 bytes MBAP header, function code, start address and count
+REQUEST_SIZE = 12
+# 7 bytes MBAP header, function code, size and two registers
+RESPONSE_SIZE = 13
+
+
+class HistogramTestCase(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = Histogram(resolution=1e-6, precision=6)
+        self.assertTrue(math.isnan(histogram.percentile(50)))
+        for i in range(1, 10001):
+            histogram.record(i * 1e-6)
+        self.assertEqual(len(histogram), 10000)
+        self.assertAlmostEqual(histogram.sum, 50.005)
+        self.assertEqual(histogram.min, 1e-6)
+        self.assertEqual(histogram.max, 0.01)
+        for q in (1, 50, 90, 99, 99.9):
+            with self.subTest(q=q):
+                expected = q * 1e-6 * 100
+                self.assertLessEqual(abs(histogram.percentile(q) - expected),
+                                     expected / 32)
+        self.assertEqual(histogram.percentile(100), 0.01)
+        # values below 2**precision units are resolved to the resolution
+        self.assertAlmostEqual(histogram.percentile(0.5), 50e-6, delta=1e-6)
+        bounds, totals = zip(*histogram.buckets())
+        self.assertListEqual(list(bounds), sorted(bounds))
+        self.assertEqual(totals[-1], 10000)
+        self.assertLess(len(bounds), 300)
+
+    def test_merge(self):
+        first, second = Histogram(), Histogram()
+        first.record(1e-3)
+        second.record(2e-3)
+        second.record(-1.)
+        first.merge(second)
+        self.assertEqual(first.count, 3)
+        self.assertEqual((first.min, first.max), (-1., 2e-3))
+        self.assertEqual(first.percentile(1), 1e-6)
+        self.assertRaises(ValueError, first.merge, Histogram(precision=4))
+        self.assertRaises(ValueError, Histogram, precision=0)
+
+
+class ClientMetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.
+        self.metrics = ClientMetrics(clock=lambda: self.now)
+
+    def test_calls(self):
+        metrics = self.metrics
+        started = metrics.begin()
+        metrics.begin()
+        self.assertEqual(metrics.in_flight, 2)
+        self.now = 0.25
+        metrics.end(3, 1, started)
+        metrics.fail(3, 1, started, ModbusError(ILLEGAL_DATA_ADDRESS))
+        self.assertEqual(metrics.in_flight, 0)
+        for exc in (asyncio.TimeoutError(), TimeoutError(), OSError()):
+            metrics.begin()
+            metrics.fail(4, 2, started, exc)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["latency"][3, 1]["count"], 2)
+        self.assertEqual(snapshot["latency"][3, 1]["max"], 0.25)
+        self.assertDictEqual(snapshot["errors"], {ILLEGAL_DATA_ADDRESS: 1})
+        self.assertEqual((snapshot["timeouts"], snapshot["failures"]), (2, 1))
+        self.assertNotIn((4, 2), snapshot["latency"])
+
+        metrics.begin()
+        metrics.reset()
+        self.assertEqual(metrics.timeouts, 0)
+        self.assertDictEqual(metrics.snapshot()["latency"], {})
+        self.assertEqual(metrics.in_flight, 1)
+
+
+class AsyncClientMetricsTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = Server(delay=0.01, silent=[2])
+        self.metrics = ClientMetrics()
+        self.client = AsyncClient("127.0.0.1",
+                                  await self.server.start(),
+                                  timeout=0.2,
+                                  metrics=self.metrics)
+
+    async def asyncTearDown(self):
+        self.client.disconnect()
+        await self.server.stop()
+
+    async def read(self, start=0, unit=1):
+        return await self.client.call(READ_HOLDING_REGISTERS,
+                                      start=start,
+                                      count=2,
+                                      unit=unit)
+
+    async def test_stats(self):
+        self.assertIsNone(AsyncClient().stats())
+        await asyncio.gather(*(self.read(i) for i in range(3)))
+        self.server.illegal.add(10)
+        with self.assertRaises(ModbusError):
+            await self.read(10)
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.read(unit=2)
+
+        stats = self.client.stats()
+        self.assertEqual(stats["requests"], 5)
+        self.assertEqual(stats["responses"], 4)
+        self.assertEqual(stats["in_flight"], 0)
+        self.assertEqual(stats["bytes_sent"], 5 * REQUEST_SIZE)
+        self.assertEqual(stats["bytes_received"], 3 * RESPONSE_SIZE + 9)
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertDictEqual(stats["errors"], {ILLEGAL_DATA_ADDRESS: 1})
+        latency = stats["latency"][READ_HOLDING_REGISTERS, 1]
+        self.assertEqual(latency["count"], 4)
+        self.assertGreaterEqual(latency["min"], 0.01)
+        self.assertNotIn((READ_HOLDING_REGISTERS, 2), stats["latency"])
+
+    async def test_reconnects(self):
+        await self.read()
+        self.client.disconnect()
+        await self.read()
+        self.assertEqual(self.metrics.reconnects, 1)
+        self.assertEqual(self.metrics.retries, 0)
+
+    async def test_retries(self):
+        await self.server.stop()
+        client = AsyncClient("127.0.0.1", self.client._port, timeout=0.2,
+                             max_retries=3, retry_delay=0.001,
+                             metrics=self.metrics)
+        with self.assertRaises(OSError):
+            await self.read()
+        with self.assertRaises(OSError):
+            await client.call(READ_HOLDING_REGISTERS, start=0, count=2)
+        self.assertEqual(self.metrics.retries, 4 + 2)
+        self.assertEqual(self.metrics.reconnects, 4 + 2)
+        self.assertEqual(self.metrics.failures, 2)
+        self.assertEqual(self.metrics.in_flight, 0)
+
+
+class ClientMetricsSyncTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server()
+        self.thread = ServerThread(self.server)
+        (host, port), = self.thread.start()
+        self.client = Client(host, port, timeout=1., metrics=ClientMetrics())
+
+    def tearDown(self):
+        self.client.disconnect()
+        self.thread.stop()
+
+    def test_stats(self):
+        self.assertIsNone(Client().stats())
+        self.server.illegal.add(10)
+        for start in (0, 10):
+            self.client.call(READ_HOLDING_REGISTERS, start=start, count=2)
+        stats = self.client.stats()
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["bytes_sent"], 2 * REQUEST_SIZE)
+        self.assertEqual(stats["bytes_received"], RESPONSE_SIZE + 9)
+        self.assertDictEqual(stats["errors"], {ILLEGAL_DATA_ADDRESS: 1})
+        latency = stats["latency"][READ_HOLDING_REGISTERS, NO_UNIT]
+        self.assertEqual(latency["count"], 2)
+
+        self.client.disconnect()
+        self.assertRaises(RuntimeError, self.client.call,
+                          READ_HOLDING_REGISTERS, start=0, count=2)
+        self.assertEqual(self.client.stats()["failures"], 1)
+        self.assertEqual(self.client.stats()["in_flight"], 0)
+
+        # Reconnects after a lost connection are counted, too
+        self.client.connect()
+        self.assertEqual(self.client.stats()["reconnects"], 1)
+        self.assertEqual(self.client.stats()["retries"], 0)
+
+
+class PhaseProfileTestCase(unittest.TestCase):
+
+    def test_record(self):
+        self.now = 0.
+        profile = PhaseProfile(clock=lambda: self.now)
+        msg = Payload(AtomicType("i"), address=10)
+        key = profile.key(1, msg.reader, 10, 2)
+
+        def decode(value):
+            self.now += 0.5
+            return value
+
+        self.assertEqual(profile.measure(key, "decode", decode, 7), 7)
+        profile.record(key, "wait", 0.25)
+        self.assertEqual(profile.of_payload(msg, unit=1)["decode"].sum, 0.5)
+        self.assertDictEqual(profile.of_payload(msg), dict())
+        self.assertListEqual(list(profile.totals()), list(PHASES))
+        self.assertEqual(profile.totals()["wait"], 0.25)
+        self.assertEqual(profile.summary()[key]["wait"]["count"], 1)
+        profile.reset()
+        self.assertDictEqual(profile.summary(), dict())
+
+
+class PhaseProfileSyncTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server()
+        self.thread = ServerThread(self.server)
+        (self.host, self.port), = self.thread.start()
+
+    def tearDown(self):
+        self.thread.stop()
+
+    def test_wrapper(self):
+        api = {"a": Payload(AtomicType("H"), address=0),
+               "b": Payload(AtomicType("I"), address=1)}
+        profile = PhaseProfile()
+        metrics = ClientMetrics()
+        with ApiWrapper(api, host=self.host, port=self.port, timeout=1.,
+                        profile=profile) as wrapper:
+            wrapper._client.metrics = metrics
+            values = wrapper.read()
+            self.assertDictEqual(values, {api["a"]: 0, api["b"]: 0x10002})
+            block, = plan_blocks(api.values())
+            wrapper.get_block(block)
+
+        phases = profile.of_payload(api["b"])
+        self.assertSetEqual(set(phases), set(PHASES))
+        self.assertTrue(all(h.count == 1 for h in phases.values()))
+        self.assertEqual(profile.of_block(block)["decode"].count, 1)
+        self.assertEqual(len(profile.phases), 3)
+        self.assertEqual(metrics.bytes_received, 3 * 9 + 2 + 4 + 6)
+
+    def test_hooks(self):
+        # Time spent in hooks is not attributed to parsing
+        hooks = Hooks(on_response=lambda *args: time.sleep(0.05))
+        client = Client(self.host, self.port, timeout=1.,
+                        profile=PhaseProfile(), hooks=hooks)
+        client.call(READ_HOLDING_REGISTERS, start=0, count=2)
+        client.disconnect()
+        key = (NO_UNIT, READ_HOLDING_REGISTERS, 0, 2)
+        self.assertLess(client.profile.phases[key]["parse"].max, 0.05)
+
+
+class PhaseProfileAsyncTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = Server(delay=0.01)
+        self.port = await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+
+    async def test_wrapper(self):
+        api = {f"value_{i}": Payload(AtomicType("H"), address=i)
+               for i in range(4)}
+        profile = PhaseProfile()
+        wrapper = AsyncApiWrapper(api, host="127.0.0.1", port=self.port,
+                                  timeout=1., max_transactions=4,
+                                  profile=profile)
+        await wrapper.connect()
+        try:
+            values = await wrapper.read()
+        finally:
+            wrapper.disconnect()
+
+        self.assertDictEqual(values, {api[f"value_{i}"]: i for i in range(4)})
+        for msg in api.values():
+            with self.subTest(msg=msg):
+                phases = profile.of_payload(msg)
+                self.assertSetEqual(set(phases), set(PHASES))
+                self.assertGreaterEqual(phases["wait"].min, 0.009)
+        self.assertGreater(profile.totals()["wait"],
+                           profile.totals()["parse"])
+
+    async def test_disabled(self):
+        client = AsyncClient("127.0.0.1", self.port, timeout=1.)
+        await client.call(READ_HOLDING_REGISTERS, start=0, count=2)
+        client.profile = PhaseProfile()
+        await client.call(READ_HOLDING_REGISTERS, start=0, count=2)
+        client.disconnect()
+        key = (NO_UNIT, READ_HOLDING_REGISTERS, 0, 2)
+        self.assertEqual(client.profile.phases[key]["parse"].count, 1)
+        self.assertNotIn("decode", client.profile.phases[key])
+
+    async def test_hooks(self):
+        # Time spent in hooks is not attributed to parsing
+        hooks = Hooks(on_response=lambda *args: time.sleep(0.05))
+        client = AsyncClient("127.0.0.1", self.port, timeout=1.,
+                             profile=PhaseProfile(), hooks=hooks)
+        await client.call(READ_HOLDING_REGISTERS, start=0, count=2)
+        client.disconnect()
+        key = (NO_UNIT, READ_HOLDING_REGISTERS, 0, 2)
+        self.assertLess(client.profile.phases[key]["parse"].max, 0.05)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    for case in (HistogramTestCase,
+                 ClientMetricsTestCase,
+                 AsyncClientMetricsTestCase,
+                 ClientMetricsSyncTestCase,
+                 PhaseProfileTestCase,
+                 PhaseProfileSyncTestCase,
+                 PhaseProfileAsyncTestCase):
+        suite.addTests(unittest.TestLoader().loadTestsFromTestCase(case))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+from modbusclient.multi_client import MultiClient, FrameParser
+from modbusclient.blocks import plan_blocks
+from modbusclient.payload import Payload
+from modbusclient.data_types import AtomicType
+from modbusclient.error_codes import UNIT_MISMATCH
+from modbusclient.functions import READ_HOLDING_REGISTERS
+from modbusclient.protocol import ApplicationProtocolHeader, ReadResponse
+
+from tests.asyncio_client import Server
+
+import asyncio
+import socket
+import struct
+import threading
+import time
+import unittest
+import unittest.mock
+
+
+def response(transaction, start, count, unit=1):
+    data = struct.pack(f"!{count}H", *range(start, start + count))
+    header = ApplicationProtocolHeader(transaction=transaction,
+                                       msglen=3 + len(data),
+                                       unit=unit,
+                                       function=READ_HOLDING_REGISTERS)
+    return header.to_buffer() + ReadResponse(size=len(data)).to_buffer() + data
+
+
+class MultiClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        self.servers = [Server(delay=0.05), Server(delay=0.05, silent=[7])]
+        self.addresses = [("127.0.0.1", self.run_in_loop(server.start()))
+                          for server in self.servers]
+
+    def tearDown(self):
+        for server in self.servers:
+            self.run_in_loop(server.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def run_in_loop(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def test_frame_parser(self):
+        parser = FrameParser()
+        data = response(1, 100, 2) + response(2, 200, 3)
+        self.assertEqual(parser.feed(data[:5]), [])
+        frames = parser.feed(data[5:15])
+        self.assertEqual(len(frames), 1)
+        header, payload, err_code = frames[0]
+        self.assertEqual(header.transaction, 1)
+        self.assertEqual(payload, struct.pack("!2H", 100, 101))
+        self.assertEqual(err_code, 0)
+        self.assertEqual(len(parser), 2)
+        frames = parser.feed(data[15:])
+        self.assertEqual([f[0].transaction for f in frames], [2])
+        self.assertEqual(len(parser), 0)
+
+    def test_concurrent(self):
+        with MultiClient(timeout=1.) as client:
+            begin = time.monotonic()
+            requests = [client.submit(address,
+                                      READ_HOLDING_REGISTERS,
+                                      unit=1,
+                                      start=10 * i,
+                                      count=2)
+                        for i in range(3) for address in self.addresses]
+            self.assertTrue(client.wait(requests))
+            # All requests are processed concurrently
+            self.assertLess(time.monotonic() - begin, 0.15)
+            self.assertEqual(client.connections, 2)
+            self.assertEqual(client.pending, 0)
+            for i, request in enumerate(requests):
+                header, payload, err_code = request.result()
+                start = 10 * (i // 2)
+                self.assertEqual(err_code, 0)
+                self.assertEqual(payload, struct.pack("!2H", start, start + 1))
+
+    def test_read_blocks(self):
+        api = [Payload(AtomicType("H"), address=5),
+               Payload(AtomicType("H"), address=6)]
+        block, = plan_blocks(api)
+        with MultiClient(timeout=1.) as client:
+            values = client.read_blocks([(address, 1, block)
+                                         for address in self.addresses])
+        self.assertEqual(values, [{api[0]: 5, api[1]: 6}] * 2)
+
+    def test_max_transactions(self):
+        with MultiClient(timeout=1., max_transactions=1) as client:
+            begin = time.monotonic()
+            client.wait([client.submit(self.addresses[0],
+                                       READ_HOLDING_REGISTERS,
+                                       start=i,
+                                       count=1) for i in range(3)])
+            self.assertGreater(time.monotonic() - begin, 0.14)
+        self.assertEqual(self.servers[0].requests, [0, 1, 2])
+
+    def test_unit_mismatch(self):
+        with MultiClient(timeout=1.) as client:
+            request = client.submit(self.addresses[0],
+                                    READ_HOLDING_REGISTERS,
+                                    unit=1,
+                                    start=0,
+                                    count=1)
+            client.wait([request])
+            self.assertEqual(request.result()[2], 0)
+            # Server echoes unit of the request, so tamper with the request
+            request = client.submit(self.addresses[0],
+                                    READ_HOLDING_REGISTERS,
+                                    unit=1,
+                                    start=0,
+                                    count=1)
+            request.header.unit = 2
+            client.wait([request])
+            self.assertEqual(request.result()[2], UNIT_MISMATCH)
+
+    def test_timeout(self):
+        with MultiClient(timeout=0.1) as client:
+            silent = client.submit(self.addresses[1],
+                                   READ_HOLDING_REGISTERS,
+                                   unit=7,
+                                   start=0,
+                                   count=1)
+            other = client.submit(self.addresses[1],
+                                  READ_HOLDING_REGISTERS,
+                                  unit=1,
+                                  start=0,
+                                  count=1)
+            self.assertTrue(client.wait())
+            self.assertRaises(TimeoutError, silent.result)
+            self.assertEqual(other.result()[2], 0)
+            # Connection remains usable
+            self.assertEqual(client.connections, 1)
+            header, payload, err_code = client.call(self.addresses[1],
+                                                    READ_HOLDING_REGISTERS,
+                                                    unit=1,
+                                                    start=3,
+                                                    count=1)
+            self.assertEqual(payload, struct.pack("!H", 3))
+
+    def test_connection_refused(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        address = sock.getsockname()
+        sock.close()
+        with MultiClient(timeout=1.) as client:
+            refused = client.submit(address,
+                                    READ_HOLDING_REGISTERS,
+                                    start=0,
+                                    count=1)
+            ok = client.submit(self.addresses[0],
+                               READ_HOLDING_REGISTERS,
+                               start=0,
+                               count=1)
+            client.wait()
+            self.assertRaises(ConnectionError, refused.result)
+            self.assertEqual(ok.result()[2], 0)
+            self.assertEqual(client.connections, 1)
+
+    def test_resolve(self):
+        port = self.addresses[0][1]
+        with MultiClient(timeout=1.) as client:
+            self.assertRaises(ValueError,
+                              client.submit,
+                              ("localhost", port),
+                              READ_HOLDING_REGISTERS,
+                              start=0,
+                              count=1)
+            self.assertEqual(client.pending, 0)
+        with MultiClient(timeout=1., addresses=[("localhost", port)]) as client:
+            # Host names are not resolved again when connecting
+            with unittest.mock.patch("socket.getaddrinfo") as getaddrinfo:
+                for i in range(2):
+                    request = client.submit(("localhost", port),
+                                            READ_HOLDING_REGISTERS,
+                                            start=i,
+                                            count=1)
+                    client.wait([request])
+                    self.assertEqual(request.result()[2], 0)
+                    client.disconnect(("localhost", port))
+            getaddrinfo.assert_not_called()
+        self.assertEqual(self.servers[0].requests, [0, 1])
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(MultiClientTestCase)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
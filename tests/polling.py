@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+from modbusclient import Payload, AtomicType
+from modbusclient.asyncio import ApiWrapper, Ticker, Scheduler, CostModel
+from modbusclient.blocks import plan_blocks
+
+import unittest
+import unittest.mock as mock
+
+
+class TickerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Set up test parameters
+        """
+        self.now = 10.3
+        self.ticker = Ticker(0.5, clock=lambda: self.now)
+
+    def test_construction(self):
+        self.assertEqual(self.ticker.interval, 0.5)
+        self.assertTrue(self.ticker.align)
+        self.assertIsNone(self.ticker.deadline)
+        self.assertRaises(ValueError, Ticker, 0.)
+
+    def test_aligned(self):
+        self.assertEqual(self.ticker.advance(), 0)
+        self.assertAlmostEqual(self.ticker.deadline, 10.3)
+        self.assertEqual(self.ticker.advance(10.4), 0)
+        self.assertAlmostEqual(self.ticker.deadline, 10.5)
+        self.assertEqual(self.ticker.advance(10.9), 0)
+        self.assertAlmostEqual(self.ticker.deadline, 11.)
+
+    def test_unaligned(self):
+        ticker = Ticker(0.5, align=False, clock=lambda: self.now)
+        ticker.reset()
+        self.assertAlmostEqual(ticker.deadline, 10.3)
+        self.assertEqual(ticker.advance(10.35), 0)
+        self.assertAlmostEqual(ticker.deadline, 10.8)
+
+    def test_overrun(self):
+        self.ticker.advance()
+        self.assertEqual(self.ticker.advance(11.2), 2)
+        self.assertAlmostEqual(self.ticker.deadline, 11.5)
+        self.assertEqual(self.ticker.advance(13.1), 3)
+        self.assertAlmostEqual(self.ticker.deadline, 13.5)
+        self.assertEqual(self.ticker.missed, 5)
+
+    def test_rounding(self):
+        ticker = Ticker(0.1, clock=lambda: self.now)
+        ticker.reset(0.)
+        for i in range(1, 1000):
+            self.assertEqual(ticker.advance(i / 10), 0)
+            self.assertAlmostEqual(ticker.deadline, i / 10)
+
+
+class SchedulerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Set up test parameters
+        """
+        dtype = AtomicType("h")
+        self.msg = [
+            Payload(dtype, 100, poll_interval=0.1),
+            Payload(dtype, 101, poll_interval=1),
+            Payload(dtype, 102),
+            Payload(dtype, 103, poll_interval=60),
+        ]
+        self.now = 0.
+        self.scheduler = Scheduler(self.msg, interval=1.,
+                                   clock=lambda: self.now)
+
+    def test_construction(self):
+        self.assertListEqual(self.scheduler.intervals, [0.1, 1., 60.])
+        self.assertRaises(ValueError, Scheduler, self.msg)
+
+    def test_pop_due(self):
+        blocks, missed = self.scheduler.pop_due()
+        self.assertEqual(missed, 0)
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0].start, 100)
+        self.assertEqual(blocks[0].count, 4)
+
+        self.assertAlmostEqual(self.scheduler.next_deadline(), 0.1)
+        blocks, missed = self.scheduler.pop_due(0.1)
+        self.assertEqual(missed, 0)
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0].payloads, (self.msg[0],))
+
+        blocks, missed = self.scheduler.pop_due(1.05)
+        self.assertEqual(missed, 8)
+        self.assertEqual(blocks[0].payloads, tuple(self.msg[:3]))
+        self.assertAlmostEqual(self.scheduler.next_deadline(), 1.1)
+
+        # plans are reused
+        self.assertIs(self.scheduler.pop_due(1.15)[0],
+                      self.scheduler.pop_due(1.25)[0])
+
+    def test_defer(self):
+        blocks, missed = self.scheduler.pop_due(0.)
+        self.scheduler.defer(blocks)
+        blocks, missed = self.scheduler.pop_due(0.1)
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0].payloads, tuple(self.msg))
+        blocks, missed = self.scheduler.pop_due(0.2)
+        self.assertEqual(blocks[0].payloads, (self.msg[0],))
+
+
+class CostModelTestCase(unittest.TestCase):
+
+    def test_estimate(self):
+        dtype = AtomicType("h")
+        b0, b1 = plan_blocks([Payload(dtype, 100), Payload(dtype, 102)])
+        costs = CostModel(alpha=0.5)
+        self.assertEqual(costs.estimate(b0), 0.)
+        costs.update(b0, 1.)
+        self.assertEqual(costs.estimate(b0), 1.)
+        self.assertEqual(costs.estimate(b1), 1.)
+        costs.update(b0, 2.)
+        self.assertEqual(costs.estimate(b0), 1.5)
+        costs.update(b1, 0.5)
+        self.assertEqual(costs.estimate(b0), 1.5)
+        self.assertEqual(costs.estimate(b1), 0.5)
+        self.assertRaises(ValueError, CostModel, 0.)
+
+
+class PollTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        """Set up test parameters
+        """
+        dtype = AtomicType("h")
+        self.msg = [
+            Payload(dtype, 100, name="a"),
+            Payload(dtype, 101, name="b", mode="rw"),
+            Payload(dtype, 102, name="c", mode="w")
+        ]
+        self.api = {m.name: m for m in self.msg}
+        self.wrapper = ApiWrapper(self.api)
+        self.wrapper._client = mock.AsyncMock()
+
+        async def call(function, start, count, unit):
+            values = range(start, start + count)
+            return None, b"".join(dtype.encode(v) for v in values), 0
+
+        self.wrapper._client.call.side_effect = call
+
+    async def test_multirate(self):
+        fast = Payload(AtomicType("h"), 200, poll_interval=0.01)
+        slow = Payload(AtomicType("h"), 201, poll_interval=10)
+        counts = {fast: 0, slow: 0}
+        async for snapshot in self.wrapper.poll([fast, slow], interval=None):
+            for msg in snapshot.values:
+                counts[msg] += 1
+            if counts[fast] == 3:
+                break
+        self.assertDictEqual(counts, {fast: 3, slow: 1})
+
+    async def test_budget(self):
+        dtype = AtomicType("h")
+        low = Payload(dtype, 300)
+        high = Payload(dtype, 400, priority=1)
+        call = self.wrapper._client.call.side_effect
+        # Latencies are measured by a simulated clock
+        self.now = 0.
+
+        async def slow_call(**kwargs):
+            self.now += 0.02 if kwargs["start"] == 400 else 0.04
+            return await call(**kwargs)
+
+        self.wrapper._client.call.side_effect = slow_call
+        snapshots = []
+        with mock.patch("modbusclient.asyncio.api_wrapper.monotonic",
+                        lambda: self.now):
+            async for snapshot in self.wrapper.poll([low, high],
+                                                    interval=0.1,
+                                                    budget=0.05):
+                snapshots.append(snapshot)
+                if len(snapshots) == 2:
+                    break
+
+        # no estimate available for second block in first cycle
+        self.assertDictEqual(snapshots[0].values, {low: 300, high: 400})
+        self.assertEqual(snapshots[0].skipped, ())
+        self.assertDictEqual(snapshots[1].values, {high: 400})
+        self.assertEqual(snapshots[1].skipped, (low,))
+
+        stats = self.wrapper.poll_statistics
+        self.assertEqual(stats.cycles, 2)
+        self.assertEqual(stats.blocks_read, 3)
+        self.assertEqual(stats.blocks_skipped, 1)
+        self.assertEqual(stats.over_budget, 1)
+        self.assertEqual(stats.skipped[low], 1)
+
+    async def test_poll(self):
+        snapshots = []
+        async for snapshot in self.wrapper.poll(["a", "b", "c"], interval=0.01):
+            snapshots.append(snapshot)
+            if len(snapshots) == 3:
+                break
+
+        # Messages 100 and 101 use different read functions
+        self.assertEqual(self.wrapper._client.call.await_count, 6)
+        for snapshot in snapshots:
+            self.assertDictEqual(snapshot.values,
+                                 {self.msg[0]: 100, self.msg[1]: 101})
+            self.assertEqual(snapshot.missed, 0)
+
+        for s0, s1 in zip(snapshots[:-1], snapshots[1:]):
+            self.assertGreater(s1.timestamp, s0.timestamp)
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite([
+        loader.loadTestsFromTestCase(TickerTestCase),
+        loader.loadTestsFromTestCase(SchedulerTestCase),
+        loader.loadTestsFromTestCase(CostModelTestCase),
+        loader.loadTestsFromTestCase(PollTestCase)
+    ])
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
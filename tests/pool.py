@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+from modbusclient import Payload, AtomicType
+from modbusclient.asyncio import ApiWrapper, ClientPool
+from modbusclient.functions import READ_HOLDING_REGISTERS
+from tests.asyncio_client import Server
+
+import asyncio
+import unittest
+
+
+class ClientPoolTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = Server(delay=0.02)
+        self.port = await self.server.start()
+        self.pool = ClientPool("127.0.0.1", self.port,
+                               size=2,
+                               max_transactions=1,
+                               reconnect_delay=0.01)
+
+    async def asyncTearDown(self):
+        self.pool.disconnect()
+        await self.server.stop()
+
+    async def read(self, start):
+        header, payload, err_code = await self.pool.call(READ_HOLDING_REGISTERS,
+                                                         start=start,
+                                                         count=1)
+        return payload
+
+    async def test_dispatch(self):
+        async with self.pool:
+            self.assertTrue(self.pool.is_connected())
+            self.assertEqual(len(self.server.writers), 2)
+            tasks = [asyncio.create_task(self.read(i)) for i in range(4)]
+            await asyncio.sleep(0)
+            self.assertListEqual(self.pool.load, [2, 2])
+            results = await asyncio.gather(*tasks)
+        self.assertListEqual(results, [i.to_bytes(2, "big") for i in range(4)])
+        self.assertListEqual(self.pool.load, [0, 0])
+        self.assertFalse(self.pool.is_connected())
+
+    async def test_reconnect(self):
+        await self.pool.connect()
+        self.server.writers[0].close()
+        await asyncio.sleep(0.01)
+        # First call on a broken connection fails and triggers a reconnect
+        results = await asyncio.gather(*[self.read(i) for i in range(4)],
+                                       return_exceptions=True)
+        self.assertTrue(any(isinstance(r, bytes) for r in results))
+        while not all(c.is_connected() for c in self.pool.clients):
+            await asyncio.sleep(0.01)
+        self.assertEqual(await self.read(7), b"\x00\x07")
+
+    async def test_reconnect_timeout(self):
+        client = self.pool.clients[0]
+        connect = client.connect
+        failures = [asyncio.TimeoutError(), OSError(), asyncio.TimeoutError()]
+
+        async def flaky_connect():
+            if failures:
+                raise failures.pop(0)
+            await connect()
+
+        client.connect = flaky_connect
+        self.pool._reconnect_later(0)
+        await asyncio.wait_for(self.pool._reconnecting[0], 1.)
+        self.assertListEqual(failures, [])
+        self.assertTrue(client.is_connected())
+        self.assertNotIn(0, self.pool._reconnecting)
+
+    async def test_unavailable(self):
+        await self.pool.connect()
+        await self.server.stop()
+        for writer in list(self.server.writers):
+            writer.close()
+        while self.pool.is_connected():
+            await asyncio.sleep(0.01)
+        for i in range(self.pool.size):
+            self.pool._reconnect_later(i)
+        with self.assertRaises(ConnectionError):
+            await asyncio.wait_for(
+                self.pool.call(READ_HOLDING_REGISTERS, start=0, count=1,
+                               timeout=0.05),
+                1.)
+
+    async def test_api_wrapper(self):
+        msg = Payload(AtomicType("H"), 10, name="value")
+        wrapper = ApiWrapper({"value": msg}, "127.0.0.1", self.port,
+                             connections=3)
+        self.assertIsInstance(wrapper.client, ClientPool)
+        self.assertEqual(wrapper.client.size, 3)
+        async with wrapper:
+            self.assertEqual(await wrapper.get("value"), 10)
+        self.assertRaises(ValueError, ClientPool, size=0)
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(ClientPoolTestCase)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -12,6 +12,8 @@ from modbusclient.protocol import (
     SingleWriteResponse,
     Error,
     new_request,
+    new_response,
+    parse_request_body,
     parse_response_header,
     parse_response_body,
     REQUEST_TYPES,
@@ -20,7 +22,14 @@ from modbusclient.protocol import (
     NO_UNIT,
     DEFAULT_PORT
 )
-from modbusclient.error_codes import ERROR_MESSAGES, NO_ERROR, MESSAGE_SIZE_ERROR
+from modbusclient.error_codes import (
+    ERROR_MESSAGES,
+    NO_ERROR,
+    MESSAGE_SIZE_ERROR,
+    ILLEGAL_DATA_ADDRESS,
+    ILLEGAL_FUNCTION_ERROR,
+    ModbusError
+)
 from modbusclient.functions import (
     READ_HOLDING_REGISTERS,
     READ_INPUT_REGISTERS,
@@ -353,6 +362,61 @@ class TestParseResponse(unittest.TestCase):
                     self.assertEqual(ec, MESSAGE_SIZE_ERROR)
 
 
+class TestServerSide(unittest.TestCase):
+    """Test parse_request_body and new_response functions"""
+
+    def test_request_round_trip(self):
+        """Test parsing requests created by new_request"""
+        cases = [(READ_INPUT_REGISTERS, dict(start=3, count=2), b""),
+                 (WRITE_MULTIPLE_REGISTERS, dict(start=3, count=2), b"1234"),
+                 (WRITE_SINGLE_REGISTER, dict(start=3), b"12")]
+        for func, kwargs, payload in cases:
+            with self.subTest(function=func):
+                header, buffer = new_request(function=func,
+                                             payload=payload,
+                                             **kwargs)
+                hdr = parse_response_header(buffer)
+                self.assertEqual(len(buffer), len(hdr) - 2 + hdr.msglen)
+                request, data = parse_request_body(hdr, buffer[len(hdr):])
+                self.assertEqual(request.start, 3)
+                self.assertEqual(data, payload)
+
+        self.assertRaises(ValueError, new_request, WRITE_SINGLE_REGISTER,
+                          payload=b"1234", start=3, count=2)
+        header, buffer = new_request(WRITE_SINGLE_REGISTER,
+                                     payload=b"12", start=3, count=1)
+        self.assertEqual(header.msglen, 6)
+
+        hdr = ApplicationProtocolHeader(function=99)
+        with self.assertRaises(ModbusError) as ctx:
+            parse_request_body(hdr, b"")
+        self.assertEqual(ctx.exception.args[0], ILLEGAL_FUNCTION_ERROR)
+
+    def test_response_round_trip(self):
+        """Test parsing responses created by new_response"""
+        request = ApplicationProtocolHeader(transaction=7,
+                                            unit=2,
+                                            function=READ_HOLDING_REGISTERS)
+        buffer = new_response(request, b"1234")
+        hdr = parse_response_header(buffer)
+        self.assertEqual((hdr.transaction, hdr.unit), (7, 2))
+        self.assertEqual(len(buffer), len(hdr) - 2 + hdr.msglen)
+        self.assertEqual(parse_response_body(hdr, buffer[len(hdr):]),
+                         (b"1234", NO_ERROR))
+
+        buffer = new_response(request, err_code=ILLEGAL_DATA_ADDRESS)
+        hdr = parse_response_header(buffer)
+        self.assertEqual(hdr.function, READ_HOLDING_REGISTERS | ERROR_FLAG)
+        self.assertEqual(parse_response_body(hdr, buffer[len(hdr):]),
+                         (b"", ILLEGAL_DATA_ADDRESS))
+
+        request.function = WRITE_SINGLE_REGISTER
+        buffer = new_response(request, b"12", start=3)
+        hdr = parse_response_header(buffer)
+        self.assertEqual(parse_response_body(hdr, buffer[len(hdr):]),
+                         (b"12", NO_ERROR))
+
+
 class TestConstants(unittest.TestCase):
     """Test module constants"""
 
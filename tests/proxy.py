@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+from modbusclient.asyncio import Client, Proxy
+from modbusclient.error_codes import (
+    NO_ERROR,
+    ILLEGAL_DATA_ADDRESS,
+    ILLEGAL_DATA_VALUE,
+    GATEWAY_PATH_UNAVAILABLE,
+    ModbusError
+)
+from modbusclient.functions import (
+    READ_HOLDING_REGISTERS,
+    READ_INPUT_REGISTERS,
+    WRITE_MULTIPLE_REGISTERS,
+    WRITE_SINGLE_REGISTER
+)
+
+from tests.asyncio_client import Server
+
+import asyncio
+import socket
+import struct
+import unittest
+
+
+class ProxyTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.now = 0.
+        self.server = Server(delay=0.05)
+        upstream = Client("127.0.0.1", await self.server.start(), timeout=1.)
+        self.proxy = Proxy(upstream, max_age=1., clock=lambda: self.now)
+        self.port = port = await self.proxy.start(port=0)
+        self.clients = [Client("127.0.0.1", port, timeout=1.)
+                        for i in range(3)]
+
+    async def asyncTearDown(self):
+        for client in self.clients:
+            client.disconnect()
+
+        await self.proxy.stop()
+        await self.server.stop()
+
+    async def read(self, client, start, count,
+                   function=READ_HOLDING_REGISTERS, unit=1):
+        try:
+            header, payload, err_code = await client.call(function,
+                                                          start=start,
+                                                          count=count,
+                                                          unit=unit)
+        except ModbusError as exc:
+            return b"", exc.args[0]
+        return payload, err_code
+
+    async def test_merge_and_cache(self):
+        expected = (struct.pack("!2H", 3, 4), NO_ERROR)
+        results = await asyncio.gather(
+            *(self.read(client, 3, 2) for client in self.clients))
+        self.assertListEqual(results, 3 * [expected])
+        self.assertEqual(self.proxy.connections, 3)
+        self.assertListEqual(self.server.requests, [3])
+        self.assertEqual(self.proxy.merged, 2)
+
+        # Served from the image, including sub-ranges
+        self.assertEqual(await self.read(self.clients[0], 3, 2), expected)
+        self.assertEqual(await self.read(self.clients[1], 4, 1),
+                         (struct.pack("!H", 4), NO_ERROR))
+        self.assertEqual(self.proxy.hits, 2)
+        # Other table and expired registers are forwarded
+        await self.read(self.clients[0], 3, 2, READ_INPUT_REGISTERS)
+        self.now = 1.5
+        self.assertEqual(await self.read(self.clients[0], 3, 2), expected)
+        self.assertListEqual(self.server.requests, [3, 3, 3])
+        self.assertEqual(self.proxy.forwarded, 3)
+
+    async def test_write(self):
+        await self.read(self.clients[0], 3, 2)
+        header, payload, err_code = await self.clients[1].call(
+            WRITE_MULTIPLE_REGISTERS,
+            start=4,
+            count=1,
+            payload=struct.pack("!H", 42),
+            unit=1)
+        self.assertEqual(err_code, NO_ERROR)
+        self.assertListEqual(self.server.writes, [(4, (42,))])
+        self.assertEqual(await self.read(self.clients[0], 3, 2),
+                         (struct.pack("!2H", 3, 42), NO_ERROR))
+        self.assertListEqual(self.server.requests, [3, 3])
+
+    async def test_units(self):
+        image = self.proxy.image
+        self.proxy.max_units = 2
+        # Writes do not create tables of units never read
+        await self.clients[0].call(WRITE_MULTIPLE_REGISTERS,
+                                   start=4,
+                                   count=1,
+                                   payload=struct.pack("!H", 42),
+                                   unit=5)
+        self.assertIsNone(image.get(5, READ_HOLDING_REGISTERS))
+        self.assertIsNone(image.get(5, READ_INPUT_REGISTERS))
+
+        for unit in (1, 2, 1, 3):
+            await self.read(self.clients[0], 3, 2, unit=unit)
+        # Unit 2 has been used least recently
+        self.assertIsNone(image.get(2, READ_HOLDING_REGISTERS))
+        for unit in (1, 3):
+            self.assertTrue(image.get(unit, READ_HOLDING_REGISTERS)
+                                 .is_valid(3, 2))
+        self.assertEqual(self.proxy.hits, 1)
+
+    async def test_errors(self):
+        self.server.illegal.add(4)
+        for i in range(2):
+            self.assertEqual(await self.read(self.clients[0], 3, 2),
+                             (b"", ILLEGAL_DATA_ADDRESS))
+        self.assertListEqual(self.server.requests, [3, 3])
+        self.assertEqual(await self.read(self.clients[0], 3, 200),
+                         (b"", ILLEGAL_DATA_VALUE))
+
+        # Single register writes with the wrong number of bytes
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        for data in (b"", b"\x00\x01\x00\x02"):
+            writer.write(struct.pack("!3H2BH", 1, 0, 4 + len(data), 1,
+                                     WRITE_SINGLE_REGISTER, 4) + data)
+            self.assertEqual(await reader.readexactly(9),
+                             struct.pack("!3H3B", 1, 0, 3, 1,
+                                         WRITE_SINGLE_REGISTER | 0x80,
+                                         ILLEGAL_DATA_VALUE))
+        writer.close()
+        self.assertListEqual(self.server.writes, [])
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        upstream = Client("127.0.0.1", port, timeout=1., max_retries=0)
+        async with Proxy(upstream) as proxy:
+            client = Client("127.0.0.1", await proxy.start(port=0), timeout=1.)
+            self.assertEqual(await self.read(client, 3, 1),
+                             (b"", GATEWAY_PATH_UNAVAILABLE))
+            client.disconnect()
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(ProxyTestCase)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+from modbusclient import ApiWrapper, Payload, AtomicType
+from modbusclient import RegisterImage, SharedImage, DeviceImage
+from modbusclient.functions import READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS
+
+from tests.asyncio_client import Server, ServerThread
+
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+import unittest
+import unittest.mock
+
+
+class RegisterImageTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Set up test parameters
+        """
+        self.now = 10.
+        self.image = RegisterImage(size=100, clock=lambda: self.now)
+        self.msg = Payload(AtomicType("I"), address=11, max_age=5.)
+
+    def test_update(self):
+        image = self.image
+        self.assertEqual(len(image), 100)
+        self.assertFalse(image.is_valid(10, 3))
+        image.update(10, struct.pack("!3H", 1, 2, 3))
+        self.assertTrue(image.is_valid(10, 3))
+        self.assertListEqual(image.registers(9, 5), [0, 1, 2, 3, 0])
+        self.assertEqual(image.raw(11, 2), struct.pack("!2H", 2, 3))
+        self.assertEqual(image.decode(self.msg), 0x20003)
+        self.assertRaises(KeyError, image.raw, 9, 2)
+        self.assertRaises(ValueError, image.update, 99, b"\x00" * 4)
+        self.assertRaises(ValueError, image.update, 0, b"\x00")
+
+    def test_age(self):
+        image = self.image
+        image.update(10, struct.pack("!2H", 1, 2))
+        self.now = 12.
+        image.update(12, struct.pack("!H", 3))
+        self.assertEqual(image.timestamp(10, 3), 10.)
+        self.assertEqual(image.timestamp(12), 12.)
+        self.now = 16.
+        # max_age of the payload applies by default
+        self.assertRaises(KeyError, image.decode, self.msg)
+        self.assertEqual(image.decode(self.msg, max_age=6.), 0x20003)
+        self.assertTrue(image.is_valid(12, max_age=4.))
+        image.invalidate(12)
+        self.assertFalse(image.is_valid(12))
+        self.assertTrue(image.is_valid(10, 2))
+
+
+class DeviceImageTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server()
+        self.thread = ServerThread(self.server)
+        (host, port), = self.thread.start()
+        self.now = 0.
+        self.image = DeviceImage(size=100, clock=lambda: self.now)
+        self.msg = [Payload(AtomicType("I"), address=3),
+                    Payload(AtomicType("H"), address=4, max_age=1.),
+                    Payload(AtomicType("H"), address=4, mode="rw")]
+        self.wrapper = ApiWrapper({i: msg for i, msg in enumerate(self.msg)},
+                                  host=host,
+                                  port=port,
+                                  timeout=1.,
+                                  connect=True,
+                                  unit=2,
+                                  image=self.image)
+
+    def tearDown(self):
+        self.wrapper.disconnect()
+        self.thread.stop()
+
+    def test_shared_reads(self):
+        self.assertIs(self.wrapper.image, self.image)
+        self.assertEqual(self.wrapper.get(0), 0x30004)
+        table = self.image.table(2, READ_INPUT_REGISTERS)
+        self.assertListEqual(table.registers(3, 2), [3, 4])
+        self.assertEqual(self.image.decode(2, self.msg[1]), 4)
+        # Holding registers are stored in a separate table
+        self.assertRaises(KeyError, self.image.decode, 2, self.msg[2])
+        self.assertFalse(self.image.table(2, READ_HOLDING_REGISTERS)
+                                    .is_valid(4))
+        self.assertDictEqual(self.image.decode_all(2, self.msg),
+                             {self.msg[0]: 0x30004, self.msg[1]: 4})
+
+        # Overlapping payloads are served from a single read
+        view = self.image.view(2)
+        self.assertIn(self.msg[1], view)
+        self.assertDictEqual(self.wrapper.cached_read(view, self.msg[:2]),
+                             {self.msg[0]: 0x30004, self.msg[1]: 4})
+        self.assertListEqual(self.server.requests, [3])
+
+        self.now = 2.
+        self.assertNotIn(self.msg[1], view)
+        self.assertDictEqual(self.wrapper.cached_read(view, self.msg[:2]),
+                             {self.msg[0]: 0x30004, self.msg[1]: 4})
+        self.assertListEqual(self.server.requests, [3, 4])
+
+    def test_lookup(self):
+        self.assertIsNone(self.image.get(2, READ_INPUT_REGISTERS))
+        # Invalidating does not create tables
+        self.image.invalidate(2, 3, 1)
+        self.assertIsNone(self.image.get(2, READ_INPUT_REGISTERS))
+
+        self.image.update(2, READ_INPUT_REGISTERS, 3, b"\x00\x01\x00\x02")
+        self.image.update(3, READ_INPUT_REGISTERS, 3, b"\x00\x01")
+        table = self.image.get(2, READ_INPUT_REGISTERS)
+        self.assertIs(table, self.image.table(2, READ_INPUT_REGISTERS))
+        self.image.invalidate(2, 3, 1)
+        self.assertListEqual([table.is_valid(3), table.is_valid(4)],
+                             [False, True])
+        self.assertTrue(self.image.get(3, READ_INPUT_REGISTERS).is_valid(3))
+
+        self.image.discard(2)
+        self.assertIsNone(self.image.get(2, READ_INPUT_REGISTERS))
+        self.assertIsNotNone(self.image.get(3, READ_INPUT_REGISTERS))
+
+
+CONSUMER = """
+from modbusclient import DeviceImage, Payload, AtomicType
+import sys
+with DeviceImage(name=sys.argv[1], create=False) as image:
+    msg = Payload(AtomicType("I"), address=11)
+    print(image.decode(0, msg, max_age=60.), len(image.decode_all(1, [msg])))
+"""
+
+
+class SharedImageTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.name = f"modbusclient_test_{os.getpid()}"
+        self.msg = Payload(AtomicType("I"), address=11)
+
+    def test_attach(self):
+        with SharedImage(self.name, size=100, create=True) as image:
+            with SharedImage(self.name) as consumer:
+                self.assertEqual(len(consumer), 100)
+                self.assertFalse(consumer.is_valid(11, 2))
+                image.update(10, struct.pack("!3H", 1, 2, 3))
+                self.assertEqual(consumer.sequence, 2)
+                self.assertEqual(consumer.decode(self.msg, max_age=60.),
+                                 0x20003)
+                self.assertListEqual(consumer.registers(10, 3), [1, 2, 3])
+                self.assertRaises(TypeError,
+                                  consumer.update, 10, b"\x00\x00")
+            self.assertRaises(FileExistsError,
+                              SharedImage, self.name, create=True)
+        self.assertRaises(FileNotFoundError, SharedImage, self.name)
+
+    def test_sequence_lock(self):
+        with SharedImage(self.name, size=100, create=True) as image:
+            image.update(11, struct.pack("!2H", 1, 2))
+            # Simulate an update in progress
+            image._header[0] += 1
+            result = []
+            reader = threading.Thread(
+                target=lambda: result.append(image.decode(self.msg)))
+            reader.start()
+            time.sleep(0.05)
+            self.assertListEqual(result, [])
+            image._bytes[22:26] = struct.pack("!2H", 3, 4)
+            image._header[0] += 1
+            reader.join(timeout=1.)
+            self.assertListEqual(result, [0x30004])
+
+    def test_dead_publisher(self):
+        with SharedImage(self.name, size=100, create=True) as image:
+            image.update(11, struct.pack("!2H", 1, 2))
+            # Publisher died during an update
+            image._header[0] += 1
+            with unittest.mock.patch(
+                    "modbusclient.register_image.MAX_UPDATE_TIME", 0.05):
+                started = time.monotonic()
+                self.assertRaises(TimeoutError, image.decode, self.msg)
+            self.assertLess(time.monotonic() - started, 1.)
+
+    def test_processes(self):
+        with DeviceImage(name=self.name) as image:
+            self.assertEqual(image.name, self.name)
+            image.update(0, READ_INPUT_REGISTERS, 11, b"\x00\x01\x00\x02")
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+            result = subprocess.run([sys.executable, "-c", CONSUMER, self.name],
+                                    env=env,
+                                    capture_output=True,
+                                    text=True,
+                                    timeout=30.,
+                                    check=True)
+            self.assertEqual(result.stdout.split(), ["65538", "0"])
+            # Consumer did not remove the published table
+            self.assertEqual(image.decode(0, self.msg), 0x10002)
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTests(
+        unittest.TestLoader().loadTestsFromTestCase(RegisterImageTestCase))
+    suite.addTests(
+        unittest.TestLoader().loadTestsFromTestCase(DeviceImageTestCase))
+    suite.addTests(
+        unittest.TestLoader().loadTestsFromTestCase(SharedImageTestCase))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
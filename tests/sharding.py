@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+from modbusclient import Payload, AtomicType, String
+from modbusclient.asyncio import Device, DeviceSnapshot, ShardedPoller
+from modbusclient.asyncio.sharding import (
+    partition_devices,
+    encode_snapshot,
+    decode_snapshot
+)
+from tests.asyncio_client import Server
+
+import unittest
+import unittest.mock
+
+
+class ShardingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Set up test parameters
+        """
+        self.api = {
+            "a": Payload(AtomicType("h"), 100, name="a"),
+            "b": Payload(String(4), 101, name="b")
+        }
+
+    def test_partition(self):
+        devices = [Device("a", unit=i) for i in range(4)]
+        devices += [Device("b"), Device("c"), Device("d", unit=1),
+                    Device("d", unit=2)]
+        shards = partition_devices(devices, 3)
+        self.assertListEqual(shards, [[0, 1, 2, 3], [4, 5], [6, 7]])
+        self.assertListEqual(partition_devices(devices[:4], 3), [[0, 1, 2, 3]])
+
+    def test_encode(self):
+        device = Device("127.0.0.1", api=self.api)
+        payloads = device.payloads()
+        a, b = payloads
+        snapshot = DeviceSnapshot(device, 12.5, {
+            a: a.encode(-3),
+            b: b.encode("abc")
+        }, missed=2)
+        index = {msg: i for i, msg in enumerate(payloads)}
+        buffer = encode_snapshot(1, snapshot, index)
+        devices = [None, device]
+
+        result = decode_snapshot(buffer, devices, [None, payloads])
+        self.assertIs(result.device, device)
+        self.assertEqual(result.timestamp, 12.5)
+        self.assertEqual(result.missed, 2)
+        self.assertDictEqual(result.values, {a: -3, b: "abc"})
+        self.assertIsNone(result.error)
+
+        result = decode_snapshot(buffer, devices, [None, payloads], decode=False)
+        self.assertDictEqual(result.values, snapshot.values)
+
+        decoded = DeviceSnapshot(device, 12.5, {a: -3, b: "abc"}, missed=2)
+        buffer = encode_snapshot(1, decoded, index, decoded=True)
+        with unittest.mock.patch.object(Payload, "decode") as decode:
+            result = decode_snapshot(buffer, devices, [None, payloads])
+        decode.assert_not_called()
+        self.assertIs(result.device, device)
+        self.assertEqual(result.timestamp, 12.5)
+        self.assertEqual(result.missed, 2)
+        self.assertDictEqual(result.values, {a: -3, b: "abc"})
+        self.assertIsNone(result.error)
+
+        snapshot = DeviceSnapshot(device, 1., {}, error=TimeoutError("late"))
+        result = decode_snapshot(encode_snapshot(0, snapshot, index),
+                                 [device], [payloads])
+        self.assertDictEqual(result.values, {})
+        self.assertIsInstance(result.error, TimeoutError)
+        self.assertEqual(result.error.args, ("late",))
+
+
+class ShardedPollerTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.api = {"a": Payload(AtomicType("H"), 100, name="a")}
+        self.servers = [Server() for i in range(2)]
+        self.ports = [await server.start() for server in self.servers]
+
+    async def asyncTearDown(self):
+        for server in self.servers:
+            await server.stop()
+
+    async def test_poll(self):
+        devices = [Device("127.0.0.1", port, unit=unit, api=self.api)
+                   for port in self.ports for unit in (1, 2)]
+        poller = ShardedPoller(devices, workers=2, interval=0.05)
+        self.assertListEqual(poller.shards, [[0, 1], [2, 3]])
+        counts = {device: 0 for device in devices}
+        # Values are decoded by the workers, not by the parent
+        with unittest.mock.patch.object(Payload, "decode") as decode:
+            async with poller:
+                self.assertTrue(poller.is_running())
+                async for snapshot in poller:
+                    self.assertIsNone(snapshot.error)
+                    self.assertDictEqual(snapshot.values,
+                                         {self.api["a"]: 100})
+                    counts[snapshot.device] += 1
+                    if min(counts.values()) >= 2:
+                        break
+        decode.assert_not_called()
+        self.assertFalse(poller.is_running())
+        self.assertRaises(ValueError, ShardedPoller, devices, workers=0)
+
+    async def test_raw(self):
+        devices = [Device("127.0.0.1", self.ports[0], api=self.api)]
+        async with ShardedPoller(devices, workers=1, decode=False,
+                                 interval=0.05) as poller:
+            async for snapshot in poller:
+                self.assertIsNone(snapshot.error)
+                self.assertDictEqual(snapshot.values,
+                                     {self.api["a"]: b"\x00\x64"})
+                break
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite([
+        loader.loadTestsFromTestCase(ShardingTestCase),
+        loader.loadTestsFromTestCase(ShardedPollerTestCase)
+    ])
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
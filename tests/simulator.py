@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+from modbusclient import Payload, AtomicType, String
+from modbusclient.asyncio import ApiWrapper, Client, Simulator, Faults
+from modbusclient.error_codes import (
+    ILLEGAL_DATA_ADDRESS,
+    ILLEGAL_DATA_VALUE,
+    ILLEGAL_FUNCTION_ERROR,
+    MESSAGE_SIZE_ERROR,
+    SERVER_DEVICE_BUSY,
+    UNIT_MISMATCH,
+    ModbusError
+)
+from modbusclient.functions import READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS
+
+import asyncio
+import time
+import unittest
+
+
+class SimulatorTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.api = {
+            "power": Payload(AtomicType("I"), address=10, mode="r"),
+            "name": Payload(String(8), address=20, mode="r"),
+            "limit": Payload(AtomicType("H"), address=30, mode="rw"),
+            "mode": Payload(AtomicType("I"), address=31, mode="rw")
+        }
+        self.values = {self.api["power"]: 1500, self.api["name"]: "sim"}
+        self.simulator = Simulator.from_api(self.api, self.values)
+        self.port = await self.simulator.start()
+        self.wrapper = ApiWrapper(self.api,
+                                  host="127.0.0.1",
+                                  port=self.port,
+                                  timeout=1.)
+        await self.wrapper.connect()
+
+    async def asyncTearDown(self):
+        self.wrapper.disconnect()
+        await self.simulator.stop()
+
+    async def test_read_write(self):
+        self.assertDictEqual(await self.wrapper.read(),
+                             {self.api["power"]: 1500,
+                              self.api["name"]: "sim",
+                              self.api["limit"]: 0,
+                              self.api["mode"]: 0})
+        self.assertEqual(self.simulator.get(self.api["name"]), "sim")
+        await self.wrapper.set("limit", 7)
+        await self.wrapper.set("mode", 0x10002)
+        self.assertEqual(self.simulator.get(self.api["limit"]), 7)
+        self.assertListEqual(
+            self.simulator.table(READ_HOLDING_REGISTERS)[30:33].tolist(),
+            [7, 1, 2])
+        self.simulator.set(self.api["power"], 2000)
+        self.assertEqual(await self.wrapper.get("power"), 2000)
+
+    async def test_errors(self):
+        client = self.wrapper.client
+        cases = [(READ_INPUT_REGISTERS, 11, 2, ILLEGAL_DATA_ADDRESS),
+                 (READ_HOLDING_REGISTERS, 10, 1, ILLEGAL_DATA_ADDRESS),
+                 (READ_HOLDING_REGISTERS, 30, 126, ILLEGAL_DATA_VALUE)]
+        for function, start, count, err_code in cases:
+            with self.subTest(start=start, count=count):
+                with self.assertRaises(ModbusError) as ctx:
+                    await client.call(function, start=start, count=count)
+                self.assertEqual(ctx.exception.args[0], err_code)
+        self.simulator.handlers.pop(READ_INPUT_REGISTERS)
+        with self.assertRaises(ModbusError) as ctx:
+            await self.wrapper.get("power")
+        self.assertEqual(ctx.exception.args[0], ILLEGAL_FUNCTION_ERROR)
+        self.assertEqual(self.simulator.errors, 4)
+
+    async def test_pipeline(self):
+        self.simulator.latency = 0.05
+        client = Client("127.0.0.1", self.port, timeout=1.,
+                        max_transactions=4)
+
+        async def elapsed():
+            begin = time.monotonic()
+            await asyncio.gather(*(client.call(READ_HOLDING_REGISTERS,
+                                               start=30,
+                                               count=1) for i in range(4)))
+            return time.monotonic() - begin
+
+        self.assertGreater(await elapsed(), 0.2)
+        self.simulator.max_pipeline = 4
+        client.disconnect()
+        self.assertLess(await elapsed(), 0.15)
+        client.disconnect()
+
+
+class FaultsTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.faults = Faults(delay_time=0.05, seed=1)
+        self.simulator = Simulator(faults=self.faults, max_pipeline=2)
+        self.client = Client("127.0.0.1",
+                             await self.simulator.start(),
+                             timeout=0.2,
+                             max_retries=0)
+
+    async def asyncTearDown(self):
+        self.client.disconnect()
+        await self.simulator.stop()
+
+    async def read(self, start=0, count=2, unit=1):
+        header, payload, err_code = await self.client.call(
+            READ_HOLDING_REGISTERS, start=start, count=count, unit=unit)
+        return payload
+
+    async def held(self):
+        """Wait until a response is held back to reorder it"""
+        while not self.simulator.injected["reorder"]:
+            await asyncio.sleep(0.001)
+
+    async def error(self):
+        try:
+            await self.read()
+        except ModbusError as exc:
+            return exc.args[0]
+        except (asyncio.TimeoutError, asyncio.CancelledError, OSError) as exc:
+            return type(exc)
+        return None
+
+    async def test_errors(self):
+        cases = [("truncate", MESSAGE_SIZE_ERROR),
+                 ("wrong_unit", UNIT_MISMATCH),
+                 ("wrong_transaction", asyncio.TimeoutError),
+                 ("drop", asyncio.TimeoutError),
+                 ("delay", None)]
+        for name, expected in cases:
+            with self.subTest(fault=name):
+                setattr(self.faults, name, 1.)
+                self.assertEqual(await self.error(), expected)
+                setattr(self.faults, name, 0.)
+        self.assertEqual(dict(self.simulator.injected),
+                         {name: 1 for name, expected in cases})
+        self.assertEqual(await self.read(), b"\x00\x00\x00\x00")
+
+    async def test_busy_and_reset(self):
+        self.faults.busy = 1.
+        self.faults.busy_length = 2
+        self.assertEqual(await self.error(), SERVER_DEVICE_BUSY)
+        self.faults.busy = 0.
+        self.assertEqual(await self.error(), SERVER_DEVICE_BUSY)
+        self.assertIsNone(await self.error())
+
+        self.faults.reset = 1.
+        self.assertIsNotNone(await self.error())
+        self.assertFalse(self.client.is_connected())
+
+    async def test_reorder(self):
+        self.faults.reorder = 1.
+        self.faults.delay_time = 5.
+        first = asyncio.ensure_future(self.read(start=1))
+        await self.held()
+        self.faults.reorder = 0.
+        second = asyncio.ensure_future(self.read(start=2))
+        done, pending = await asyncio.wait([first, second],
+                                           return_when=asyncio.FIRST_COMPLETED)
+        self.assertIn(second, done)
+        self.assertEqual(await first, b"\x00\x00\x00\x00")
+
+    async def test_reorder_sequential(self):
+        # Held responses do not block the pipeline
+        self.simulator.max_pipeline = 1
+        self.faults.reorder = 1.
+        self.faults.delay_time = 5.
+        first = asyncio.ensure_future(self.read(start=1))
+        await self.held()
+        self.faults.reorder = 0.
+        second = asyncio.ensure_future(self.read(start=2))
+        done, pending = await asyncio.wait([first, second],
+                                           return_when=asyncio.FIRST_COMPLETED)
+        self.assertIn(second, done)
+        self.assertEqual(await first, b"\x00\x00\x00\x00")
+        self.assertEqual(self.simulator.injected["reorder"], 1)
+
+    async def test_reproducible(self):
+        async def pattern():
+            simulator = Simulator(faults=Faults(busy=0.3, busy_length=1,
+                                                seed=7))
+            client = Client("127.0.0.1", await simulator.start(), timeout=1.)
+            results = []
+            for i in range(20):
+                try:
+                    await client.call(READ_HOLDING_REGISTERS, start=0, count=1)
+                    results.append(True)
+                except ModbusError:
+                    results.append(False)
+            client.disconnect()
+            await simulator.stop()
+            return results
+
+        results = await pattern()
+        self.assertIn(False, results)
+        self.assertIn(True, results)
+        self.assertListEqual(await pattern(), results)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    for case in (SimulatorTestCase, FaultsTestCase):
+        suite.addTests(unittest.TestLoader().loadTestsFromTestCase(case))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())